@@ -1,63 +1,165 @@
-import os
-from flask import Flask, jsonify, render_template, request
-from flask_cors import CORS
-from config import Config
-from models.database import Database
-from routes import register_blueprints
-
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Enable CORS for frontend integration
-CORS(app, supports_credentials=True, origins="*")
-
-# Initialize database connection
-db = Database()
-
-# Register blueprints
-register_blueprints(app)
-
-# Error handlers - return HTML for browser requests, JSON for API requests
-@app.errorhandler(404)
-def not_found(error):
-    if request.path.startswith('/auth/') or request.path.startswith('/sets/') or request.path.startswith('/cards/'):
-        return jsonify({'error': 'Route not found'}), 404
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    if request.path.startswith('/auth/') or request.path.startswith('/sets/') or request.path.startswith('/cards/'):
-        return jsonify({'error': 'Internal server error'}), 500
-    return render_template('500.html'), 500
-
-@app.errorhandler(400)
-def bad_request(error):
-    if request.path.startswith('/auth/') or request.path.startswith('/sets/') or request.path.startswith('/cards/'):
-        return jsonify({'error': 'Bad request'}), 400
-    return jsonify({'error': 'Bad request'}), 400
-
-@app.errorhandler(403)
-def forbidden(error):
-    if request.path.startswith('/auth/') or request.path.startswith('/sets/') or request.path.startswith('/cards/'):
-        return jsonify({'error': 'Forbidden'}), 403
-    return render_template('403.html'), 403
-
-@app.errorhandler(401)
-def unauthorized(error):
-    if request.path.startswith('/auth/') or request.path.startswith('/sets/') or request.path.startswith('/cards/'):
-        return jsonify({'error': 'Unauthorized'}), 401
-    return jsonify({'error': 'Unauthorized'}), 401
-
-# Health check route
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'message': 'Server is running'
-    }), 200
-
-if __name__ == '__main__':
-    # Only run in debug mode if explicitly in development
-    debug_mode = os.environ.get('FLASK_ENV') == 'development'
-    app.run(debug=False, host='0.0.0.0', port=5000)
+import os
+from flask import Flask, jsonify, render_template, request, g, current_app
+from flask_cors import CORS
+from config import Config
+from models.repositories import backend_class, reset_connections, STORAGE_ERRORS
+from models.unit_of_work import UnitOfWork
+from routes import register_blueprints
+from utils.admission import AdmissionControl
+from utils.profiling import RequestProfiler
+from utils.suggest import TitleIndex
+from utils.similar import SimilarSets
+from utils import assets
+
+def create_app(config=None):
+    """
+    Create the Flask application.
+    
+    Nothing is connected here: the storage backend is set up, and its indexes
+    created, on first use (see models.repositories), so creating an app is
+    cheap for both worker boot and tests.
+    
+    Storage settings (STORAGE_BACKEND, SQLITE_PATH, CARD_STORAGE,
+    SNAPSHOT_DIR) are read from the app's config when used, so overrides of
+    them apply to this app. The MongoDB client is shared by the process: it
+    is opened with the settings of the app that first connects.
+    
+    Args:
+        config: Config class or object to load on top of Config, or a dict
+            of overrides
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    
+    # Enable CORS for frontend integration
+    CORS(app, supports_credentials=True, origins="*")
+    
+    # Register blueprints
+    register_blueprints(app)
+    
+    # asset_url() for templates, immutable caching of built assets
+    assets.init_app(app)
+    
+    # In-memory title index for /sets/suggest, built on first use
+    TitleIndex(app.config['SUGGEST_REFRESH_SECONDS'], app.config['SUGGEST_MAX_RESULTS']).init_app(app)
+    # Memory-mapped "similar sets" index, mapped on first use
+    SimilarSets(app.config['SIMILAR_INDEX_DIR'], app.config['SIMILAR_REFRESH_SECONDS']).init_app(app)
+    
+    # Shed load before any request work starts
+    AdmissionControl(app.config).init_app(app)
+    # Profile admitted requests end to end, including the unit of work commit
+    RequestProfiler(app.config).init_app(app)
+    
+    app.before_request(begin_unit_of_work)
+    app.after_request(commit_unit_of_work)
+    app.teardown_request(discard_unit_of_work)
+    
+    for code, handler in ERROR_HANDLERS.items():
+        app.register_error_handler(code, handler)
+    
+    app.add_url_rule('/health', 'health_check', health_check, methods=['GET'])
+    app.add_url_rule('/ready', 'readiness_check', readiness_check, methods=['GET'])
+    return app
+
+def preload(app):
+    """
+    Do the import-time and compile-time work a worker would otherwise do on
+    its first requests: import the storage backend, compile every template
+    and read the asset manifest. Under gunicorn --preload this runs once in the master and is
+    shared with the workers; it opens no connections.
+    """
+    backend_class(app.config['STORAGE_BACKEND'])
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    app.extensions['assets'].entries()
+    return app
+
+def post_fork():
+    """Run in each worker forked from a preloaded master"""
+    reset_connections()
+
+def _api_request():
+    return request.path.startswith(('/auth/', '/sets/', '/cards/', '/admin/', '/jobs/', '/batch', '/stats'))
+
+# Unit of work: model writes made while handling a write request are queued
+# and flushed as one bulk_write per collection once the view succeeds (on
+# SQLite, the request's writes share one transaction committed here)
+def begin_unit_of_work():
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        g.unit_of_work = UnitOfWork(transactional=current_app.config['UNIT_OF_WORK_TRANSACTIONS']).begin()
+
+def commit_unit_of_work(response):
+    uow = g.pop('unit_of_work', None)
+    if uow is None:
+        return response
+    uow.end()
+    if response.status_code >= 400:
+        uow.rollback()
+        return response
+    try:
+        uow.commit()
+    except STORAGE_ERRORS as e:
+        current_app.logger.error(f'Failed to commit request writes: {e}')
+        # An after_request handler must return a response object, not a tuple
+        response = jsonify({'error': 'Failed to save changes'})
+        response.status_code = 500
+    return response
+
+def discard_unit_of_work(error=None):
+    # Reached with a unit of work still open only if the view raised
+    uow = g.pop('unit_of_work', None)
+    if uow is not None:
+        uow.end()
+        uow.rollback()
+
+# Error handlers - return HTML for browser requests, JSON for API requests
+def not_found(error):
+    if _api_request():
+        return jsonify({'error': 'Route not found'}), 404
+    return render_template('404.html'), 404
+
+def internal_error(error):
+    if _api_request():
+        return jsonify({'error': 'Internal server error'}), 500
+    return render_template('500.html'), 500
+
+def bad_request(error):
+    return jsonify({'error': 'Bad request'}), 400
+
+def forbidden(error):
+    if _api_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return render_template('403.html'), 403
+
+def unauthorized(error):
+    return jsonify({'error': 'Unauthorized'}), 401
+
+ERROR_HANDLERS = {
+    404: not_found,
+    500: internal_error,
+    400: bad_request,
+    403: forbidden,
+    401: unauthorized,
+}
+
+# Health check route
+def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Server is running'
+    }), 200
+
+def readiness_check():
+    """Readiness probe: 200 while this worker should get traffic, 503 with the reason otherwise"""
+    report = current_app.extensions['admission'].readiness(wait=True)
+    return jsonify(report), 200 if report['status'] == 'ready' else 503
+
+if __name__ == '__main__':
+    # Only run in debug mode if explicitly in development
+    debug_mode = os.environ.get('FLASK_ENV') == 'development'
+    create_app().run(debug=False, host='0.0.0.0', port=5000)
@@ -1,14 +1,119 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/'
-    DATABASE_NAME = os.environ.get('DATABASE_NAME') or 'flashcard_app'
-    
-    # Production settings
-    DEBUG = os.environ.get('FLASK_ENV') == 'development'
-    TESTING = False
-
+import os
+from dotenv import load_dotenv
+from flask import current_app, has_app_context
+
+load_dotenv()
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/'
+    DATABASE_NAME = os.environ.get('DATABASE_NAME') or 'flashcard_app'
+    # Fail a request after this long without a reachable server (driver default is 30s)
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS') or 5000)
+    
+    # Storage backend: 'mongo' (MongoDB at MONGODB_URI) or 'sqlite' (embedded,
+    # one database file at SQLITE_PATH, for single-node deployments)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'mongo'
+    SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'onlyflashcards.db')
+    
+    # Run each request's batched writes in a transaction (replica sets only)
+    UNIT_OF_WORK_TRANSACTIONS = os.environ.get('UNIT_OF_WORK_TRANSACTIONS') == '1'
+    
+    # Card storage layout: 'document' (one document per card) or 'bucket'
+    # (cards packed into per-set bucket documents); see scripts/migrate_card_storage.py
+    CARD_STORAGE = os.environ.get('CARD_STORAGE') or 'document'
+    
+    # Where compiled set snapshots are kept (rebuilt on demand if lost)
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'snapshots')
+    
+    # Admission control: new requests get 503 + Retry-After while the database
+    # is slow or unreachable, its connection pool is nearly exhausted, or this
+    # worker already has too many requests in flight (see utils/admission.py)
+    ADMISSION_MAX_DB_LATENCY_MS = float(os.environ.get('ADMISSION_MAX_DB_LATENCY_MS') or 250)
+    ADMISSION_MAX_POOL_SATURATION = float(os.environ.get('ADMISSION_MAX_POOL_SATURATION') or 0.9)
+    ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT') or 32)
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or 5)
+    # Database ping behind /ready and admission control: how often, and how long
+    # a ping may take before the database counts as unreachable (seconds)
+    READINESS_PROBE_INTERVAL = float(os.environ.get('READINESS_PROBE_INTERVAL') or 2)
+    READINESS_PROBE_TIMEOUT = float(os.environ.get('READINESS_PROBE_TIMEOUT') or 2)
+    
+    # Users allowed to use the admin endpoints and request profiling
+    ADMIN_USERNAMES = {name.strip() for name in (os.environ.get('ADMIN_USERNAMES') or '').split(',') if name.strip()}
+    
+    # Request profiling (utils/profiling.py): admins profile a request with the
+    # X-Profile header; PROFILE_SAMPLE_RATE also profiles that fraction of all
+    # requests and keeps those slower than PROFILE_SLOW_MS
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS') or 500)
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS') or 2)
+    PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE') or 50)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'profiles')
+    
+    # Typeahead (utils/suggest.py): the in-memory title index is rebuilt from
+    # the set feed when older than SUGGEST_REFRESH_SECONDS, which is also how
+    # long clients may cache a suggestion response
+    SUGGEST_REFRESH_SECONDS = float(os.environ.get('SUGGEST_REFRESH_SECONDS') or 60)
+    SUGGEST_MAX_RESULTS = int(os.environ.get('SUGGEST_MAX_RESULTS') or 10)
+    
+    # Public page views (the feed's popularity signal) are counted in memory
+    # and written at most every VIEW_FLUSH_SECONDS per worker
+    VIEW_FLUSH_SECONDS = float(os.environ.get('VIEW_FLUSH_SECONDS') or 10)
+    
+    # Set cloning (POST /sets/<id>/clone): decks up to CLONE_SYNC_LIMIT cards
+    # are copied within the request, larger ones by a background job
+    CLONE_SYNC_LIMIT = int(os.environ.get('CLONE_SYNC_LIMIT') or 1000)
+    CLONE_CHUNK_SIZE = int(os.environ.get('CLONE_CHUNK_SIZE') or 1000)
+    
+    # Card images (PUT /cards/<id>/image): uploads up to ATTACHMENT_MAX_BYTES
+    # and ATTACHMENT_MAX_PIXELS, thumbnails scaled to fit THUMBNAIL_SIZE pixels
+    # square. Unreferenced images younger than ATTACHMENT_GC_GRACE_SECONDS are
+    # kept by scripts/gc_attachments.py (their card write may still be in flight)
+    ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES') or 5 * 1024 * 1024)
+    ATTACHMENT_MAX_PIXELS = int(os.environ.get('ATTACHMENT_MAX_PIXELS') or 40_000_000)
+    THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE') or 320)
+    ATTACHMENT_GC_GRACE_SECONDS = float(os.environ.get('ATTACHMENT_GC_GRACE_SECONDS') or 3600)
+    
+    # Card import (POST /cards/set/<id>/import): at most IMPORT_MAX_CARDS
+    # cards per request, rendered and inserted together
+    IMPORT_MAX_CARDS = int(os.environ.get('IMPORT_MAX_CARDS') or 1000)
+    
+    # Batched operations (POST /batch): at most BATCH_MAX_OPERATIONS per request
+    BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS') or 500)
+    
+    # Similar sets (GET /sets/<id>/similar): the index built by
+    # scripts/build_similar_index.py lives under SIMILAR_INDEX_DIR; workers
+    # look for a newer build at most every SIMILAR_REFRESH_SECONDS
+    SIMILAR_INDEX_DIR = os.environ.get('SIMILAR_INDEX_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'similar')
+    SIMILAR_REFRESH_SECONDS = float(os.environ.get('SIMILAR_REFRESH_SECONDS') or 60)
+    SIMILAR_MAX_RESULTS = int(os.environ.get('SIMILAR_MAX_RESULTS') or 10)
+    
+    # Production settings
+    DEBUG = os.environ.get('FLASK_ENV') == 'development'
+    TESTING = False
+
+def setting(name):
+    """
+    A setting of the current app (Config plus the overrides given to
+    create_app), or of Config outside an app context, e.g. in scripts.
+    """
+    if has_app_context():
+        return current_app.config.get(name, getattr(Config, name))
+    return getattr(Config, name)
+
+def with_app_settings(target):
+    """
+    Wrap a function to be run in another thread so that it reads the
+    settings of the current app (see setting), as the calling thread does.
+    """
+    if not has_app_context():
+        return target
+    app = current_app._get_current_object()
+    def run(*args, **kwargs):
+        with app.app_context():
+            return target(*args, **kwargs)
+    return run
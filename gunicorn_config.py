@@ -0,0 +1,20 @@
+"""Gunicorn settings: gunicorn --config gunicorn_config.py wsgi:application"""
+import os
+
+# Platforms that route by $PORT get every interface; otherwise only nginx
+# on this host (see DEPLOYMENT.md) talks to gunicorn
+bind = f"0.0.0.0:{os.environ['PORT']}" if os.environ.get('PORT') else '127.0.0.1:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+# Load the app once in the master (wsgi.py preloads imports and templates)
+# and fork workers from it, so a new or recycled worker starts serving at once
+preload_app = True
+
+# Recycle workers now and then; cheap with a preloaded master
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+def post_fork(server, worker):
+    # Each worker opens its own database connections
+    from app import post_fork as reset_worker
+    reset_worker()
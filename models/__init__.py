@@ -1,7 +1,11 @@
-from .user import User
-from .flashcard_set import FlashcardSet
-from .flashcard import Flashcard
-from .database import Database
-
-__all__ = ['User', 'FlashcardSet', 'Flashcard', 'Database']
-
+from .user import User
+from .flashcard_set import FlashcardSet
+from .flashcard import Flashcard
+from .set_feed import SetFeedEntry
+from .database import Database
+from .tracking import StaleWriteError
+from .job import Job
+from .attachment import Attachment
+
+__all__ = ['User', 'FlashcardSet', 'Flashcard', 'SetFeedEntry', 'Database', 'StaleWriteError', 'Job', 'Attachment']
+
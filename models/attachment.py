@@ -0,0 +1,133 @@
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models.repositories import repositories, STORAGE_ERRORS
+from models import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Images checked per round trip by collect_garbage
+GC_BATCH_SIZE = 500
+
+class Attachment:
+    """
+    Images attached to cards.
+    
+    An image and its thumbnail are files in the backend's attachment store
+    (GridFS on MongoDB, blobs on SQLite), separate from the card, which holds
+    only the image's ID in `image_id`. That keeps card JSON small however many
+    cards have images; pages load the files themselves only when shown.
+    
+    Files are written before the card that refers to them and deleted once no
+    card refers to them, so copies of a set can share images and a failed
+    card write leaves at worst an unreferenced file, which
+    scripts/gc_attachments.py deletes later.
+    """
+    
+    @staticmethod
+    def store_image(set_id, image, content_type, thumbnail, thumbnail_type):
+        """
+        Store an uploaded image and its thumbnail.
+        
+        Args:
+            set_id: ID of the set the image is uploaded to
+            image: Binary stream of the image
+            content_type (str): MIME type of the image
+            thumbnail: Binary stream of the thumbnail
+            thumbnail_type (str): MIME type of the thumbnail
+        
+        Returns:
+            ObjectId: ID of the image
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        attachments = repositories().attachments
+        image_id = attachments.put(image, {'set_id': set_id, 'kind': 'image', 'content_type': content_type})
+        attachments.put(thumbnail, {'set_id': set_id, 'kind': 'thumbnail', 'image_id': image_id,
+                                    'content_type': thumbnail_type})
+        return image_id
+    
+    @staticmethod
+    def open_image(set_id, image_id, thumbnail=False):
+        """
+        Open an image, or its thumbnail, that a card of the set refers to.
+        
+        Returns:
+            A file object (see AttachmentRepository.open) or None
+        
+        Raises:
+            InvalidId: image_id is not a valid ID
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        image_id = ObjectId(image_id)
+        if not repositories().cards.find_image_refs([image_id], set_id=set_id):
+            return None
+        attachments = repositories().attachments
+        if thumbnail:
+            image_id = attachments.find_thumbnail(image_id)
+            if image_id is None:
+                return None
+        return attachments.open(image_id)
+    
+    @classmethod
+    def release(cls, image_ids):
+        """Delete the images no card refers to any more, once the current unit of work commits"""
+        image_ids = [image_id for image_id in image_ids if image_id]
+        if image_ids:
+            unit_of_work.after_commit(lambda: cls._delete_unreferenced(image_ids))
+    
+    @classmethod
+    def release_set(cls, set_id):
+        """Delete the unreferenced images uploaded to a set, once the current unit of work commits"""
+        unit_of_work.after_commit(lambda: cls._collect_quietly(set_id))
+    
+    @staticmethod
+    def _delete_unreferenced(image_ids):
+        try:
+            referenced = repositories().cards.find_image_refs(image_ids)
+            repositories().attachments.delete([image_id for image_id in image_ids if image_id not in referenced])
+        except STORAGE_ERRORS as e:
+            # Left for scripts/gc_attachments.py
+            logger.warning(f'Failed to delete attachments: {e}')
+    
+    @classmethod
+    def _collect_quietly(cls, set_id):
+        try:
+            cls.collect_garbage(set_id)
+        except STORAGE_ERRORS as e:
+            logger.warning(f'Failed to delete attachments of set {set_id}: {e}')
+    
+    @staticmethod
+    def collect_garbage(set_id=None, grace=timedelta(0), batch_size=GC_BATCH_SIZE):
+        """
+        Delete the images, uploaded to a set (or to any set), that no card
+        refers to, together with their thumbnails.
+        
+        Args:
+            set_id: Only images uploaded to this set
+            grace (timedelta): Keep images younger than this; their card
+                write may still be in flight
+            batch_size (int): Images checked per round trip
+        
+        Returns:
+            int: Number of images deleted
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        attachments, cards = repositories().attachments, repositories().cards
+        uploaded_before = datetime.utcnow() - grace
+        deleted, after = 0, None
+        while True:
+            image_ids = attachments.find_images(set_id=set_id, uploaded_before=uploaded_before,
+                                                after=after, limit=batch_size)
+            if not image_ids:
+                break
+            referenced = cards.find_image_refs(image_ids)
+            unreferenced = [image_id for image_id in image_ids if image_id not in referenced]
+            attachments.delete(unreferenced)
+            deleted += len(unreferenced)
+            after = image_ids[-1]
+            if len(image_ids) < batch_size:
+                break
+        return deleted
@@ -0,0 +1,317 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from config import setting
+from models.database import Database, version_query
+from models import unit_of_work
+
+# Cards per bucket document in the bucket layout
+BUCKET_SIZE = 100
+
+# Card order within a set: (rank, _id), cards without a rank first
+ORDER = [('rank', 1), ('_id', 1)]
+
+def position_key(card):
+    """Sort key for a card document in ORDER"""
+    return (card.get('rank') is not None, card.get('rank') or '', card['_id'])
+
+def after_position_query(after):
+    """Query for the cards that come after the position (rank, _id) in ORDER"""
+    rank, card_id = after
+    if rank is None:
+        return {'$or': [{'rank': None, '_id': {'$gt': card_id}}, {'rank': {'$type': 'string'}}]}
+    return {'$or': [{'rank': {'$gt': rank}}, {'rank': rank, '_id': {'$gt': card_id}}]}
+
+def long_rank_query(field, max_length):
+    """Query for a missing rank, or one longer than max_length"""
+    return {'$or': [{field: None}, {field: {'$regex': f'^.{{{max_length + 1},}}'}}]}
+
+class DocumentCardStore:
+    """
+    One document per card in `flashcards` (the original layout).
+    
+    Card stores are the MongoDB layouts behind the Mongo card repository. They
+    take and return plain card documents (Flashcard.to_dict() shape) with
+    ObjectId ids.
+    """
+    
+    name = 'document'
+    collection_name = 'flashcards'
+    
+    @property
+    def collection(self):
+        return Database().db[self.collection_name]
+    
+    def insert(self, card):
+        return unit_of_work.insert_one(self.collection, card)
+    
+    def insert_many(self, cards):
+        """Insert many cards at once (not queued on a unit of work)"""
+        if cards:
+            self.collection.insert_many(cards, ordered=False)
+    
+    def update(self, card_id, update, expected_version=None, immediate=False):
+        """Apply a card update document. Returns the match count, or None if queued"""
+        query = version_query(card_id, expected_version)
+        if immediate:
+            return self.collection.update_one(query, update).matched_count
+        unit_of_work.update_one(self.collection, query, update)
+    
+    def delete(self, card_id, set_id):
+        """Delete a card. Returns the number deleted, or None if the delete was queued"""
+        result = unit_of_work.delete_one(self.collection, {'_id': card_id})
+        return None if result is None else result.deleted_count
+    
+    def delete_set(self, set_id):
+        return unit_of_work.delete_many(self.collection, {'set_id': set_id})
+    
+    def find_one(self, card_id):
+        return self.collection.find_one({'_id': card_id})
+    
+    def find_many(self, card_ids):
+        return list(self.collection.find({'_id': {'$in': card_ids}}))
+    
+    def find_set(self, set_id):
+        return list(self.collection.find({'set_id': set_id}).sort(ORDER))
+    
+    def find_page(self, set_id, after=None, limit=50):
+        query = {'set_id': set_id}
+        if after:
+            query.update(after_position_query(after))
+        return list(self.collection.find(query).sort(ORDER).limit(limit))
+    
+    def find_last(self, set_id):
+        cards = self.collection.find({'set_id': set_id}).sort([(field, -1) for field, _ in ORDER]).limit(1)
+        return next(iter(cards), None)
+    
+    def set_fields(self, set_id, fields, change_seq):
+        """Write fields of many cards at once (not queued on a unit of work)"""
+        now = datetime.utcnow()
+        self.collection.bulk_write([
+            UpdateOne({'_id': card_id}, {'$set': {**values, 'change_seq': change_seq, 'updated_at': now}})
+            for card_id, values in fields.items()
+        ], ordered=False)
+    
+    def find_sets_to_rank(self, max_length):
+        return self.collection.distinct('set_id', long_rank_query('rank', max_length))
+    
+    def find_sets_to_render(self, render_version):
+        return self.collection.distinct('set_id', {'render_version': {'$ne': render_version}})
+    
+    def find_ids(self, set_id):
+        cards = self.collection.find({'set_id': set_id}, {'_id': 1}).sort('_id', 1)
+        return [card['_id'] for card in cards]
+    
+    def find_image_refs(self, image_ids, set_id=None):
+        query = {'image_id': {'$in': list(image_ids)}}
+        if set_id is not None:
+            query['set_id'] = set_id
+        return set(self.collection.distinct('image_id', query))
+    
+    def count(self, set_id):
+        return self.collection.count_documents({'set_id': set_id})
+    
+    def find_changed(self, set_id, since, until):
+        return list(self.collection.find({
+            'set_id': set_id,
+            'change_seq': {'$gt': since, '$lte': until}
+        }).sort('change_seq', 1))
+    
+    def card_stages(self, card_id):
+        """(collection name, aggregation stages) that produce the card document"""
+        return self.collection_name, [{'$match': {'_id': card_id}}]
+    
+    def count_lookup(self, as_field):
+        """$lookup stage joining a set to [{'n': card count}]"""
+        return {'$lookup': {'from': self.collection_name, 'localField': '_id', 'foreignField': 'set_id',
+                            'pipeline': [{'$count': 'n'}], 'as': as_field}}
+    
+    # Stages turning the layout's documents of a set into card documents
+    unpack_stages = []
+    
+    def stats_lookup(self, as_field, mastered):
+        """
+        $lookup stage joining a set to [{cards, reviewed, mastered, reviews,
+        last_reviewed}] of its cards (see models/study_stats.py)
+        """
+        return {'$lookup': {'from': self.collection_name, 'localField': '_id', 'foreignField': 'set_id',
+                            'pipeline': self.unpack_stages + [{'$group': {
+                                '_id': None,
+                                'cards': {'$sum': 1},
+                                'reviewed': {'$sum': {'$cond': [{'$gt': ['$times_reviewed', 0]}, 1, 0]}},
+                                'mastered': {'$sum': {'$cond': [{'$eq': ['$difficulty', mastered]}, 1, 0]}},
+                                'reviews': {'$sum': {'$ifNull': ['$times_reviewed', 0]}},
+                                'last_reviewed': {'$max': '$last_reviewed'}
+                            }}],
+                            'as': as_field}}
+
+class BucketCardStore(DocumentCardStore):
+    """
+    Cards packed into bucket documents in `flashcard_buckets` (bucket pattern):
+        
+        {set_id, slots, min_id, max_id, max_change_seq, cards: [card, ...]}
+    
+    A deck of n cards is n / BUCKET_SIZE documents. New cards are pushed onto
+    the set's one open bucket (slots < BUCKET_SIZE); slots is not given back on
+    delete, so buckets are filled in card order and never reopened.
+    """
+    
+    name = 'bucket'
+    collection_name = 'flashcard_buckets'
+    
+    def __init__(self, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+    
+    def insert(self, card):
+        return unit_of_work.update_one(
+            self.collection,
+            {'set_id': card['set_id'], 'slots': {'$lt': self.bucket_size}},
+            {
+                '$push': {'cards': card},
+                '$inc': {'slots': 1},
+                '$min': {'min_id': card['_id']},
+                '$max': {'max_id': card['_id'], 'max_change_seq': card.get('change_seq', 0)}
+            },
+            upsert=True
+        )
+    
+    def insert_many(self, cards):
+        """Insert many cards at once as full buckets (not queued on a unit of work)"""
+        by_set = {}
+        for card in cards:
+            by_set.setdefault(card['set_id'], []).append(card)
+        
+        buckets = []
+        for set_id, set_cards in by_set.items():
+            # Close the set's open bucket so cards stay in bucket order
+            self.collection.update_many({'set_id': set_id, 'slots': {'$lt': self.bucket_size}},
+                                        {'$set': {'slots': self.bucket_size}})
+            set_cards.sort(key=lambda c: c['_id'])
+            for i in range(0, len(set_cards), self.bucket_size):
+                chunk = set_cards[i:i + self.bucket_size]
+                buckets.append({
+                    'set_id': set_id,
+                    'slots': len(chunk),
+                    'min_id': chunk[0]['_id'],
+                    'max_id': chunk[-1]['_id'],
+                    'max_change_seq': max(c.get('change_seq', 0) for c in chunk),
+                    'cards': chunk
+                })
+        if buckets:
+            self.collection.insert_many(buckets, ordered=False)
+    
+    def update(self, card_id, update, expected_version=None, immediate=False):
+        # The bucket holding the card (at the expected version), with the
+        # card's fields addressed positionally as cards.$.<field>
+        bucket_query = {'cards': {'$elemMatch': version_query(card_id, expected_version)}}
+        bucket_update = {op: {f'cards.$.{field}': value for field, value in fields.items()}
+                         for op, fields in update.items() if op != '$setOnInsert'}
+        if 'change_seq' in update.get('$set', {}):
+            bucket_update['$max'] = {'max_change_seq': update['$set']['change_seq']}
+        if immediate:
+            return self.collection.update_one(bucket_query, bucket_update).matched_count
+        unit_of_work.update_one(self.collection, bucket_query, bucket_update)
+    
+    def delete(self, card_id, set_id):
+        result = unit_of_work.update_one(self.collection, {'cards._id': card_id},
+                                         {'$pull': {'cards': {'_id': card_id}}})
+        # Drop buckets that are closed and now empty
+        unit_of_work.delete_many(self.collection, {
+            'set_id': set_id, 'slots': {'$gte': self.bucket_size}, 'cards': {'$size': 0}})
+        return None if result is None else result.modified_count
+    
+    def find_one(self, card_id):
+        bucket = self.collection.find_one({'cards._id': card_id}, {'cards': {'$elemMatch': {'_id': card_id}}})
+        return bucket['cards'][0] if bucket and bucket.get('cards') else None
+    
+    def find_many(self, card_ids):
+        wanted = set(card_ids)
+        buckets = self.collection.find({'cards._id': {'$in': card_ids}})
+        return [card for bucket in buckets for card in bucket['cards'] if card['_id'] in wanted]
+    
+    def find_set(self, set_id):
+        buckets = self.collection.find({'set_id': set_id})
+        return sorted((card for bucket in buckets for card in bucket['cards']), key=position_key)
+    
+    def find_page(self, set_id, after=None, limit=50):
+        # Buckets are filled in _id order, not rank order, so every page reads
+        # the whole set (n / BUCKET_SIZE documents)
+        cards = self.find_set(set_id)
+        if after:
+            after_key = position_key({'rank': after[0], '_id': after[1]})
+            cards = [c for c in cards if position_key(c) > after_key]
+        return cards[:limit] if limit else cards
+    
+    def find_last(self, set_id):
+        cards = self.find_set(set_id)
+        return cards[-1] if cards else None
+    
+    def set_fields(self, set_id, fields, change_seq):
+        now = datetime.utcnow()
+        self.collection.bulk_write([
+            UpdateOne(
+                {'cards._id': card_id},
+                {
+                    '$set': {f'cards.$.{field}': value
+                             for field, value in {**values, 'change_seq': change_seq, 'updated_at': now}.items()},
+                    '$max': {'max_change_seq': change_seq}
+                }
+            )
+            for card_id, values in fields.items()
+        ], ordered=False)
+    
+    def find_sets_to_rank(self, max_length):
+        return self.collection.distinct('set_id', long_rank_query('cards.rank', max_length))
+    
+    def find_sets_to_render(self, render_version):
+        return self.collection.distinct('set_id', {'cards': {'$elemMatch': {'render_version': {'$ne': render_version}}}})
+    
+    def find_ids(self, set_id):
+        buckets = self.collection.find({'set_id': set_id}, {'cards._id': 1})
+        return sorted(card['_id'] for bucket in buckets for card in bucket['cards'])
+    
+    def find_image_refs(self, image_ids, set_id=None):
+        query = {'cards.image_id': {'$in': list(image_ids)}}
+        if set_id is not None:
+            query['set_id'] = set_id
+        # distinct returns every image of the matching buckets
+        return set(self.collection.distinct('cards.image_id', query)) & set(image_ids)
+    
+    def count(self, set_id):
+        result = list(self.collection.aggregate([
+            {'$match': {'set_id': set_id}},
+            {'$group': {'_id': None, 'n': {'$sum': {'$size': '$cards'}}}}
+        ]))
+        return result[0]['n'] if result else 0
+    
+    def find_changed(self, set_id, since, until):
+        buckets = self.collection.find({'set_id': set_id, 'max_change_seq': {'$gt': since}})
+        cards = [card for bucket in buckets for card in bucket['cards']
+                 if since < card.get('change_seq', 0) <= until]
+        return sorted(cards, key=lambda c: c['change_seq'])
+    
+    def card_stages(self, card_id):
+        return self.collection_name, [
+            {'$match': {'cards._id': card_id}},
+            {'$replaceRoot': {'newRoot': {'$arrayElemAt': [{'$filter': {
+                'input': '$cards', 'cond': {'$eq': ['$$this._id', card_id]}}}, 0]}}}
+        ]
+    
+    def count_lookup(self, as_field):
+        return {'$lookup': {'from': self.collection_name, 'localField': '_id', 'foreignField': 'set_id',
+                            'pipeline': [{'$group': {'_id': None, 'n': {'$sum': {'$size': '$cards'}}}}],
+                            'as': as_field}}
+    
+    unpack_stages = [{'$unwind': '$cards'}, {'$replaceRoot': {'newRoot': '$cards'}}]
+
+CARD_STORES = {store.name: store for store in (DocumentCardStore, BucketCardStore)}
+
+_stores = {}
+
+def card_store(name=None):
+    """The card store for a layout name (default the CARD_STORAGE setting of the current app)"""
+    name = name or setting('CARD_STORAGE')
+    if name not in _stores:
+        if name not in CARD_STORES:
+            raise ValueError(f'Unknown card storage layout: {name}')
+        _stores[name] = CARD_STORES[name]()
+    return _stores[name]
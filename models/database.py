@@ -1,28 +1,195 @@
-from pymongo import MongoClient
-from config import Config
-
-class Database:
-    _client = None
-    _db = None
-    
-    def __init__(self):
-        if Database._client is None:
-            Database._client = MongoClient(Config.MONGODB_URI)
-            Database._db = Database._client[Config.DATABASE_NAME]
-    
-    @property
-    def db(self):
-        return Database._db
-    
-    @property
-    def users(self):
-        return self.db.users
-    
-    @property
-    def flashcard_sets(self):
-        return self.db.flashcard_sets
-    
-    @property
-    def flashcards(self):
-        return self.db.flashcards
-
+import threading
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING, monitoring
+from config import setting
+from models.instrumentation import CommandTimer
+
+def version_query(doc_id, expected_version=None):
+    """Filter for a document by _id, optionally only at an expected version"""
+    query = {'_id': doc_id}
+    if expected_version is not None:
+        # Documents written before versioning have no version field
+        query['version'] = expected_version if expected_version else {'$in': [0, None]}
+    return query
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts the client's connections that are checked out (in use)"""
+    
+    def __init__(self):
+        self.checked_out = 0
+        self._lock = threading.Lock()
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        pass
+
+class Database:
+    _client = None
+    _db = None
+    _supports_transactions = None
+    pool_monitor = PoolMonitor()
+    command_timer = CommandTimer()
+    
+    # Indexes backing every query shape issued by the models and routes.
+    # scripts/query_audit.py fails when a query stops using them.
+    INDEXES = {
+        'users': [
+            IndexModel([('username', ASCENDING)], unique=True),
+            IndexModel([('email', ASCENDING)], unique=True),
+        ],
+        'flashcard_sets': [
+            IndexModel([('user_id', ASCENDING), ('updated_at', DESCENDING)]),
+            IndexModel([('is_public', ASCENDING), ('created_at', DESCENDING)]),
+        ],
+        'flashcards': [
+            IndexModel([('set_id', ASCENDING), ('_id', ASCENDING)]),
+            IndexModel([('set_id', ASCENDING), ('change_seq', ASCENDING)]),
+            IndexModel([('set_id', ASCENDING), ('rank', ASCENDING), ('_id', ASCENDING)]),
+            IndexModel([('image_id', ASCENDING)]),
+        ],
+        'flashcard_buckets': [
+            IndexModel([('set_id', ASCENDING), ('min_id', ASCENDING)]),
+            IndexModel([('set_id', ASCENDING), ('max_change_seq', ASCENDING)]),
+            IndexModel([('cards._id', ASCENDING)]),
+            IndexModel([('cards.image_id', ASCENDING)]),
+        ],
+        'card_tombstones': [
+            IndexModel([('set_id', ASCENDING), ('change_seq', ASCENDING)]),
+        ],
+        'set_feed': [
+            IndexModel([('created_at', DESCENDING)]),
+            IndexModel([('views', DESCENDING), ('created_at', DESCENDING)]),
+        ],
+        # Card images (GridFS bucket `attachments`, see models/attachment.py)
+        'attachments.files': [
+            IndexModel([('metadata.set_id', ASCENDING), ('_id', ASCENDING)]),
+            IndexModel([('metadata.image_id', ASCENDING)]),
+        ],
+        'attachments.chunks': [
+            IndexModel([('files_id', ASCENDING), ('n', ASCENDING)], unique=True),
+        ],
+        # Near-duplicate detection (see models/duplicates.py); keys is an array
+        'minhashes': [
+            IndexModel([('set_id', ASCENDING), ('kind', ASCENDING), ('keys', ASCENDING)]),
+            IndexModel([('kind', ASCENDING), ('keys', ASCENDING)]),
+        ],
+        # Study statistics (see models/study_stats.py); user_stats is read by _id
+        'set_stats': [
+            IndexModel([('user_id', ASCENDING)]),
+        ],
+        'jobs': [
+            # Finished or not, job records are only kept for a week
+            IndexModel([('created_at', ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+        ],
+    }
+    
+    def __init__(self):
+        if Database._client is None:
+            Database._client = MongoClient(
+                setting('MONGODB_URI'),
+                serverSelectionTimeoutMS=setting('MONGODB_SERVER_SELECTION_TIMEOUT_MS'),
+                event_listeners=[Database.pool_monitor, Database.command_timer]
+            )
+            Database._db = Database._client[setting('DATABASE_NAME')]
+    
+    @classmethod
+    def reset(cls):
+        """Forget the client (in a forked worker); the next Database() connects again"""
+        # Not closed: its sockets belong to the parent process
+        cls._client = None
+        cls._db = None
+        cls._supports_transactions = None
+        cls.pool_monitor = PoolMonitor()
+    
+    @property
+    def client(self):
+        return Database._client
+    
+    @property
+    def db(self):
+        return Database._db
+    
+    @property
+    def users(self):
+        return self.db.users
+    
+    @property
+    def flashcard_sets(self):
+        return self.db.flashcard_sets
+    
+    @property
+    def flashcards(self):
+        return self.db.flashcards
+    
+    @property
+    def set_feed(self):
+        return self.db.set_feed
+    
+    @property
+    def card_tombstones(self):
+        return self.db.card_tombstones
+    
+    @property
+    def jobs(self):
+        return self.db.jobs
+    
+    @property
+    def minhashes(self):
+        return self.db.minhashes
+    
+    @property
+    def set_stats(self):
+        return self.db.set_stats
+    
+    @property
+    def user_stats(self):
+        return self.db.user_stats
+    
+    def ensure_indexes(self):
+        """Create any missing indexes (one round trip per collection)"""
+        for collection, indexes in Database.INDEXES.items():
+            self.db[collection].create_indexes(indexes)
+    
+    def pool_stats(self):
+        """Connections in use and the per-server pool limit"""
+        return {
+            'in_use': Database.pool_monitor.checked_out,
+            'max': self.client.options.pool_options.max_pool_size
+        }
+    
+    def supports_transactions(self):
+        """Whether the server is a replica set or sharded cluster (checked once)"""
+        if Database._supports_transactions is None:
+            hello = self.client.admin.command('hello')
+            Database._supports_transactions = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+        return Database._supports_transactions
@@ -0,0 +1,277 @@
+import logging
+import weakref
+import numpy as np
+from bson import ObjectId
+from models.minhash import (DUPLICATE_THRESHOLD, card_text, card_signatures, fingerprint, set_signature,
+                            band_keys, similarities, to_bytes, from_bytes)
+from models.repositories import repositories, STORAGE_ERRORS
+from models import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Cards signed per batch when a set is rebuilt
+REBUILD_BATCH_SIZE = 1000
+
+# Card changes not applied yet: unit of work -> {set ID: {'added', 'changed', 'removed'}}
+_pending = weakref.WeakKeyDictionary()
+
+def _object_id(value):
+    return ObjectId(value) if isinstance(value, str) else value
+
+def _clusters(pairs):
+    """Connected groups of the (a, b, similarity) pairs: [(ids, lowest similarity joining them)]"""
+    parent = {}
+    
+    def root(item):
+        while parent.setdefault(item, item) != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+    
+    for a, b, _ in pairs:
+        parent[root(a)] = root(b)
+    clusters = {}
+    for a, b, similarity in pairs:
+        ids, lowest = clusters.get(root(a), (set(), 1.0))
+        clusters[root(a)] = (ids | {a, b}, min(lowest, similarity))
+    return [(sorted(ids), lowest) for ids, lowest in clusters.values()]
+
+class DuplicateIndex:
+    """
+    Near-duplicate cards and sets, found with MinHash signatures and LSH band
+    keys (see models/minhash.py).
+    
+    Every card and set has a signature document in the backend's minhash
+    store, written once the card writes commit; the changes a unit of work
+    makes to one set are applied together. A card's document is replaced
+    when its text changes. A set's signature is the MinHash of its cards'
+    fingerprints: extended in place when cards are added, and recomputed from
+    the stored fingerprints when cards are edited or deleted. A failed write
+    only leaves a signature stale; scripts/rebuild_minhashes.py recomputes
+    them.
+    """
+    
+    @staticmethod
+    def _card_documents(cards):
+        """Signature documents of Flashcards, signed in one batch"""
+        texts = [card_text(card.front, card.back) for card in cards]
+        signatures = card_signatures(texts)
+        return [{
+            '_id': card._id,
+            'kind': 'card',
+            'set_id': _object_id(card.set_id),
+            'fingerprint': fingerprint(text),
+            'signature': to_bytes(signature),
+            'keys': [int(key) for key in keys]
+        } for card, text, signature, keys in zip(cards, texts, signatures, band_keys(signatures))]
+    
+    @staticmethod
+    def _set_document(set_id, signature):
+        return {
+            '_id': set_id,
+            'kind': 'set',
+            'set_id': set_id,
+            'fingerprint': 0,
+            'signature': to_bytes(signature),
+            'keys': [int(key) for key in band_keys([signature])[0]]
+        }
+    
+    @classmethod
+    def cards_added(cls, set_id, cards):
+        """Sign new cards of a set, once the current unit of work commits"""
+        cls._defer(set_id, 'added', cards)
+    
+    @classmethod
+    def cards_changed(cls, set_id, cards):
+        """Sign cards again after their text changed, once the current unit of work commits"""
+        cls._defer(set_id, 'changed', cards)
+    
+    @classmethod
+    def cards_removed(cls, set_id, card_ids):
+        """Drop the signatures of deleted cards, once the current unit of work commits"""
+        cls._defer(set_id, 'removed', card_ids)
+    
+    @classmethod
+    def set_removed(cls, set_id):
+        """Drop the signatures of a deleted set and its cards, once the current unit of work commits"""
+        set_id = _object_id(set_id)
+        unit_of_work.after_commit(lambda: cls._quietly(repositories().minhashes.delete_set, set_id))
+    
+    @classmethod
+    def _defer(cls, set_id, kind, items):
+        """Queue card changes of a set, applied in one go after the current unit of work commits"""
+        set_id = _object_id(set_id)
+        if not items:
+            return
+        uow = unit_of_work.current_unit_of_work()
+        if uow is None:
+            return cls._quietly(cls._apply, set_id, {'added': [], 'changed': [], 'removed': [], kind: list(items)})
+        changes = _pending.setdefault(uow, {})
+        if set_id not in changes:
+            changes[set_id] = {'added': [], 'changed': [], 'removed': []}
+            uow.after_commit(lambda: cls._quietly(cls._apply, set_id, changes.pop(set_id)))
+        changes[set_id][kind].extend(items)
+    
+    @staticmethod
+    def _quietly(write, set_id, *args):
+        try:
+            write(set_id, *args)
+        except STORAGE_ERRORS as e:
+            # Left for scripts/rebuild_minhashes.py
+            logger.warning(f'Failed to update the signatures of set {set_id}: {e}')
+    
+    @classmethod
+    def _apply(cls, set_id, changes):
+        minhashes = repositories().minhashes
+        removed = set(changes['removed'])
+        if removed:
+            minhashes.delete_many(list(removed))
+        # The latest text of each card; cards deleted since are left out
+        cards = {card._id: card for card in changes['added'] + changes['changed'] if card._id not in removed}
+        if cards:
+            minhashes.put_many(cls._card_documents(list(cards.values())))
+        # Recomputed from the stored fingerprints rather than merged into the
+        # stored signature, so a concurrent commit to the same set is not lost
+        cls.refresh_set(set_id)
+    
+    @classmethod
+    def refresh_set(cls, set_id):
+        """Recompute a set's signature from the stored fingerprints of its cards"""
+        set_id = _object_id(set_id)
+        minhashes = repositories().minhashes
+        signature = set_signature(minhashes.find_fingerprints(set_id))
+        if signature is None:
+            minhashes.delete_many([set_id])
+        else:
+            minhashes.put_many([cls._set_document(set_id, signature)])
+    
+    @classmethod
+    def rebuild_set(cls, set_id, batch_size=REBUILD_BATCH_SIZE):
+        """
+        Sign every card of a set and the set itself again.
+        
+        Returns:
+            int: Number of cards signed
+        """
+        from models.flashcard import Flashcard
+        set_id = _object_id(set_id)
+        cards = Flashcard.find_by_set_id(set_id)
+        minhashes = repositories().minhashes
+        minhashes.delete_set(set_id)
+        for i in range(0, len(cards), batch_size):
+            minhashes.put_many(cls._card_documents(cards[i:i + batch_size]))
+        cls.refresh_set(set_id)
+        return len(cards)
+    
+    @staticmethod
+    def find_duplicate_cards(set_id, threshold=DUPLICATE_THRESHOLD):
+        """
+        Groups of near-duplicate cards in a set. Only cards that share an LSH
+        key are compared, never every pair.
+        
+        Returns:
+            list: (card IDs, lowest similarity within the group) per group
+        """
+        set_id = _object_id(set_id)
+        minhashes = repositories().minhashes
+        collisions = minhashes.find_collisions(set_id)
+        card_ids = {card_id for ids in collisions for card_id in ids}
+        signatures = {d['_id']: from_bytes(d['signature']) for d in minhashes.find_many(card_ids)}
+        
+        pairs = {}
+        for ids in collisions:
+            ids = [card_id for card_id in ids if card_id in signatures]
+            if len(ids) < 2:
+                continue
+            group = np.stack([signatures[card_id] for card_id in ids])
+            scores = similarities(group, group)
+            for i, j in zip(*np.nonzero(np.triu(scores >= threshold, k=1))):
+                pairs[(ids[i], ids[j])] = float(scores[i, j])
+        return _clusters([(a, b, similarity) for (a, b), similarity in pairs.items()])
+    
+    @classmethod
+    def check_cards(cls, set_id, cards, threshold=DUPLICATE_THRESHOLD):
+        """
+        Find which of some new cards (not saved yet) duplicate a card of the
+        set or an earlier one of the new cards.
+        
+        Args:
+            cards (list): (front, back) pairs
+        
+        Returns:
+            list: {'index', 'card_id' or 'duplicate_of' (index of an earlier
+                new card), 'similarity'} per duplicate
+        """
+        if not cards:
+            return []
+        set_id = _object_id(set_id)
+        signatures = card_signatures([card_text(front, back) for front, back in cards])
+        keys = band_keys(signatures)
+        
+        warnings = {}
+        existing = repositories().minhashes.find_matches('card', {int(key) for key in keys.ravel()}, set_id=set_id)
+        if existing:
+            existing_signatures = np.stack([from_bytes(d['signature']) for d in existing])
+            scores = similarities(signatures, existing_signatures)
+            best = scores.argmax(axis=1)
+            for index in np.nonzero(scores[np.arange(len(cards)), best] >= threshold)[0]:
+                warnings[int(index)] = {'index': int(index), 'card_id': existing[best[index]]['_id'],
+                                        'similarity': float(scores[index, best[index]])}
+        
+        # Among the new cards: bucket them by key, compare with earlier ones in the same buckets
+        buckets = {}
+        for index, card_keys in enumerate(keys.tolist()):
+            earlier = sorted({other for key in card_keys for other in buckets.get(key, ())})
+            if earlier and index not in warnings:
+                scores = similarities(signatures[index:index + 1], signatures[earlier])[0]
+                if scores.max() >= threshold:
+                    warnings[index] = {'index': index, 'duplicate_of': earlier[int(scores.argmax())],
+                                       'similarity': float(scores.max())}
+            for key in card_keys:
+                buckets.setdefault(key, []).append(index)
+        return [warnings[index] for index in sorted(warnings)]
+    
+    @staticmethod
+    def find_copies(set_id, threshold=DUPLICATE_THRESHOLD):
+        """
+        Sets whose cards are nearly the same as this set's, found by LSH key.
+        
+        Returns:
+            list: (set ID, similarity), most similar first
+        """
+        set_id = _object_id(set_id)
+        minhashes = repositories().minhashes
+        own = minhashes.find_many([set_id])
+        if not own:
+            return []
+        matches = [d for d in minhashes.find_matches('set', own[0]['keys']) if d['_id'] != set_id]
+        if not matches:
+            return []
+        scores = similarities(from_bytes(own[0]['signature'])[None, :],
+                              np.stack([from_bytes(d['signature']) for d in matches]))[0]
+        copies = [(d['_id'], float(score)) for d, score in zip(matches, scores) if score >= threshold]
+        return sorted(copies, key=lambda copy: -copy[1])
+    
+    @staticmethod
+    def collapse_sets(set_ids, threshold=DUPLICATE_THRESHOLD):
+        """
+        Fold near-identical sets of a result list into the first of them.
+        
+        Returns:
+            dict: ID of each kept set (in the given order) -> IDs of the sets
+                folded into it
+        """
+        set_ids = [_object_id(set_id) for set_id in set_ids]
+        documents = {d['_id']: d for d in repositories().minhashes.find_many(set_ids)}
+        signed = [set_id for set_id in set_ids if set_id in documents]
+        kept = {set_id: [] for set_id in set_ids}
+        if len(signed) < 2:
+            return kept
+        signatures = np.stack([from_bytes(documents[set_id]['signature']) for set_id in signed])
+        scores = similarities(signatures, signatures)
+        for j in range(1, len(signed)):
+            earlier = [i for i in np.nonzero(scores[j, :j] >= threshold)[0] if signed[i] in kept]
+            if earlier:
+                kept[signed[earlier[0]]].append(signed[j])
+                del kept[signed[j]]
+        return kept
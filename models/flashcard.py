@@ -1,81 +1,344 @@
-from datetime import datetime
-from bson import ObjectId
-from models.database import Database
-
-class Flashcard:
-    def __init__(self, front, back, set_id, _id=None, created_at=None, last_reviewed=None, 
-                 difficulty=None, times_reviewed=0):
-        self.front = front  # Front side text
-        self.back = back    # Back side text
-        self.set_id = set_id  # ID of the flashcard set this belongs to
-        self._id = _id if _id else ObjectId()
-        self.created_at = created_at if created_at else datetime.utcnow()
-        self.last_reviewed = last_reviewed
-        self.difficulty = difficulty  # e.g., 'easy', 'medium', 'hard'
-        self.times_reviewed = times_reviewed
-    
-    def to_dict(self):
-        """Convert flashcard to dictionary for MongoDB storage"""
-        return {
-            '_id': self._id,
-            'front': self.front,
-            'back': self.back,
-            'set_id': ObjectId(self.set_id) if isinstance(self.set_id, str) else self.set_id,
-            'created_at': self.created_at,
-            'last_reviewed': self.last_reviewed,
-            'difficulty': self.difficulty,
-            'times_reviewed': self.times_reviewed
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        """Create Flashcard instance from MongoDB document"""
-        return cls(
-            front=data['front'],
-            back=data['back'],
-            set_id=data['set_id'],
-            _id=data['_id'],
-            created_at=data.get('created_at', datetime.utcnow()),
-            last_reviewed=data.get('last_reviewed'),
-            difficulty=data.get('difficulty'),
-            times_reviewed=data.get('times_reviewed', 0)
-        )
-    
-    def save(self):
-        """Save flashcard to database"""
-        db = Database()
-        return db.flashcards.insert_one(self.to_dict())
-    
-    def update(self):
-        """Update existing flashcard in database"""
-        db = Database()
-        return db.flashcards.update_one(
-            {'_id': self._id},
-            {'$set': self.to_dict()}
-        )
-    
-    def delete(self):
-        """Delete flashcard from database"""
-        db = Database()
-        return db.flashcards.delete_one({'_id': self._id})
-    
-    @classmethod
-    def find_by_id(cls, card_id):
-        """Find flashcard by ID"""
-        db = Database()
-        if isinstance(card_id, str):
-            card_id = ObjectId(card_id)
-        card_data = db.flashcards.find_one({'_id': card_id})
-        if card_data:
-            return cls.from_dict(card_data)
-        return None
-    
-    @classmethod
-    def find_by_set_id(cls, set_id):
-        """Find all flashcards in a set"""
-        db = Database()
-        if isinstance(set_id, str):
-            set_id = ObjectId(set_id)
-        cards = db.flashcards.find({'set_id': set_id})
-        return [cls.from_dict(card) for card in cards]
-
+from datetime import datetime
+from bson import ObjectId
+from models.set_feed import SetFeedEntry
+from models.tracking import ChangeTracking
+from models.repositories import repositories
+from models.ranking import rank_between, initial_ranks
+from models.rich_text import render, fallback_html, RENDERER_VERSION
+from models.attachment import Attachment
+from models.duplicates import DuplicateIndex
+from models.study_stats import StudyStats
+
+class Flashcard(ChangeTracking):
+    COUNTER_FIELDS = ('times_reviewed',)
+    DIFFICULTIES = ('easy', 'medium', 'hard')  # How a review went; see Flashcard.review
+    
+    def __init__(self, front, back, set_id, _id=None, created_at=None, last_reviewed=None, 
+                 difficulty=None, times_reviewed=0, version=0, updated_at=None, change_seq=0,
+                 rank=None, image_id=None, front_html=None, back_html=None, render_version=None):
+        self.front = front  # Front side text
+        self.back = back    # Back side text
+        self.set_id = set_id  # ID of the flashcard set this belongs to
+        self._id = _id if _id else ObjectId()
+        self.created_at = created_at if created_at else datetime.utcnow()
+        self.last_reviewed = last_reviewed
+        self.difficulty = difficulty  # e.g., 'easy', 'medium', 'hard'
+        self.times_reviewed = times_reviewed
+        self.version = version  # Incremented on every update
+        self.updated_at = updated_at if updated_at else self.created_at
+        self.change_seq = change_seq  # Position in the set's change sequence (delta sync)
+        self.rank = rank  # Position in the set (see models/ranking.py); None until saved
+        self.image_id = image_id  # Attached image (see models/attachment.py), or None
+        # Sanitized HTML of front/back, rendered on write (see models/rich_text.py)
+        self.front_html = front_html
+        self.back_html = back_html
+        self.render_version = render_version
+    
+    def to_dict(self):
+        """Convert flashcard to dictionary for MongoDB storage"""
+        return {
+            '_id': self._id,
+            'front': self.front,
+            'back': self.back,
+            'set_id': ObjectId(self.set_id) if isinstance(self.set_id, str) else self.set_id,
+            'created_at': self.created_at,
+            'last_reviewed': self.last_reviewed,
+            'difficulty': self.difficulty,
+            'times_reviewed': self.times_reviewed,
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'change_seq': self.change_seq,
+            'rank': self.rank,
+            'image_id': self.image_id,
+            'front_html': self.front_html,
+            'back_html': self.back_html,
+            'render_version': self.render_version
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create Flashcard instance from MongoDB document"""
+        flashcard = cls(
+            front=data['front'],
+            back=data['back'],
+            set_id=data['set_id'],
+            _id=data['_id'],
+            created_at=data.get('created_at', datetime.utcnow()),
+            last_reviewed=data.get('last_reviewed'),
+            difficulty=data.get('difficulty'),
+            times_reviewed=data.get('times_reviewed', 0),
+            version=data.get('version', 0),
+            updated_at=data.get('updated_at'),
+            change_seq=data.get('change_seq', 0),
+            rank=data.get('rank'),
+            image_id=data.get('image_id'),
+            front_html=data.get('front_html'),
+            back_html=data.get('back_html'),
+            render_version=data.get('render_version')
+        )
+        flashcard._mark_clean()
+        return flashcard
+    
+    def render(self):
+        """Render front and back to HTML with the current renderer"""
+        self.front_html = render(self.front)
+        self.back_html = render(self.back)
+        self.render_version = RENDERER_VERSION
+    
+    @property
+    def html(self):
+        """(front HTML, back HTML) for pages; cards not rendered yet show their text as is"""
+        if self.render_version is None:
+            return fallback_html(self.front), fallback_html(self.back)
+        return self.front_html, self.back_html
+    
+    @staticmethod
+    def _next_change_seq(set_id):
+        """
+        Allocate the next number in a set's change sequence.
+        
+        Sent immediately (not queued on a unit of work) since the number is
+        needed for the write itself; also records when it was allocated, see
+        FlashcardSet.sync_token.
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().sets.next_change_seq(set_id)
+    
+    def save(self):
+        """Save flashcard to database (at the end of its set unless it has a rank)"""
+        self.updated_at = datetime.utcnow()
+        self.render()
+        if self.rank is None:
+            set_id = ObjectId(self.set_id) if isinstance(self.set_id, str) else self.set_id
+            last = repositories().cards.find_last(set_id)
+            self.rank = rank_between(last.get('rank') if last else None, None)
+        self.change_seq = self._next_change_seq(self.set_id)
+        result = repositories().cards.insert(self.to_dict())
+        self._mark_clean()
+        SetFeedEntry.adjust_card_count(self.set_id, 1)
+        DuplicateIndex.cards_added(self.set_id, [self])
+        StudyStats.cards_changed(self.set_id, after=[self._snapshot])
+        return result
+    
+    def update(self, check_version=False, change_seq=None):
+        """
+        Write the fields changed since the flashcard was loaded.
+        
+        Args:
+            check_version (bool): Fail with StaleWriteError if the card was
+                updated by someone else since self.version
+            change_seq (int): Change sequence number to write the card under,
+                for writes batched under one number (see
+                FlashcardSet.next_change_seq); allocated here if None
+        """
+        text_changed = bool({'front', 'back'} & set(self.changed_fields()))
+        # Re-rendered when the text changed, or when made by an older renderer
+        if text_changed or self.render_version != RENDERER_VERSION:
+            self.render()
+        changed = self.changed_fields()
+        if changed:
+            self.updated_at = datetime.utcnow()
+            self.change_seq = change_seq if change_seq is not None else self._next_change_seq(self.set_id)
+        before = self._snapshot if self.is_persisted else None
+        result = self._write_changes(repositories().cards, check_version=check_version)
+        if text_changed:
+            DuplicateIndex.cards_changed(self.set_id, [self])
+        if before is not None and {'times_reviewed', 'difficulty'} & set(changed):
+            StudyStats.cards_changed(self.set_id, before=[before], after=[self._snapshot])
+        return result
+    
+    def review(self, difficulty, reviewed_at=None):
+        """
+        Record a study review: counts it and rates the card with how it went.
+        
+        Args:
+            difficulty (str): One of DIFFICULTIES
+            reviewed_at (datetime): When it was reviewed (default now)
+        
+        Raises:
+            ValueError: difficulty is not one of DIFFICULTIES
+        """
+        if difficulty not in self.DIFFICULTIES:
+            raise ValueError(f'difficulty must be one of {", ".join(self.DIFFICULTIES)}')
+        self.difficulty = difficulty
+        self.times_reviewed += 1
+        self.last_reviewed = reviewed_at or datetime.utcnow()
+        return self.update()
+    
+    def move(self, after=None):
+        """
+        Move the card to just after another card of its set, or to the start.
+        
+        Only this card is written: it gets a rank between its new neighbours'.
+        A set whose cards are not ranked yet (stored before ranks existed) is
+        ranked first.
+        
+        Args:
+            after (Flashcard): The card to place this one after, or None to
+                make it the first card
+        
+        Raises:
+            ValueError: `after` is this card or belongs to another set
+        """
+        set_id = ObjectId(self.set_id) if isinstance(self.set_id, str) else self.set_id
+        if after is not None and (after._id == self._id or str(after.set_id) != str(set_id)):
+            raise ValueError('A card can only be moved next to another card of its set')
+        
+        # The card that will follow this one (skipping this card itself)
+        position = (after.rank, after._id) if after else None
+        following = next((card for card in repositories().cards.find_page(set_id, after=position, limit=2)
+                          if card['_id'] != self._id), None)
+        before_rank = after.rank if after else None
+        after_rank = following.get('rank') if following else None
+        if ((after and before_rank is None) or (following and after_rank is None)
+                or (before_rank and after_rank and before_rank >= after_rank)):
+            # Neighbours stored before ranks existed, or tied by concurrent
+            # appends: rank the whole set once, then place the card
+            ranks = Flashcard.rank_set(set_id)
+            before_rank = ranks[after._id] if after else None
+            after_rank = ranks[following['_id']] if following else None
+        
+        self.rank = rank_between(before_rank, after_rank)
+        return self.update()
+    
+    def set_image(self, image_id):
+        """Attach an image (see Attachment.store_image), or detach it with None; the previous image is released"""
+        previous, self.image_id = self.image_id, image_id
+        result = self.update()
+        if previous and previous != image_id:
+            Attachment.release([previous])
+        return result
+    
+    def delete(self, change_seq=None):
+        """Delete flashcard from database, leaving a tombstone for delta sync (see update for change_seq)"""
+        cards = repositories().cards
+        set_id = ObjectId(self.set_id) if isinstance(self.set_id, str) else self.set_id
+        removed = cards.delete(self._id, set_id)
+        if change_seq is None:
+            change_seq = self._next_change_seq(set_id)
+        cards.add_tombstone(self._id, set_id, change_seq)
+        if self.image_id:
+            Attachment.release([self.image_id])
+        DuplicateIndex.cards_removed(set_id, [self._id])
+        # A deferred delete (None) is assumed to remove the loaded card
+        if removed != 0:
+            SetFeedEntry.adjust_card_count(self.set_id, -1)
+            StudyStats.cards_changed(set_id, before=[self.to_dict()])
+        return removed
+    
+    @classmethod
+    def rank_set(cls, set_id):
+        """
+        Give every card of a set a fresh, short rank, keeping their order.
+        
+        All the cards are written (with one new change sequence number, so
+        synced clients pick up the new ranks); used to rank sets stored before
+        ranks existed and by the rebalance job once ranks grow long.
+        
+        Returns:
+            dict: card ID -> new rank
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        cards = repositories().cards
+        card_ids = [card['_id'] for card in cards.find_set(set_id)]
+        ranks = dict(zip(card_ids, initial_ranks(len(card_ids))))
+        if ranks:
+            cards.set_fields(set_id, {card_id: {'rank': rank} for card_id, rank in ranks.items()},
+                             cls._next_change_seq(set_id))
+        return ranks
+    
+    @classmethod
+    def render_set(cls, set_id):
+        """
+        Render the cards of a set not rendered by the current renderer again.
+        
+        The cards are written with one new change sequence number, so synced
+        clients pick up the new HTML; used by scripts/rerender_cards.py after
+        RENDERER_VERSION is bumped.
+        
+        Returns:
+            int: Number of cards rendered
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        cards = repositories().cards
+        stale = [cls.from_dict(card) for card in cards.find_set(set_id)
+                 if card.get('render_version') != RENDERER_VERSION]
+        for card in stale:
+            card.render()
+        if stale:
+            cards.set_fields(set_id, {
+                card._id: {'front_html': card.front_html, 'back_html': card.back_html,
+                           'render_version': card.render_version}
+                for card in stale
+            }, cls._next_change_seq(set_id))
+        return len(stale)
+    
+    @classmethod
+    def find_by_id(cls, card_id):
+        """Find flashcard by ID"""
+        if isinstance(card_id, str):
+            card_id = ObjectId(card_id)
+        card_data = repositories().cards.find_one(card_id)
+        if card_data:
+            return cls.from_dict(card_data)
+        return None
+    
+    @classmethod
+    def find_by_set_id(cls, set_id):
+        """Find all flashcards in a set, in order"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return [cls.from_dict(card) for card in repositories().cards.find_set(set_id)]
+    
+    @classmethod
+    def find_page_by_set_id(cls, set_id, after=None, limit=50):
+        """
+        Find one page of flashcards in a set, in order (keyset pagination).
+        
+        Args:
+            after (tuple): (rank, card ID) of the last card of the previous page
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        if after and isinstance(after[1], str):
+            after = (after[0], ObjectId(after[1]))
+        return [cls.from_dict(card) for card in repositories().cards.find_page(set_id, after=after, limit=limit)]
+    
+    @classmethod
+    def find_ids_by_set_id(cls, set_id):
+        """Find the IDs of all flashcards in a set (covered by the set_id index)"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().cards.find_ids(set_id)
+    
+    @classmethod
+    def find_by_ids(cls, card_ids):
+        """Find flashcards by ID, returned in the order the IDs were given"""
+        card_ids = [ObjectId(c) if isinstance(c, str) else c for c in card_ids]
+        cards = {card['_id']: cls.from_dict(card) for card in repositories().cards.find_many(card_ids)}
+        return [cards[c] for c in card_ids if c in cards]
+    
+    @classmethod
+    def count_by_set_id(cls, set_id):
+        """Count flashcards in a set"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().cards.count(set_id)
+    
+    @classmethod
+    def find_changed_since(cls, set_id, since, until):
+        """Find flashcards in a set created or updated in the change range (since, until]"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return [cls.from_dict(card) for card in repositories().cards.find_changed(set_id, since, until)]
+    
+    @classmethod
+    def find_deleted_since(cls, set_id, since, until):
+        """Find the IDs of flashcards deleted from a set in the change range (since, until]"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().cards.find_deleted(set_id, since, until)
+
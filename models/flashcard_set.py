@@ -1,126 +1,359 @@
-from datetime import datetime
-from bson import ObjectId
-from models.database import Database
-from models.flashcard import Flashcard
-
-class FlashcardSet:
-    def __init__(self, title, description=None, user_id=None, _id=None, 
-                 created_at=None, updated_at=None, is_public=False):
-        self.title = title
-        self.description = description or ""
-        self.user_id = user_id  # ID of the user who created this set
-        self._id = _id if _id else ObjectId()
-        self.created_at = created_at if created_at else datetime.utcnow()
-        self.updated_at = updated_at if updated_at else datetime.utcnow()
-        self.is_public = is_public
-    
-    def to_dict(self):
-        """Convert flashcard set to dictionary for MongoDB storage"""
-        return {
-            '_id': self._id,
-            'title': self.title,
-            'description': self.description,
-            'user_id': ObjectId(self.user_id) if self.user_id and isinstance(self.user_id, str) else self.user_id,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'is_public': self.is_public
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        """Create FlashcardSet instance from MongoDB document"""
-        return cls(
-            title=data['title'],
-            description=data.get('description', ''),
-            user_id=data.get('user_id'),
-            _id=data['_id'],
-            created_at=data.get('created_at', datetime.utcnow()),
-            updated_at=data.get('updated_at', datetime.utcnow()),
-            is_public=data.get('is_public', False)
-        )
-    
-    def save(self):
-        """Save flashcard set to database"""
-        db = Database()
-        if self._id in [obj['_id'] for obj in db.flashcard_sets.find({'_id': self._id})]:
-            # Update existing
-            self.updated_at = datetime.utcnow()
-            return db.flashcard_sets.update_one(
-                {'_id': self._id},
-                {'$set': self.to_dict()}
-            )
-        else:
-            # Insert new
-            return db.flashcard_sets.insert_one(self.to_dict())
-    
-    def update(self):
-        """Update existing flashcard set in database"""
-        db = Database()
-        self.updated_at = datetime.utcnow()
-        return db.flashcard_sets.update_one(
-            {'_id': self._id},
-            {'$set': self.to_dict()}
-        )
-    
-    def delete(self):
-        """Delete flashcard set and all its flashcards"""
-        db = Database()
-        # Delete all flashcards in this set
-        if isinstance(self._id, str):
-            set_id = ObjectId(self._id)
-        else:
-            set_id = self._id
-        db.flashcards.delete_many({'set_id': set_id})
-        # Delete the set
-        return db.flashcard_sets.delete_one({'_id': self._id})
-    
-    def get_flashcards(self):
-        """Get all flashcards in this set"""
-        return Flashcard.find_by_set_id(self._id)
-    
-    def add_flashcard(self, front, back):
-        """Add a new flashcard to this set"""
-        flashcard = Flashcard(front=front, back=back, set_id=self._id)
-        flashcard.save()
-        self.updated_at = datetime.utcnow()
-        self.update()
-        return flashcard
-    
-    @classmethod
-    def find_by_id(cls, set_id):
-        """Find flashcard set by ID"""
-        db = Database()
-        if isinstance(set_id, str):
-            set_id = ObjectId(set_id)
-        set_data = db.flashcard_sets.find_one({'_id': set_id})
-        if set_data:
-            return cls.from_dict(set_data)
-        return None
-    
-    @classmethod
-    def find_by_user_id(cls, user_id):
-        """Find all flashcard sets for a user"""
-        db = Database()
-        if isinstance(user_id, str):
-            user_id = ObjectId(user_id)
-        sets = db.flashcard_sets.find({'user_id': user_id})
-        return [cls.from_dict(s) for s in sets]
-    
-    @classmethod
-    def find_public_sets(cls, limit=10):
-        """Find public flashcard sets"""
-        db = Database()
-        sets = db.flashcard_sets.find({'is_public': True}).limit(limit)
-        return [cls.from_dict(s) for s in sets]
-    
-    @classmethod
-    def search_by_title(cls, query, limit=50):
-        """Search flashcard sets by title (case-insensitive, partial match)"""
-        db = Database()
-        # Case-insensitive regex search
-        sets = db.flashcard_sets.find({
-            'title': {'$regex': query, '$options': 'i'},
-            'is_public': True
-        }).limit(limit)
-        return [cls.from_dict(s) for s in sets]
-
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models.user import User
+from models.flashcard import Flashcard
+from models.ranking import rank_between
+from models.rich_text import RENDERER_VERSION
+from models.attachment import Attachment
+from models.duplicates import DuplicateIndex
+from models.set_feed import SetFeedEntry
+from models.study_stats import StudyStats
+from models.tracking import ChangeTracking
+from models.repositories import repositories, STORAGE_ERRORS
+from models.unit_of_work import UnitOfWork
+
+# How long after the last change sequence allocation writes may still be landing
+SYNC_SETTLE = timedelta(seconds=5)
+
+# Cards read and inserted per round trip when copying a set
+COPY_CHUNK_SIZE = 1000
+
+class FlashcardSet(ChangeTracking):
+    def __init__(self, title, description=None, user_id=None, _id=None, 
+                 created_at=None, updated_at=None, is_public=False, version=0,
+                 change_seq=0, changed_at=None):
+        self.title = title
+        self.description = description or ""
+        self.user_id = user_id  # ID of the user who created this set
+        self._id = _id if _id else ObjectId()
+        self.created_at = created_at if created_at else datetime.utcnow()
+        self.updated_at = updated_at if updated_at else datetime.utcnow()
+        self.is_public = is_public
+        self.version = version  # Incremented on every update
+        self.change_seq = change_seq  # Last allocated card change sequence number
+        self.changed_at = changed_at  # When change_seq was last allocated
+    
+    def to_dict(self):
+        """Convert flashcard set to dictionary for MongoDB storage"""
+        return {
+            '_id': self._id,
+            'title': self.title,
+            'description': self.description,
+            'user_id': ObjectId(self.user_id) if self.user_id and isinstance(self.user_id, str) else self.user_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'is_public': self.is_public,
+            'version': self.version,
+            'change_seq': self.change_seq,
+            'changed_at': self.changed_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create FlashcardSet instance from MongoDB document"""
+        flashcard_set = cls(
+            title=data['title'],
+            description=data.get('description', ''),
+            user_id=data.get('user_id'),
+            _id=data['_id'],
+            created_at=data.get('created_at', datetime.utcnow()),
+            updated_at=data.get('updated_at', datetime.utcnow()),
+            is_public=data.get('is_public', False),
+            version=data.get('version', 0),
+            change_seq=data.get('change_seq', 0),
+            changed_at=data.get('changed_at')
+        )
+        flashcard_set._mark_clean()
+        return flashcard_set
+    
+    def save(self):
+        """Save flashcard set to database (insert if new, otherwise update)"""
+        if self.is_persisted:
+            return self.update()
+        result = repositories().sets.insert(self.to_dict())
+        self._mark_clean()
+        SetFeedEntry.sync_set(self, was_public=False)
+        StudyStats.set_created(self)
+        return result
+    
+    def update(self, check_version=False, upsert=False):
+        """
+        Write the fields changed since the set was loaded and bump updated_at.
+        
+        Args:
+            check_version (bool): Fail with StaleWriteError if the set was
+                updated by someone else since self.version
+            upsert (bool): Insert the set if it is not stored yet
+        """
+        self.updated_at = datetime.utcnow()
+        was_public = self._snapshot.get('is_public') if self.is_persisted else None
+        result = self._write_changes(repositories().sets, check_version=check_version, upsert=upsert)
+        SetFeedEntry.sync_set(self, was_public=was_public)
+        return result
+    
+    def delete(self):
+        """Delete flashcard set and all its flashcards"""
+        # Delete all flashcards in this set
+        if isinstance(self._id, str):
+            set_id = ObjectId(self._id)
+        else:
+            set_id = self._id
+        repositories().cards.delete_set(set_id)
+        SetFeedEntry.remove(set_id)
+        Attachment.release_set(set_id)
+        DuplicateIndex.set_removed(set_id)
+        StudyStats.set_removed(set_id, self.user_id)
+        # Delete the set
+        return repositories().sets.delete(set_id)
+    
+    def next_change_seq(self):
+        """
+        Allocate a number in the set's change sequence, to write several
+        cards under (see Flashcard.update) with one round trip.
+        """
+        return Flashcard._next_change_seq(self._id)
+    
+    def is_settled(self):
+        """
+        Whether every card write up to self.change_seq has landed. A card
+        write allocates its sequence number before the write lands, so while
+        the set is still settling from its last allocation a change at or
+        below change_seq may not be visible yet.
+        """
+        return not self.changed_at or datetime.utcnow() - self.changed_at >= SYNC_SETTLE
+    
+    def sync_token(self, since=0):
+        """
+        Change sequence number a client can resume delta sync from after
+        reading every change up to self.change_seq.
+        
+        While the set is settling (see is_settled) the token stays at `since`
+        and the client is sent those changes again on its next sync.
+        """
+        if not self.is_settled():
+            return since
+        return self.change_seq
+    
+    def get_changes(self, since):
+        """
+        Cards changed and deleted since a sync token.
+        
+        Returns:
+            tuple: (changed: list of Flashcard, deleted: list of card IDs, token: int)
+        """
+        changed = Flashcard.find_changed_since(self._id, since, self.change_seq)
+        deleted = Flashcard.find_deleted_since(self._id, since, self.change_seq)
+        return changed, deleted, self.sync_token(since)
+    
+    def get_flashcards(self):
+        """Get all flashcards in this set"""
+        return Flashcard.find_by_set_id(self._id)
+    
+    def review_card(self, flashcard, difficulty):
+        """Record a study review of one of this set's cards (see Flashcard.review) in its owner's stats"""
+        result = flashcard.review(difficulty)
+        StudyStats.record_review(self.user_id, self._id, flashcard.last_reviewed)
+        return result
+    
+    def add_flashcard(self, front, back):
+        """Add a new flashcard to this set"""
+        flashcard = Flashcard(front=front, back=back, set_id=self._id)
+        flashcard.save()
+        self.updated_at = datetime.utcnow()
+        self.update()
+        return flashcard
+    
+    def add_flashcards(self, cards):
+        """
+        Add many new flashcards to the end of this set with one insert_many.
+        
+        Every card is rendered here, once; the cards share one change sequence
+        number.
+        
+        Args:
+            cards (list): (front, back) pairs, in order
+        
+        Returns:
+            list: The new Flashcards
+        """
+        repository = repositories().cards
+        last = repository.find_last(self._id)
+        rank = last.get('rank') if last else None
+        change_seq = Flashcard._next_change_seq(self._id)
+        flashcards = []
+        for front, back in cards:
+            rank = rank_between(rank, None)
+            flashcard = Flashcard(front=front, back=back, set_id=self._id, rank=rank, change_seq=change_seq)
+            flashcard.render()
+            flashcards.append(flashcard)
+        if not flashcards:
+            return flashcards
+        repository.insert_many([flashcard.to_dict() for flashcard in flashcards])
+        for flashcard in flashcards:
+            flashcard._mark_clean()
+        SetFeedEntry.adjust_card_count(self._id, len(flashcards))
+        DuplicateIndex.cards_added(self._id, flashcards)
+        StudyStats.cards_changed(self._id, after=[flashcard._snapshot for flashcard in flashcards])
+        self.updated_at = datetime.utcnow()
+        self.update()
+        return flashcards
+    
+    def create_copy(self, user_id, title=None):
+        """
+        Create a new private set owned by `user_id` with this set's title and
+        description. Cards are copied into it with copy_cards_from().
+        
+        The copy is written at once, not with the request's unit of work, so
+        cards can be copied into it straight away (possibly by another thread).
+        """
+        copy = FlashcardSet(
+            title=title or self.title,
+            description=self.description,
+            user_id=user_id,
+            change_seq=1,
+            changed_at=datetime.utcnow()
+        )
+        with UnitOfWork():
+            copy.save()
+        return copy
+    
+    def copy_cards_from(self, source_id, chunk_size=COPY_CHUNK_SIZE, progress=None):
+        """
+        Copy every card of another set into this one, in order and in chunks:
+        one page read and one insert_many per chunk. The copies start
+        unreviewed and all carry this set's change_seq; images are shared, not
+        copied, and rendered HTML is reused unless made by an older renderer.
+        
+        If copying fails part way, this set (a copy from create_copy) is
+        deleted with the cards it got, so no half-filled set is left behind,
+        and the error raised says so.
+        
+        Args:
+            source_id: ID of the set to copy from
+            chunk_size (int): Cards per round trip
+            progress (callable): Called with the number of cards copied so
+                far after each chunk
+        
+        Returns:
+            int: Number of cards copied
+        
+        Raises:
+            RuntimeError: Copying failed; the message includes whether the
+                incomplete copy was deleted
+        """
+        if isinstance(source_id, str):
+            source_id = ObjectId(source_id)
+        try:
+            copied = self._copy_cards(source_id, chunk_size, progress)
+        except Exception as e:
+            try:
+                # Written at once: a request copying the cards is failing, and
+                # its unit of work will be rolled back
+                with UnitOfWork():
+                    self.delete()
+            except STORAGE_ERRORS as cleanup_error:
+                raise RuntimeError(f'{e} (the incomplete copy could not be deleted: {cleanup_error})') from e
+            raise RuntimeError(f'{e} (the incomplete copy was deleted)') from e
+        if copied and self.is_public:
+            SetFeedEntry.adjust_card_count(self._id, copied)
+        return copied
+    
+    def _copy_cards(self, source_id, chunk_size, progress):
+        cards = repositories().cards
+        copied, after = 0, None
+        while True:
+            page = cards.find_page(source_id, after=after, limit=chunk_size)
+            if not page:
+                break
+            copies = [
+                Flashcard(front=c['front'], back=c['back'], set_id=self._id, change_seq=self.change_seq,
+                          rank=c.get('rank'), image_id=c.get('image_id'), front_html=c.get('front_html'),
+                          back_html=c.get('back_html'), render_version=c.get('render_version'))
+                for c in page
+            ]
+            for copy in copies:
+                if copy.render_version != RENDERER_VERSION:
+                    copy.render()
+            documents = [copy.to_dict() for copy in copies]
+            cards.insert_many(documents)
+            DuplicateIndex.cards_added(self._id, copies)
+            StudyStats.cards_changed(self._id, after=documents)
+            copied += len(page)
+            after = (page[-1].get('rank'), page[-1]['_id'])
+            if progress:
+                progress(copied)
+            if len(page) < chunk_size:
+                break
+        return copied
+    
+    @classmethod
+    def find_by_id(cls, set_id):
+        """Find flashcard set by ID"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        set_data = repositories().sets.find_by_id(set_id)
+        if set_data:
+            return cls.from_dict(set_data)
+        return None
+    
+    @classmethod
+    def find_by_ids(cls, set_ids):
+        """Find flashcard sets by ID, returned in the order the IDs were given"""
+        set_ids = [ObjectId(s) if isinstance(s, str) else s for s in set_ids]
+        sets = {s['_id']: cls.from_dict(s) for s in repositories().sets.find_many(set_ids)}
+        return [sets[s] for s in set_ids if s in sets]
+    
+    @classmethod
+    def find_with_owner(cls, set_id):
+        """
+        Find a flashcard set and its owner in one round trip ($lookup).
+        
+        Returns:
+            tuple: (FlashcardSet or None, User or None)
+        """
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        set_data, owner = repositories().sets.find_with_owner(set_id)
+        if not set_data:
+            return None, None
+        return cls.from_dict(set_data), User.from_dict(owner) if owner else None
+    
+    @classmethod
+    def find_card_with_set(cls, card_id):
+        """
+        Find a flashcard, its set and the set's owner in one round trip.
+        
+        Returns:
+            tuple: (Flashcard or None, FlashcardSet or None, User or None)
+        """
+        if isinstance(card_id, str):
+            card_id = ObjectId(card_id)
+        card_data, set_data, owner = repositories().cards.find_with_set(card_id)
+        if not card_data:
+            return None, None, None
+        return (
+            Flashcard.from_dict(card_data),
+            cls.from_dict(set_data) if set_data else None,
+            User.from_dict(owner) if owner else None
+        )
+    
+    @classmethod
+    def find_by_user_id(cls, user_id):
+        """Find all flashcard sets for a user"""
+        if isinstance(user_id, str):
+            user_id = ObjectId(user_id)
+        sets = repositories().sets.find_by_user(user_id)
+        return [cls.from_dict(s) for s in sets]
+    
+    @classmethod
+    def find_public_sets(cls, limit=10):
+        """Find the most recently created public flashcard sets"""
+        sets = repositories().sets.find_public(limit)
+        return [cls.from_dict(s) for s in sets]
+    
+    @classmethod
+    def search_by_title(cls, query, limit=50):
+        """Search flashcard sets by title (case-insensitive, partial match)"""
+        sets = repositories().sets.search_public(query, limit)
+        return [cls.from_dict(s) for s in sets]
+
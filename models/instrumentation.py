@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+
+# Database commands issued in the current context while capture_commands() is
+# active: [{'command', 'target', 'start', 'duration_ms', 'ok'}], start being
+# time.perf_counter() when the command was sent
+_commands = ContextVar('captured_commands', default=None)
+
+def start_capture():
+    """
+    Start collecting the timings of database commands issued in this context.
+    
+    Returns:
+        tuple: (list the commands are appended to, token for stop_capture())
+    """
+    commands = []
+    return commands, _commands.set(commands)
+
+def stop_capture(token):
+    _commands.reset(token)
+
+@contextmanager
+def capture_commands():
+    """Collect the timings of every database command issued inside the block"""
+    commands, token = start_capture()
+    try:
+        yield commands
+    finally:
+        stop_capture(token)
+
+def record_command(command, target, start, ok=True):
+    """Record a command that started at `start` (perf_counter) and just finished"""
+    commands = _commands.get()
+    if commands is not None:
+        commands.append({
+            'command': command,
+            'target': target,
+            'start': start,
+            'duration_ms': (time.perf_counter() - start) * 1000,
+            'ok': ok
+        })
+
+class CommandTimer(monitoring.CommandListener):
+    """Times MongoDB commands for capture_commands() (listeners run in the issuing thread)"""
+    
+    def __init__(self):
+        self._started = {}  # (connection, request id) -> (captured list, command, collection, start)
+    
+    def started(self, event):
+        commands = _commands.get()
+        if commands is not None:
+            collection = event.command.get(event.command_name)
+            self._started[(event.connection_id, event.request_id)] = (
+                commands, event.command_name, collection if isinstance(collection, str) else None,
+                time.perf_counter()
+            )
+    
+    def succeeded(self, event):
+        self._finish(event, ok=True)
+    
+    def failed(self, event):
+        self._finish(event, ok=False)
+    
+    def _finish(self, event, ok):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started:
+            commands, command, collection, start = started
+            commands.append({
+                'command': command,
+                'target': collection,
+                'start': start,
+                'duration_ms': event.duration_micros / 1000,
+                'ok': ok
+            })
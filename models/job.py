@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from config import with_app_settings
+from models.repositories import repositories
+
+# A running job that has not reported progress for this long is assumed lost
+# (its worker was restarted or killed)
+STALL_TIMEOUT = timedelta(minutes=5)
+
+class Job:
+    """
+    Progress of a long-running operation, such as cloning a large set.
+    
+    The work itself runs in a background thread of the worker that started it;
+    the job record is written straight to the database (not through the unit
+    of work), so any worker can report its progress while it runs.
+    """
+    
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    def __init__(self, kind, user_id=None, target_id=None, _id=None, status=RUNNING,
+                 done=0, total=0, error=None, created_at=None, updated_at=None):
+        self.kind = kind  # e.g. 'clone'
+        self.user_id = user_id  # Who started the job (and may see it)
+        self.target_id = target_id  # ID of what the job is building, e.g. the new set
+        self._id = _id if _id else ObjectId()
+        self.status = status
+        self.done = done  # Units of work completed so far
+        self.total = total
+        self.error = error
+        self.created_at = created_at if created_at else datetime.utcnow()
+        self.updated_at = updated_at if updated_at else self.created_at
+    
+    def to_dict(self):
+        """Convert job to dictionary for database storage"""
+        return {
+            '_id': self._id,
+            'kind': self.kind,
+            'user_id': ObjectId(self.user_id) if isinstance(self.user_id, str) else self.user_id,
+            'target_id': self.target_id,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create Job instance from a stored document"""
+        return cls(
+            kind=data['kind'],
+            user_id=data.get('user_id'),
+            target_id=data.get('target_id'),
+            _id=data['_id'],
+            status=data.get('status', cls.RUNNING),
+            done=data.get('done', 0),
+            total=data.get('total', 0),
+            error=data.get('error'),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at')
+        )
+    
+    @property
+    def stalled(self):
+        """Whether the job is still marked running but stopped reporting progress"""
+        return self.status == self.RUNNING and datetime.utcnow() - self.updated_at > STALL_TIMEOUT
+    
+    def save(self):
+        """Insert the job record"""
+        return repositories().jobs.insert(self.to_dict())
+    
+    def run(self, work):
+        """
+        Run work(job) in a background thread of this worker, then mark the
+        job done, or failed if work raises.
+        """
+        def target():
+            try:
+                work(self)
+            except Exception as e:
+                self.fail(e)
+            else:
+                self.finish()
+        thread = threading.Thread(target=with_app_settings(target), name=f'job-{self.kind}-{self._id}', daemon=True)
+        thread.start()
+        return thread
+    
+    def report(self, done):
+        """Record progress"""
+        self._set(done=done)
+    
+    def finish(self):
+        """Mark the job done"""
+        self._set(status=self.DONE)
+    
+    def fail(self, error):
+        """Mark the job failed"""
+        self._set(status=self.FAILED, error=str(error))
+    
+    def _set(self, **fields):
+        fields['updated_at'] = datetime.utcnow()
+        for name, value in fields.items():
+            setattr(self, name, value)
+        repositories().jobs.update(self._id, {'$set': fields})
+    
+    @classmethod
+    def find_by_id(cls, job_id):
+        """Find job by ID"""
+        if isinstance(job_id, str):
+            job_id = ObjectId(job_id)
+        data = repositories().jobs.find_by_id(job_id)
+        if data:
+            return cls.from_dict(data)
+        return None
@@ -0,0 +1,136 @@
+"""
+MinHash signatures and LSH band keys for finding near-duplicate cards and sets.
+
+A card is the set of character trigrams of its normalized front and back; a
+flashcard set is the set of its cards' fingerprints (the hash of a card's
+normalized text). The share of equal values in two MinHash signatures
+estimates the Jaccard similarity of the two sets.
+
+Signatures are cut into BANDS bands of ROWS values, and each band is hashed
+to a key. Two items whose signatures agree on a whole band share a key, so
+near-duplicates are found by looking up keys in an index, without comparing
+an item against every other one:
+    
+    P(sharing a key) = 1 - (1 - J ** ROWS) ** BANDS
+    J = 0.9: 0.9999    J = 0.8: 0.95    J = 0.7: 0.61    J = 0.5: 0.06
+
+Candidates found this way are then checked against DUPLICATE_THRESHOLD with
+their full signatures. Changing any constant here changes every signature;
+run scripts/rebuild_minhashes.py afterwards.
+"""
+import re
+import unicodedata
+import zlib
+import numpy as np
+
+NUM_HASHES = 128
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+# Estimated Jaccard similarity from which two items count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+# Lowest threshold worth asking for: below it the band keys miss most pairs
+MIN_THRESHOLD = 0.7
+
+SHINGLE = 3
+_MASK32 = 0xFFFFFFFF
+_SHINGLE_MULTIPLIER = 1_000_003
+_BAND_MULTIPLIER = np.uint64(0x100000001B3)
+_CHUNK = 1 << 15  # Values hashed at a time (a 32 MB block with 128 hashes)
+
+# The hash functions h(x) = ((a * x + b) mod 2^64) >> 32 (multiply-shift)
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 63, NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, NUM_HASHES, dtype=np.uint64)
+
+def normalize(text):
+    """
+    Case-folded, accent-free words separated by single spaces: the text
+    that card signatures, title suggestions and quiz answers compare
+    """
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+def card_text(front, back):
+    """The normalized text of a card, as shingled and fingerprinted"""
+    return f' {normalize(front)} \x01 {normalize(back)} '
+
+def fingerprint(text):
+    """32-bit fingerprint of a normalized card text"""
+    return zlib.crc32(text.encode('utf-8'))
+
+def _min_hashes(values, segments):
+    """Signature (NUM_HASHES values) of each run of `values` given by segment start offsets"""
+    segments = np.asarray(segments, dtype=np.int64)
+    ends = np.append(segments[1:], len(values))
+    result = np.empty((len(segments), NUM_HASHES), dtype=np.uint32)
+    start = 0
+    # Whole segments at a time, about _CHUNK values each
+    while start < len(segments):
+        stop = max(start + 1, int(np.searchsorted(ends, segments[start] + _CHUNK, side='right')))
+        low, high = segments[start], ends[stop - 1]
+        # One row per hash function, so each minimum runs over contiguous memory
+        hashed = (_A[:, None] * values[None, low:high] + _B[:, None]) >> np.uint64(32)
+        result[start:stop] = np.minimum.reduceat(hashed, segments[start:stop] - low, axis=1).T
+        start = stop
+    return result
+
+def card_signatures(texts):
+    """
+    Signatures of many card texts (see card_text) at once.
+    
+    Returns:
+        numpy.ndarray: len(texts) x NUM_HASHES uint32
+    """
+    # Trigram hashes of every text at once, from one array of code points
+    # with the texts separated by NULs
+    codes = np.frombuffer('\0'.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    hashes = np.zeros(len(codes) - SHINGLE + 1, dtype=np.uint64)
+    for i in range(SHINGLE):
+        hashes = (hashes * np.uint64(_SHINGLE_MULTIPLIER) + codes[i:len(hashes) + i]) & np.uint64(_MASK32)
+    # Trigram starts that do not run into the next text, per text
+    lengths = np.array([len(text) - SHINGLE + 1 for text in texts], dtype=np.int64)
+    segments = np.cumsum(lengths) - lengths
+    starts = np.cumsum(lengths + SHINGLE) - (lengths + SHINGLE)
+    offsets = np.arange(lengths.sum()) + np.repeat(starts - segments, lengths)
+    return _min_hashes(hashes[offsets], segments)
+
+def set_signature(fingerprints):
+    """Signature of a flashcard set from its cards' fingerprints, or None for an empty set"""
+    if len(fingerprints) == 0:
+        return None
+    return _min_hashes(np.asarray(fingerprints, dtype=np.uint64), [0])[0]
+
+def band_keys(signatures):
+    """
+    LSH keys of signatures: one per band, distinct between bands.
+    
+    Returns:
+        numpy.ndarray: len(signatures) x BANDS int64
+    """
+    bands = np.asarray(signatures, dtype=np.uint32).reshape(-1, BANDS, ROWS).astype(np.uint64)
+    keys = np.broadcast_to(np.arange(BANDS, dtype=np.uint64), bands.shape[:2]).copy()
+    with np.errstate(over='ignore'):
+        for row in range(ROWS):
+            keys = keys * _BAND_MULTIPLIER + bands[:, :, row]
+    return keys.view(np.int64)
+
+def similarities(signatures, others):
+    """Estimated Jaccard similarity of each signature to each of others (len(signatures) x len(others))"""
+    result = np.empty((len(signatures), len(others)))
+    # Compared a block of rows at a time, keeping the boolean cube under ~16 MB
+    rows = max(1, (16 << 20) // max(1, len(others) * NUM_HASHES))
+    for start in range(0, len(signatures), rows):
+        block = signatures[start:start + rows]
+        result[start:start + rows] = (block[:, None, :] == others[None, :, :]).mean(axis=2)
+    return result
+
+def to_bytes(signature):
+    return np.asarray(signature, dtype='<u4').tobytes()
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype='<u4')
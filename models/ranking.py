@@ -0,0 +1,168 @@
+"""
+Fractional rank keys for ordering the cards of a set.
+
+A card's position is a string `rank`; cards are read in (rank, _id) order.
+Moving a card gives it a new rank between its new neighbours' ranks, so a
+move writes only the moved card, however large the set. Keys compare as
+plain byte strings (the default in both MongoDB and SQLite).
+
+A key is an integer part followed by an optional fraction:
+    
+    a0 < a1 < ... < az < b00 < ...       integers: the first character gives
+    a0 < a0V < a1                        the number of digits that follow
+
+Appending increments the integer part, so n appended cards have keys of
+O(log n) length. Inserting between two neighbours bisects the fraction,
+which grows by about one character per six inserts into the same gap;
+scripts/rebalance_ranks.py rewrites a set's keys to short integers once a
+key grows past MAX_RANK_LENGTH.
+"""
+
+# Base-62 digits, in byte order
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+FIRST_RANK = 'a0'
+SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+# Sets with a longer rank than this are rewritten by the rebalance job
+MAX_RANK_LENGTH = 16
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'Invalid rank head: {head!r}')
+
+def _integer_part(key):
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f'Invalid rank: {key!r}')
+    return key[:length]
+
+def validate_rank(key):
+    """Raise ValueError unless key is a well-formed rank"""
+    if not key or key == SMALLEST_INTEGER:
+        raise ValueError(f'Invalid rank: {key!r}')
+    integer = _integer_part(key)
+    if any(c not in DIGITS for c in key[1:]):
+        raise ValueError(f'Invalid rank: {key!r}')
+    if key[len(integer):].endswith(DIGITS[0]):
+        raise ValueError(f'Invalid rank (trailing zero): {key!r}')
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) + 1
+        if d < BASE:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    # Every digit carried over: one more digit
+    if head == 'Z':
+        return 'a' + DIGITS[0]
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in range(len(digits) - 1, -1, -1):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    # Every digit borrowed: one digit fewer (or a longer negative)
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+def _midpoint(a, b):
+    """A fraction strictly between fractions a and b (b None: no upper bound)"""
+    if b is not None and a >= b:
+        raise ValueError(f'{a!r} >= {b!r}')
+    if b:
+        # Keep the common prefix, bisect what follows
+        n = 0
+        while (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+def rank_between(before=None, after=None):
+    """
+    A rank that sorts strictly between two ranks.
+    
+    Args:
+        before (str): Rank of the card that goes before, or None for the start
+        after (str): Rank of the card that goes after, or None for the end
+    
+    Returns:
+        str: The new rank
+    
+    Raises:
+        ValueError: A rank is malformed, or before does not sort before after
+    """
+    for key in (before, after):
+        if key is not None:
+            validate_rank(key)
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'{before!r} >= {after!r}')
+    
+    if before is None:
+        if after is None:
+            return FIRST_RANK
+        integer = _integer_part(after)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint('', after[len(integer):])
+        if integer < after:
+            return integer
+        decremented = _decrement_integer(integer)
+        if decremented is None:
+            raise ValueError('Cannot rank before the smallest rank')
+        return decremented
+    
+    integer = _integer_part(before)
+    fraction = before[len(integer):]
+    if after is None:
+        incremented = _increment_integer(integer)
+        return incremented if incremented is not None else integer + _midpoint(fraction, None)
+    
+    after_integer = _integer_part(after)
+    if integer == after_integer:
+        return integer + _midpoint(fraction, after[len(integer):])
+    incremented = _increment_integer(integer)
+    if incremented is None:
+        raise ValueError('Cannot rank after the largest rank')
+    if incremented < after:
+        return incremented
+    return integer + _midpoint(fraction, None)
+
+def initial_ranks(count):
+    """`count` ascending ranks, as short as possible (for ranking a whole set)"""
+    ranks, rank = [], None
+    for _ in range(count):
+        rank = rank_between(rank, None)
+        ranks.append(rank)
+    return ranks
@@ -0,0 +1,62 @@
+import logging
+import sqlite3
+import threading
+from functools import lru_cache
+from pymongo.errors import PyMongoError
+from config import setting
+
+# Storage backend name -> module:class, imported on first use so a deployment
+# only needs the driver for the backend it runs
+BACKENDS = {
+    'mongo': 'models.repositories.mongo:MongoBackend',
+    'sqlite': 'models.repositories.sqlite:SQLiteBackend',
+}
+
+# Errors a backend raises when the store is unavailable or a write fails
+STORAGE_ERRORS = (PyMongoError, sqlite3.Error)
+
+logger = logging.getLogger(__name__)
+
+_backends = {}
+_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def backend_class(name):
+    """Import and return the backend class for a name, without connecting"""
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown storage backend: {name}')
+    module_name, class_name = BACKENDS[name].split(':')
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)
+
+def repositories(name=None):
+    """
+    The storage backend for a name (default the STORAGE_BACKEND setting of
+    the current app).
+    
+    Backends are created on first use, which is also when their tables and
+    indexes are ensured, so importing the app or creating it does not touch
+    the database. One is kept per backend and settings (see
+    Backend.settings), so apps with different storage settings in one
+    process each get their own.
+    """
+    cls = backend_class(name or setting('STORAGE_BACKEND'))
+    options = tuple(setting(key) for key in cls.settings)
+    key = (cls.name, *options)
+    backend = _backends.get(key)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = cls(*options)
+                try:
+                    backend.ensure_schema()
+                except STORAGE_ERRORS as e:
+                    logger.warning(f'Could not create database indexes: {e}')
+                _backends[key] = backend
+    return backend
+
+def reset_connections():
+    """Drop every backend's connections, e.g. in a worker forked from a preloaded app"""
+    for backend in _backends.values():
+        backend.reset()
@@ -0,0 +1,365 @@
+"""
+Repository interfaces behind the models.
+
+Repositories take and return plain documents in the models' to_dict() shape
+(ObjectId ids, datetime timestamps), so User, FlashcardSet, Flashcard and
+SetFeedEntry work unchanged on every backend.
+
+Updates are given as the small update documents the models build from their
+changed fields: {'$set': {...}, '$inc': {...}, '$setOnInsert': {...}}.
+Update and delete methods return the number of documents matched, or None
+when the write was deferred to the active unit of work.
+"""
+
+from abc import ABC, abstractmethod
+
+class UserRepository(ABC):
+    @abstractmethod
+    def insert(self, user):
+        ...
+    
+    @abstractmethod
+    def find_by_id(self, user_id):
+        ...
+    
+    @abstractmethod
+    def find_by_username(self, username):
+        ...
+    
+    @abstractmethod
+    def find_by_email(self, email):
+        ...
+
+class SetRepository(ABC):
+    @abstractmethod
+    def insert(self, flashcard_set):
+        ...
+    
+    @abstractmethod
+    def update(self, set_id, update, expected_version=None, upsert=False, immediate=False):
+        """Apply an update document; with expected_version, only if the stored version still matches"""
+    
+    @abstractmethod
+    def delete(self, set_id):
+        ...
+    
+    @abstractmethod
+    def find_by_id(self, set_id):
+        ...
+    
+    @abstractmethod
+    def find_many(self, set_ids):
+        ...
+    
+    @abstractmethod
+    def find_with_owner(self, set_id):
+        """(set, owner user) documents, either may be None"""
+    
+    @abstractmethod
+    def find_by_user(self, user_id):
+        ...
+    
+    @abstractmethod
+    def find_public(self, limit):
+        """Most recently created public sets"""
+    
+    @abstractmethod
+    def search_public(self, query, limit):
+        """Public sets whose title contains query (case-insensitive)"""
+    
+    @abstractmethod
+    def next_change_seq(self, set_id):
+        """Atomically allocate the set's next card change sequence number"""
+    
+    @abstractmethod
+    def find_ids(self):
+        """IDs of every set (for maintenance jobs)"""
+    
+    @abstractmethod
+    def find_public_versions(self):
+        """_id, title, description, version and change_seq of every public set"""
+
+class CardRepository(ABC):
+    @abstractmethod
+    def insert(self, card):
+        ...
+    
+    @abstractmethod
+    def insert_many(self, cards):
+        """Insert many cards at once (not deferred to a unit of work)"""
+    
+    @abstractmethod
+    def update(self, card_id, update, expected_version=None, upsert=False, immediate=False):
+        ...
+    
+    @abstractmethod
+    def delete(self, card_id, set_id):
+        ...
+    
+    @abstractmethod
+    def delete_set(self, set_id):
+        """Delete every card of a set and its tombstones"""
+    
+    @abstractmethod
+    def find_one(self, card_id):
+        ...
+    
+    @abstractmethod
+    def find_many(self, card_ids):
+        ...
+    
+    @abstractmethod
+    def find_set(self, set_id):
+        """All cards of a set, ordered by (rank, _id)"""
+    
+    @abstractmethod
+    def find_page(self, set_id, after=None, limit=50):
+        """
+        Cards of a set ordered by (rank, _id), starting after the position
+        after = (rank, _id) (limit 0 = all). Cards without a rank (stored
+        before ranks existed) sort first, by _id.
+        """
+    
+    @abstractmethod
+    def find_last(self, set_id):
+        """The last card of a set in (rank, _id) order, or None"""
+    
+    @abstractmethod
+    def set_fields(self, set_id, fields, change_seq):
+        """Write fields of many cards at once: fields is {card_id: {field: value}}, all written with change_seq"""
+    
+    @abstractmethod
+    def find_sets_to_rank(self, max_length):
+        """IDs of sets with a card that has no rank or a rank longer than max_length"""
+    
+    @abstractmethod
+    def find_sets_to_render(self, render_version):
+        """IDs of sets with a card not rendered by render_version"""
+    
+    @abstractmethod
+    def find_ids(self, set_id):
+        ...
+    
+    @abstractmethod
+    def find_image_refs(self, image_ids, set_id=None):
+        """The subset of image_ids referenced by a card (of set_id, if given)"""
+    
+    @abstractmethod
+    def count(self, set_id):
+        ...
+    
+    @abstractmethod
+    def find_changed(self, set_id, since, until):
+        """Cards with since < change_seq <= until, ordered by change_seq"""
+    
+    @abstractmethod
+    def find_with_set(self, card_id):
+        """(card, set, owner user) documents, any may be None"""
+    
+    @abstractmethod
+    def add_tombstone(self, card_id, set_id, change_seq):
+        ...
+    
+    @abstractmethod
+    def find_deleted(self, set_id, since, until):
+        """IDs of cards deleted with since < change_seq <= until"""
+
+class FeedRepository(ABC):
+    @abstractmethod
+    def find_recent(self, limit):
+        ...
+    
+    @abstractmethod
+    def find_popular(self, limit):
+        ...
+    
+    @abstractmethod
+    def find_titles(self):
+        """_id, title, username, card_count and views of every entry"""
+    
+    @abstractmethod
+    def find_many(self, set_ids):
+        ...
+    
+    @abstractmethod
+    def update(self, set_id, update, upsert=False, immediate=False):
+        ...
+    
+    @abstractmethod
+    def add_views(self, counts):
+        """Add {set ID: views} to the entries' view counts in one write, at once (sets without an entry are skipped)"""
+    
+    @abstractmethod
+    def delete(self, set_id):
+        ...
+    
+    @abstractmethod
+    def rebuild(self):
+        """Recompute every entry from sets, users and cards. Returns the number of stale entries removed"""
+
+class StatsRepository(ABC):
+    """
+    Study statistics (see models/study_stats.py): one document per set in
+    set_stats {_id (the set's), user_id, cards, reviewed, mastered, reviews,
+    last_reviewed} and one per user in user_stats {_id (the user's), sets,
+    cards, reviewed, mastered, reviews, streak, longest_streak,
+    last_review_day, updated_at}.
+    """
+    
+    @abstractmethod
+    def find_user(self, user_id):
+        ...
+    
+    @abstractmethod
+    def find_sets(self, user_id):
+        """Documents of a user's sets"""
+    
+    @abstractmethod
+    def insert_set(self, document):
+        ...
+    
+    @abstractmethod
+    def update_set(self, set_id, update):
+        ...
+    
+    @abstractmethod
+    def add_to_set(self, set_id, counts):
+        """
+        $inc a set's counters. Written immediately: returns the set's user_id,
+        or None if the set has no document.
+        """
+    
+    @abstractmethod
+    def update_user(self, user_id, update, upsert=False):
+        ...
+    
+    @abstractmethod
+    def advance_streak(self, user_id, day, previous_day, reviewed_at):
+        """
+        Count a review on day in a user's streak, in one atomic write sent at
+        once: unchanged if the last review day is day, one longer if it is
+        previous_day, else restarted at 1 (days are ISO dates). Creates the
+        user's document if there is none.
+        """
+    
+    @abstractmethod
+    def delete_set(self, set_id):
+        ...
+    
+    @abstractmethod
+    def rebuild(self):
+        """
+        Recompute every counter from sets and cards; streaks are kept.
+        Returns the number of set and user documents written.
+        """
+
+class JobRepository(ABC):
+    @abstractmethod
+    def insert(self, job):
+        """Written immediately, so other workers can report progress at once"""
+    
+    @abstractmethod
+    def update(self, job_id, update):
+        """Written immediately. Returns the number of documents matched"""
+    
+    @abstractmethod
+    def find_by_id(self, job_id):
+        ...
+
+class AttachmentRepository(ABC):
+    """
+    Binary files (card images and their thumbnails), written and read in
+    chunks so a file is never held in memory whole. Written immediately.
+    
+    Metadata: set_id (set uploaded to), kind ('image' or 'thumbnail'),
+    content_type, and image_id for a thumbnail.
+    """
+    
+    @abstractmethod
+    def put(self, stream, metadata):
+        """Store the contents of a binary stream. Returns the new file's ID"""
+    
+    @abstractmethod
+    def open(self, attachment_id):
+        """
+        A readable, seekable file object with `length`, `upload_date` and
+        `metadata` attributes, or None. The caller closes it.
+        """
+    
+    @abstractmethod
+    def find_thumbnail(self, image_id):
+        """ID of the thumbnail of an image, or None"""
+    
+    @abstractmethod
+    def find_images(self, set_id=None, uploaded_before=None, after=None, limit=500):
+        """IDs of images (of set_id, uploaded before a time), in ID order after the ID `after`"""
+    
+    @abstractmethod
+    def delete(self, image_ids):
+        """Delete images and their thumbnails"""
+
+class MinHashRepository(ABC):
+    """
+    MinHash signatures of cards and sets (see models/minhash.py), one document
+    per card or set: {_id, kind ('card' or 'set'), set_id (a set's own ID for
+    a set), fingerprint, signature (bytes), keys (LSH band keys)}, indexed by
+    key. Written immediately.
+    """
+    
+    @abstractmethod
+    def put_many(self, documents):
+        """Insert or replace documents"""
+    
+    @abstractmethod
+    def delete_many(self, item_ids):
+        ...
+    
+    @abstractmethod
+    def delete_set(self, set_id):
+        """Delete the documents of a set and of its cards"""
+    
+    @abstractmethod
+    def find_many(self, item_ids):
+        ...
+    
+    @abstractmethod
+    def find_fingerprints(self, set_id):
+        """Fingerprints of the cards of a set"""
+    
+    @abstractmethod
+    def find_matches(self, kind, keys, set_id=None):
+        """Documents of a kind that share a key with keys (of the cards of set_id, if given)"""
+    
+    @abstractmethod
+    def find_collisions(self, set_id):
+        """Lists of the IDs of cards of a set that share a key, one per shared key"""
+
+class Backend(ABC):
+    """A storage backend: one repository per model, plus schema setup"""
+    
+    name = None
+    # Settings the backend is created with (see models.repositories.repositories)
+    settings = ()
+    users = None
+    sets = None
+    cards = None
+    feed = None
+    jobs = None
+    attachments = None
+    minhashes = None
+    stats = None
+    
+    @abstractmethod
+    def ensure_schema(self):
+        """Create missing tables / indexes"""
+    
+    def reset(self):
+        """Drop connections inherited from a parent process (after fork)"""
+    
+    @abstractmethod
+    def ping(self):
+        """One round trip to the store; raises one of STORAGE_ERRORS if it is unavailable"""
+    
+    def pool_stats(self):
+        """{'in_use': n, 'max': n} for the connection pool, or None without one"""
+        return None
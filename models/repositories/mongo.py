@@ -0,0 +1,420 @@
+from datetime import datetime
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, ReplaceOne, UpdateOne
+from models.database import Database, version_query
+from models.card_store import card_store
+from models.repositories.base import (UserRepository, SetRepository, CardRepository, FeedRepository, JobRepository,
+                                     AttachmentRepository, MinHashRepository, StatsRepository, Backend)
+from models.study_stats import COUNTERS, MASTERED
+from models import unit_of_work
+
+# MongoDB backend: the collections in Database, with writes queued on the
+# request's unit of work and cards stored in the CARD_STORAGE layout.
+
+def _matched(result):
+    return None if result is None else result.matched_count
+
+class MongoUserRepository(UserRepository):
+    def insert(self, user):
+        return unit_of_work.insert_one(Database().users, user)
+    
+    def find_by_id(self, user_id):
+        return Database().users.find_one({'_id': user_id})
+    
+    def find_by_username(self, username):
+        return Database().users.find_one({'username': username})
+    
+    def find_by_email(self, email):
+        return Database().users.find_one({'email': email})
+
+class MongoSetRepository(SetRepository):
+    def insert(self, flashcard_set):
+        return unit_of_work.insert_one(Database().flashcard_sets, flashcard_set)
+    
+    def update(self, set_id, update, expected_version=None, upsert=False, immediate=False):
+        collection = Database().flashcard_sets
+        query = version_query(set_id, expected_version)
+        if immediate:
+            return collection.update_one(query, update, upsert=upsert).matched_count
+        return _matched(unit_of_work.update_one(collection, query, update, upsert=upsert))
+    
+    def delete(self, set_id):
+        result = unit_of_work.delete_one(Database().flashcard_sets, {'_id': set_id})
+        return None if result is None else result.deleted_count
+    
+    def find_by_id(self, set_id):
+        return Database().flashcard_sets.find_one({'_id': set_id})
+    
+    def find_many(self, set_ids):
+        return list(Database().flashcard_sets.find({'_id': {'$in': list(set_ids)}}))
+    
+    def find_with_owner(self, set_id):
+        # One round trip: the owner is joined with $lookup
+        results = list(Database().flashcard_sets.aggregate([
+            {'$match': {'_id': set_id}},
+            {'$lookup': {'from': 'users', 'localField': 'user_id', 'foreignField': '_id', 'as': 'owner'}}
+        ]))
+        if not results:
+            return None, None
+        owners = results[0].pop('owner')
+        return results[0], owners[0] if owners else None
+    
+    def find_by_user(self, user_id):
+        return list(Database().flashcard_sets.find({'user_id': user_id}))
+    
+    def find_public(self, limit):
+        return list(Database().flashcard_sets.find({'is_public': True}).sort('created_at', DESCENDING).limit(limit))
+    
+    def search_public(self, query, limit):
+        # Case-insensitive regex search
+        return list(Database().flashcard_sets.find({
+            'title': {'$regex': query, '$options': 'i'},
+            'is_public': True
+        }).limit(limit))
+    
+    def next_change_seq(self, set_id):
+        # Sent immediately (not queued): the number is needed for the write itself
+        set_data = Database().flashcard_sets.find_one_and_update(
+            {'_id': set_id},
+            {'$inc': {'change_seq': 1}, '$set': {'changed_at': datetime.utcnow()}},
+            projection={'change_seq': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return set_data['change_seq'] if set_data else 0
+    
+    def find_ids(self):
+        return [s['_id'] for s in Database().flashcard_sets.find({}, {'_id': 1})]
+    
+    def find_public_versions(self):
+        return list(Database().flashcard_sets.find(
+            {'is_public': True}, {'title': 1, 'description': 1, 'version': 1, 'change_seq': 1}))
+
+class MongoCardRepository(CardRepository):
+    """Cards in the CARD_STORAGE layout (see models/card_store.py), tombstones in card_tombstones"""
+    
+    def insert(self, card):
+        return card_store().insert(card)
+    
+    def insert_many(self, cards):
+        return card_store().insert_many(cards)
+    
+    def update(self, card_id, update, expected_version=None, upsert=False, immediate=False):
+        # Cards are never upserted: they only exist once Flashcard.save() has inserted them
+        return card_store().update(card_id, update, expected_version=expected_version, immediate=immediate)
+    
+    def delete(self, card_id, set_id):
+        return card_store().delete(card_id, set_id)
+    
+    def delete_set(self, set_id):
+        card_store().delete_set(set_id)
+        unit_of_work.delete_many(Database().card_tombstones, {'set_id': set_id})
+    
+    def find_one(self, card_id):
+        return card_store().find_one(card_id)
+    
+    def find_many(self, card_ids):
+        return card_store().find_many(card_ids)
+    
+    def find_set(self, set_id):
+        return card_store().find_set(set_id)
+    
+    def find_page(self, set_id, after=None, limit=50):
+        return card_store().find_page(set_id, after=after, limit=limit)
+    
+    def find_last(self, set_id):
+        return card_store().find_last(set_id)
+    
+    def set_fields(self, set_id, fields, change_seq):
+        return card_store().set_fields(set_id, fields, change_seq)
+    
+    def find_sets_to_rank(self, max_length):
+        return card_store().find_sets_to_rank(max_length)
+    
+    def find_sets_to_render(self, render_version):
+        return card_store().find_sets_to_render(render_version)
+    
+    def find_ids(self, set_id):
+        return card_store().find_ids(set_id)
+    
+    def find_image_refs(self, image_ids, set_id=None):
+        return card_store().find_image_refs(image_ids, set_id=set_id)
+    
+    def count(self, set_id):
+        return card_store().count(set_id)
+    
+    def find_changed(self, set_id, since, until):
+        return card_store().find_changed(set_id, since, until)
+    
+    def find_with_set(self, card_id):
+        # One round trip: the card's set and the set's owner are joined with $lookup
+        db = Database()
+        collection, card_stages = card_store().card_stages(card_id)
+        results = list(db.db[collection].aggregate(card_stages + [
+            {'$lookup': {'from': 'flashcard_sets', 'localField': 'set_id', 'foreignField': '_id', 'as': 'set'}},
+            {'$unwind': {'path': '$set', 'preserveNullAndEmptyArrays': True}},
+            {'$lookup': {'from': 'users', 'localField': 'set.user_id', 'foreignField': '_id', 'as': 'owner'}}
+        ]))
+        if not results:
+            return None, None, None
+        set_data = results[0].pop('set', None)
+        owners = results[0].pop('owner')
+        return results[0], set_data, owners[0] if owners else None
+    
+    def add_tombstone(self, card_id, set_id, change_seq):
+        return unit_of_work.update_one(
+            Database().card_tombstones,
+            {'_id': card_id},
+            {'$set': {'set_id': set_id, 'change_seq': change_seq, 'deleted_at': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    def find_deleted(self, set_id, since, until):
+        tombstones = Database().card_tombstones.find(
+            {'set_id': set_id, 'change_seq': {'$gt': since, '$lte': until}},
+            {'_id': 1}
+        ).sort('change_seq', 1)
+        return [t['_id'] for t in tombstones]
+
+class MongoFeedRepository(FeedRepository):
+    def find_recent(self, limit):
+        return list(Database().set_feed.find().sort('created_at', DESCENDING).limit(limit))
+    
+    def find_popular(self, limit):
+        return list(Database().set_feed.find().sort([('views', DESCENDING), ('created_at', DESCENDING)]).limit(limit))
+    
+    def find_titles(self):
+        return list(Database().set_feed.find({}, {'title': 1, 'username': 1, 'card_count': 1, 'views': 1}))
+    
+    def find_many(self, set_ids):
+        return list(Database().set_feed.find({'_id': {'$in': list(set_ids)}}))
+    
+    def update(self, set_id, update, upsert=False, immediate=False):
+        collection = Database().set_feed
+        if immediate:
+            return collection.update_one({'_id': set_id}, update, upsert=upsert).matched_count
+        return _matched(unit_of_work.update_one(collection, {'_id': set_id}, update, upsert=upsert))
+    
+    def add_views(self, counts):
+        Database().set_feed.bulk_write(
+            [UpdateOne({'_id': set_id}, {'$inc': {'views': views}}) for set_id, views in counts.items()],
+            ordered=False)
+    
+    def delete(self, set_id):
+        result = unit_of_work.delete_one(Database().set_feed, {'_id': set_id})
+        return None if result is None else result.deleted_count
+    
+    def rebuild(self):
+        # Entries are merged in place so view counts survive; entries whose
+        # set is no longer public are removed afterwards
+        db = Database()
+        rebuilt_at = datetime.utcnow()
+        db.flashcard_sets.aggregate([
+            {'$match': {'is_public': True}},
+            {'$lookup': {'from': 'users', 'localField': 'user_id', 'foreignField': '_id', 'as': 'owner'}},
+            card_store().count_lookup('cards'),
+            {'$project': {
+                'title': 1,
+                'description': 1,
+                'user_id': 1,
+                'created_at': 1,
+                'updated_at': 1,
+                'username': {'$first': '$owner.username'},
+                'card_count': {'$ifNull': [{'$first': '$cards.n'}, 0]},
+                'rebuilt_at': rebuilt_at
+            }},
+            {'$merge': {'into': 'set_feed', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'insert'}}
+        ])
+        # Anything not touched by this rebuild is no longer a public set
+        return db.set_feed.delete_many({'$or': [
+            {'rebuilt_at': {'$lt': rebuilt_at}},
+            {'rebuilt_at': {'$exists': False}, 'updated_at': {'$lt': rebuilt_at}}
+        ]}).deleted_count
+
+class MongoJobRepository(JobRepository):
+    # Not queued on a unit of work: progress must be visible while the job runs
+    def insert(self, job):
+        Database().jobs.insert_one(job)
+    
+    def update(self, job_id, update):
+        return Database().jobs.update_one({'_id': job_id}, update).matched_count
+    
+    def find_by_id(self, job_id):
+        return Database().jobs.find_one({'_id': job_id})
+
+class MongoAttachmentRepository(AttachmentRepository):
+    """Files in the GridFS bucket `attachments` (attachments.files / attachments.chunks)"""
+    
+    bucket_name = 'attachments'
+    
+    @property
+    def bucket(self):
+        return GridFSBucket(Database().db, bucket_name=self.bucket_name)
+    
+    @property
+    def files(self):
+        return Database().db[f'{self.bucket_name}.files']
+    
+    def put(self, stream, metadata):
+        return self.bucket.upload_from_stream(metadata['kind'], stream, metadata=metadata)
+    
+    def open(self, attachment_id):
+        try:
+            return self.bucket.open_download_stream(attachment_id)
+        except NoFile:
+            return None
+    
+    def find_thumbnail(self, image_id):
+        thumbnail = self.files.find_one({'metadata.image_id': image_id}, {'_id': 1})
+        return thumbnail['_id'] if thumbnail else None
+    
+    def find_images(self, set_id=None, uploaded_before=None, after=None, limit=500):
+        query = {'metadata.kind': 'image'}
+        if set_id is not None:
+            query['metadata.set_id'] = set_id
+        if uploaded_before is not None:
+            query['uploadDate'] = {'$lt': uploaded_before}
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        files = self.files.find(query, {'_id': 1}).sort('_id', ASCENDING).limit(limit)
+        return [f['_id'] for f in files]
+    
+    def delete(self, image_ids):
+        if not image_ids:
+            return
+        image_ids = list(image_ids)
+        thumbnails = [f['_id'] for f in self.files.find({'metadata.image_id': {'$in': image_ids}}, {'_id': 1})]
+        file_ids = image_ids + thumbnails
+        # Files first, as GridFS does: a file without chunks is never listed
+        self.files.delete_many({'_id': {'$in': file_ids}})
+        Database().db[f'{self.bucket_name}.chunks'].delete_many({'files_id': {'$in': file_ids}})
+
+class MongoMinHashRepository(MinHashRepository):
+    # Not queued on a unit of work: written after the card writes commit
+    def put_many(self, documents):
+        if documents:
+            Database().minhashes.bulk_write([ReplaceOne({'_id': d['_id']}, d, upsert=True) for d in documents],
+                                            ordered=False)
+    
+    def delete_many(self, item_ids):
+        if item_ids:
+            Database().minhashes.delete_many({'_id': {'$in': list(item_ids)}})
+    
+    def delete_set(self, set_id):
+        Database().minhashes.delete_many({'set_id': set_id})
+    
+    def find_many(self, item_ids):
+        return list(Database().minhashes.find({'_id': {'$in': list(item_ids)}}))
+    
+    def find_fingerprints(self, set_id):
+        documents = Database().minhashes.find({'set_id': set_id, 'kind': 'card'}, {'fingerprint': 1})
+        return [d['fingerprint'] for d in documents]
+    
+    def find_matches(self, kind, keys, set_id=None):
+        query = {'kind': kind, 'keys': {'$in': list(keys)}}
+        if set_id is not None:
+            query['set_id'] = set_id
+        return list(Database().minhashes.find(query))
+    
+    def find_collisions(self, set_id):
+        groups = Database().minhashes.aggregate([
+            {'$match': {'set_id': set_id, 'kind': 'card'}},
+            {'$unwind': '$keys'},
+            {'$group': {'_id': '$keys', 'ids': {'$push': '$_id'}}},
+            {'$match': {'ids.1': {'$exists': True}}}
+        ])
+        return [group['ids'] for group in groups]
+
+class MongoStatsRepository(StatsRepository):
+    def find_user(self, user_id):
+        return Database().user_stats.find_one({'_id': user_id})
+    
+    def find_sets(self, user_id):
+        return list(Database().set_stats.find({'user_id': user_id}))
+    
+    def insert_set(self, document):
+        return unit_of_work.insert_one(Database().set_stats, document)
+    
+    def update_set(self, set_id, update):
+        return _matched(unit_of_work.update_one(Database().set_stats, {'_id': set_id}, update))
+    
+    def add_to_set(self, set_id, counts):
+        # Sent immediately (not queued): the set's owner is needed for the user's $inc
+        document = Database().set_stats.find_one_and_update({'_id': set_id}, {'$inc': counts},
+                                                            projection={'user_id': 1})
+        return document.get('user_id') if document else None
+    
+    def update_user(self, user_id, update, upsert=False):
+        return _matched(unit_of_work.update_one(Database().user_stats, {'_id': user_id}, update, upsert=upsert))
+    
+    def advance_streak(self, user_id, day, previous_day, reviewed_at):
+        # An update pipeline: each stage reads the fields as the stage before left them
+        streak = {'$ifNull': ['$streak', 0]}
+        Database().user_stats.update_one({'_id': user_id}, [
+            {'$set': {
+                **{key: {'$ifNull': [f'${key}', 0]} for key in ('sets', *COUNTERS)},
+                'streak': {'$cond': [{'$eq': ['$last_review_day', day]}, streak,
+                                     {'$cond': [{'$eq': ['$last_review_day', previous_day]},
+                                                {'$add': [streak, 1]}, 1]}]}
+            }},
+            {'$set': {
+                'longest_streak': {'$max': [{'$ifNull': ['$longest_streak', 0]}, '$streak']},
+                'last_review_day': day,
+                'updated_at': reviewed_at
+            }}
+        ], upsert=True)
+    
+    def delete_set(self, set_id):
+        return Database().set_stats.find_one_and_delete({'_id': set_id})
+    
+    def rebuild(self):
+        # Counters are merged into the existing documents, so streaks survive;
+        # documents of deleted sets are removed and users left without sets
+        # are zeroed afterwards
+        db = Database()
+        rebuilt_at = datetime.utcnow()
+        db.flashcard_sets.aggregate([
+            card_store().stats_lookup('stats', MASTERED),
+            {'$project': {
+                'user_id': 1,
+                **{key: {'$ifNull': [{'$first': f'$stats.{key}'}, 0]} for key in COUNTERS},
+                'last_reviewed': {'$first': '$stats.last_reviewed'},
+                'rebuilt_at': rebuilt_at
+            }},
+            {'$merge': {'into': 'set_stats', 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+        ])
+        db.set_stats.delete_many({'rebuilt_at': {'$ne': rebuilt_at}})
+        db.set_stats.aggregate([
+            {'$match': {'user_id': {'$ne': None}}},
+            {'$group': {'_id': '$user_id', 'sets': {'$sum': 1}, **{key: {'$sum': f'${key}'} for key in COUNTERS}}},
+            {'$addFields': {'rebuilt_at': rebuilt_at}},
+            {'$merge': {'into': 'user_stats', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'insert'}}
+        ])
+        db.user_stats.update_many({'rebuilt_at': {'$ne': rebuilt_at}},
+                                  {'$set': {'sets': 0, **dict.fromkeys(COUNTERS, 0), 'rebuilt_at': rebuilt_at}})
+        return db.set_stats.count_documents({}) + db.user_stats.count_documents({})
+
+class MongoBackend(Backend):
+    name = 'mongo'
+    
+    def __init__(self):
+        self.users = MongoUserRepository()
+        self.sets = MongoSetRepository()
+        self.cards = MongoCardRepository()
+        self.feed = MongoFeedRepository()
+        self.jobs = MongoJobRepository()
+        self.attachments = MongoAttachmentRepository()
+        self.minhashes = MongoMinHashRepository()
+        self.stats = MongoStatsRepository()
+    
+    def ensure_schema(self):
+        Database().ensure_indexes()
+    
+    def reset(self):
+        Database.reset()
+    
+    def ping(self):
+        Database().client.admin.command('ping')
+    
+    def pool_stats(self):
+        return Database().pool_stats()
@@ -0,0 +1,840 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from bson import ObjectId
+from config import setting
+from models.repositories.base import (UserRepository, SetRepository, CardRepository, FeedRepository, JobRepository,
+                                     AttachmentRepository, MinHashRepository, StatsRepository, Backend)
+from models.study_stats import COUNTERS, MASTERED
+from models.unit_of_work import current_unit_of_work
+from models.instrumentation import record_command
+
+# Embedded SQLite backend for single-node deployments and local runs: one
+# database file in WAL mode, a connection per thread, and the same document
+# shapes as MongoDB (ids are stored as 24-character hex and read back as
+# ObjectId, timestamps as ISO 8601). Writes made during a unit of work share
+# one transaction that commits with it.
+
+sqlite3.register_adapter(ObjectId, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('OBJECTID', lambda value: ObjectId(value.decode()))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    _id OBJECTID PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT,
+    created_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS flashcard_sets (
+    _id OBJECTID PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    user_id OBJECTID,
+    created_at DATETIME,
+    updated_at DATETIME,
+    is_public BOOLEAN NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    change_seq INTEGER NOT NULL DEFAULT 0,
+    changed_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS flashcard_sets_user ON flashcard_sets (user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS flashcard_sets_public ON flashcard_sets (is_public, created_at DESC);
+
+-- Title search: trigram full-text index kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS flashcard_sets_fts USING fts5(
+    title, content='flashcard_sets', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS flashcard_sets_fts_insert AFTER INSERT ON flashcard_sets BEGIN
+    INSERT INTO flashcard_sets_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS flashcard_sets_fts_delete AFTER DELETE ON flashcard_sets BEGIN
+    INSERT INTO flashcard_sets_fts (flashcard_sets_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS flashcard_sets_fts_update AFTER UPDATE OF title ON flashcard_sets BEGIN
+    INSERT INTO flashcard_sets_fts (flashcard_sets_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO flashcard_sets_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+
+CREATE TABLE IF NOT EXISTS flashcards (
+    _id OBJECTID PRIMARY KEY,
+    set_id OBJECTID NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    created_at DATETIME,
+    last_reviewed DATETIME,
+    difficulty TEXT,
+    times_reviewed INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME,
+    change_seq INTEGER NOT NULL DEFAULT 0,
+    rank TEXT,
+    image_id OBJECTID,
+    front_html TEXT,
+    back_html TEXT,
+    render_version INTEGER
+);
+CREATE INDEX IF NOT EXISTS flashcards_set ON flashcards (set_id, _id);
+CREATE INDEX IF NOT EXISTS flashcards_changes ON flashcards (set_id, change_seq);
+CREATE INDEX IF NOT EXISTS flashcards_rank ON flashcards (set_id, rank, _id);
+CREATE INDEX IF NOT EXISTS flashcards_image ON flashcards (image_id);
+
+CREATE TABLE IF NOT EXISTS card_tombstones (
+    _id OBJECTID PRIMARY KEY,
+    set_id OBJECTID NOT NULL,
+    change_seq INTEGER NOT NULL,
+    deleted_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS card_tombstones_changes ON card_tombstones (set_id, change_seq);
+
+CREATE TABLE IF NOT EXISTS set_feed (
+    _id OBJECTID PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    user_id OBJECTID,
+    username TEXT,
+    card_count INTEGER NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME,
+    updated_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS set_feed_recent ON set_feed (created_at DESC);
+CREATE INDEX IF NOT EXISTS set_feed_popular ON set_feed (views DESC, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    _id OBJECTID PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id OBJECTID,
+    target_id OBJECTID,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at DATETIME,
+    updated_at DATETIME
+);
+
+-- Card images and thumbnails, read and written in chunks through blob I/O
+CREATE TABLE IF NOT EXISTS attachments (
+    _id OBJECTID PRIMARY KEY,
+    set_id OBJECTID,
+    kind TEXT NOT NULL,
+    image_id OBJECTID,
+    content_type TEXT,
+    length INTEGER NOT NULL,
+    upload_date DATETIME,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attachments_set ON attachments (set_id, _id);
+CREATE INDEX IF NOT EXISTS attachments_image ON attachments (image_id);
+
+CREATE TABLE IF NOT EXISTS minhashes (
+    _id OBJECTID PRIMARY KEY,
+    kind TEXT NOT NULL,
+    set_id OBJECTID NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS minhashes_set ON minhashes (set_id, kind);
+
+-- One row per LSH band key of a minhashes row
+CREATE TABLE IF NOT EXISTS minhash_keys (
+    key INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    set_id OBJECTID NOT NULL,
+    item_id OBJECTID NOT NULL
+);
+CREATE INDEX IF NOT EXISTS minhash_keys_key ON minhash_keys (kind, key);
+CREATE INDEX IF NOT EXISTS minhash_keys_set ON minhash_keys (set_id, kind, key);
+CREATE INDEX IF NOT EXISTS minhash_keys_item ON minhash_keys (item_id);
+
+-- Study statistics (see models/study_stats.py)
+CREATE TABLE IF NOT EXISTS set_stats (
+    _id OBJECTID PRIMARY KEY,
+    user_id OBJECTID,
+    cards INTEGER NOT NULL DEFAULT 0,
+    reviewed INTEGER NOT NULL DEFAULT 0,
+    mastered INTEGER NOT NULL DEFAULT 0,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    last_reviewed DATETIME
+);
+CREATE INDEX IF NOT EXISTS set_stats_user ON set_stats (user_id);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    _id OBJECTID PRIMARY KEY,
+    sets INTEGER NOT NULL DEFAULT 0,
+    cards INTEGER NOT NULL DEFAULT 0,
+    reviewed INTEGER NOT NULL DEFAULT 0,
+    mastered INTEGER NOT NULL DEFAULT 0,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    last_review_day TEXT,
+    updated_at DATETIME
+);
+"""
+
+# Columns added to existing tables since they were first created:
+# (table, column, definition), added by ensure_schema() when missing
+ADDED_COLUMNS = [
+    ('flashcards', 'rank', 'TEXT'),
+    ('flashcards', 'image_id', 'OBJECTID'),
+    ('flashcards', 'front_html', 'TEXT'),
+    ('flashcards', 'back_html', 'TEXT'),
+    ('flashcards', 'render_version', 'INTEGER'),
+]
+
+# Bytes per read/write of an attachment blob
+ATTACHMENT_CHUNK_SIZE = 255 * 1024
+
+class SQLiteBackend(Backend):
+    name = 'sqlite'
+    settings = ('SQLITE_PATH',)
+    
+    def __init__(self, path=None):
+        self.path = path or setting('SQLITE_PATH')
+        self._local = threading.local()
+        self._columns = {}
+        self.users = SQLiteUserRepository(self)
+        self.sets = SQLiteSetRepository(self)
+        self.cards = SQLiteCardRepository(self)
+        self.feed = SQLiteFeedRepository(self)
+        self.jobs = SQLiteJobRepository(self)
+        self.attachments = SQLiteAttachmentRepository(self)
+        self.minhashes = SQLiteMinHashRepository(self)
+        self.stats = SQLiteStatsRepository(self)
+    
+    def connection(self):
+        """This thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+    
+    def ensure_schema(self):
+        conn = self.connection()
+        for table, column, definition in ADDED_COLUMNS:
+            existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if existing and column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        conn.executescript(SCHEMA)
+    
+    def reset(self):
+        self._local = threading.local()
+    
+    def ping(self):
+        self.connection().execute('SELECT 1').fetchone()
+    
+    def columns(self, table):
+        if table not in self._columns:
+            rows = self.connection().execute(f'PRAGMA table_info({table})').fetchall()
+            self._columns[table] = {row['name'] for row in rows}
+        return self._columns[table]
+    
+    def _check_columns(self, table, fields):
+        unknown = set(fields) - self.columns(table)
+        if unknown:
+            raise ValueError(f'Unknown {table} field(s): {", ".join(sorted(unknown))}')
+    
+    def execute(self, sql, params=(), fetch=None):
+        """
+        Run one statement on this thread's connection, timed for capture_commands().
+        
+        Returns:
+            The cursor, or fetch(cursor) when fetch is given
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            cursor = self.connection().execute(sql, params)
+            result = fetch(cursor) if fetch else cursor
+            ok = True
+            return result
+        finally:
+            record_command(sql.split(None, 1)[0].lower(), sql, start, ok=ok)
+    
+    def write(self, sql, params=(), fetch=None):
+        """Run a write; committed now, or with the active unit of work"""
+        # RETURNING rows are fetched before the commit, which needs the statement finished
+        result = self.execute(sql, params, fetch=fetch)
+        self._commit_or_enlist()
+        return result
+    
+    def write_many(self, sql, rows):
+        """Run a write once per row of parameters; committed now, or with the active unit of work"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            self.connection().executemany(sql, rows)
+            ok = True
+        finally:
+            record_command(sql.split(None, 1)[0].lower(), sql, start, ok=ok)
+        self._commit_or_enlist()
+    
+    def _commit_or_enlist(self):
+        conn = self.connection()
+        uow = current_unit_of_work()
+        if uow is None:
+            conn.commit()
+        else:
+            uow.enlist(id(conn), commit=conn.commit, rollback=conn.rollback)
+    
+    def query(self, sql, params=()):
+        return [dict(row) for row in self.execute(sql, params, fetch=lambda cursor: cursor.fetchall())]
+    
+    def query_one(self, sql, params=()):
+        row = self.execute(sql, params, fetch=lambda cursor: cursor.fetchone())
+        return dict(row) if row else None
+    
+    def insert(self, table, document):
+        self._check_columns(table, document)
+        columns = ', '.join(document)
+        placeholders = ', '.join('?' for _ in document)
+        return self.write(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', list(document.values()))
+    
+    def update(self, table, doc_id, update, expected_version=None, upsert=False):
+        """Apply a {'$set', '$inc', '$setOnInsert'} update document to one row. Returns rows matched."""
+        set_fields, inc_fields = update.get('$set', {}), update.get('$inc', {})
+        self._check_columns(table, list(set_fields) + list(inc_fields))
+        
+        assignments = [f'{field} = ?' for field in set_fields]
+        assignments += [f'{field} = COALESCE({field}, 0) + ?' for field in inc_fields]
+        params = list(set_fields.values()) + list(inc_fields.values()) + [doc_id]
+        sql = f'UPDATE {table} SET {", ".join(assignments)} WHERE _id = ?'
+        if expected_version is not None:
+            sql += ' AND COALESCE(version, 0) = ?'
+            params.append(expected_version)
+        
+        matched = self.write(sql, params).rowcount
+        if not matched and upsert:
+            self.insert(table, {'_id': doc_id, **update.get('$setOnInsert', {}), **set_fields, **inc_fields})
+        return matched
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def insert(self, user):
+        return self.backend.insert('users', user)
+    
+    def find_by_id(self, user_id):
+        return self.backend.query_one('SELECT * FROM users WHERE _id = ?', (user_id,))
+    
+    def find_by_username(self, username):
+        return self.backend.query_one('SELECT * FROM users WHERE username = ?', (username,))
+    
+    def find_by_email(self, email):
+        return self.backend.query_one('SELECT * FROM users WHERE email = ?', (email,))
+
+class SQLiteSetRepository(SetRepository):
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def insert(self, flashcard_set):
+        return self.backend.insert('flashcard_sets', flashcard_set)
+    
+    def update(self, set_id, update, expected_version=None, upsert=False, immediate=False):
+        return self.backend.update('flashcard_sets', set_id, update, expected_version=expected_version, upsert=upsert)
+    
+    def delete(self, set_id):
+        return self.backend.write('DELETE FROM flashcard_sets WHERE _id = ?', (set_id,)).rowcount
+    
+    def find_by_id(self, set_id):
+        return self.backend.query_one('SELECT * FROM flashcard_sets WHERE _id = ?', (set_id,))
+    
+    def find_many(self, set_ids):
+        set_ids = list(set_ids)
+        if not set_ids:
+            return []
+        placeholders = ', '.join('?' for _ in set_ids)
+        return self.backend.query(f'SELECT * FROM flashcard_sets WHERE _id IN ({placeholders})', set_ids)
+    
+    def find_with_owner(self, set_id):
+        flashcard_set = self.find_by_id(set_id)
+        if not flashcard_set:
+            return None, None
+        owner = self.backend.users.find_by_id(flashcard_set['user_id']) if flashcard_set['user_id'] else None
+        return flashcard_set, owner
+    
+    def find_by_user(self, user_id):
+        return self.backend.query('SELECT * FROM flashcard_sets WHERE user_id = ?', (user_id,))
+    
+    def find_public(self, limit):
+        return self.backend.query(
+            'SELECT * FROM flashcard_sets WHERE is_public = 1 ORDER BY created_at DESC LIMIT ?', (limit,))
+    
+    def search_public(self, query, limit):
+        if len(query) < 3:
+            # Shorter than one trigram: fall back to a LIKE scan
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            return self.backend.query(
+                "SELECT * FROM flashcard_sets WHERE is_public = 1 AND title LIKE ? ESCAPE '\\' LIMIT ?",
+                (pattern, limit))
+        phrase = '"' + query.replace('"', '""') + '"'
+        return self.backend.query(
+            'SELECT s.* FROM flashcard_sets_fts f JOIN flashcard_sets s ON s.rowid = f.rowid '
+            'WHERE flashcard_sets_fts MATCH ? AND s.is_public = 1 LIMIT ?', (phrase, limit))
+    
+    def next_change_seq(self, set_id):
+        row = self.backend.write(
+            'UPDATE flashcard_sets SET change_seq = change_seq + 1, changed_at = ? WHERE _id = ? RETURNING change_seq',
+            (datetime.utcnow(), set_id), fetch=lambda cursor: cursor.fetchone())
+        return row['change_seq'] if row else 0
+    
+    def find_ids(self):
+        return [row['_id'] for row in self.backend.query('SELECT _id FROM flashcard_sets')]
+    
+    def find_public_versions(self):
+        return self.backend.query(
+            'SELECT _id, title, description, version, change_seq FROM flashcard_sets WHERE is_public = 1')
+
+class SQLiteCardRepository(CardRepository):
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def insert(self, card):
+        return self.backend.insert('flashcards', card)
+    
+    def insert_many(self, cards):
+        if not cards:
+            return
+        self.backend._check_columns('flashcards', cards[0])
+        columns = list(cards[0])
+        self.backend.write_many(
+            f'INSERT INTO flashcards ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+            [[card[column] for column in columns] for card in cards])
+    
+    def update(self, card_id, update, expected_version=None, upsert=False, immediate=False):
+        return self.backend.update('flashcards', card_id, update, expected_version=expected_version, upsert=upsert)
+    
+    def delete(self, card_id, set_id):
+        return self.backend.write('DELETE FROM flashcards WHERE _id = ?', (card_id,)).rowcount
+    
+    def delete_set(self, set_id):
+        self.backend.write('DELETE FROM flashcards WHERE set_id = ?', (set_id,))
+        self.backend.write('DELETE FROM card_tombstones WHERE set_id = ?', (set_id,))
+    
+    def find_one(self, card_id):
+        return self.backend.query_one('SELECT * FROM flashcards WHERE _id = ?', (card_id,))
+    
+    def find_many(self, card_ids):
+        if not card_ids:
+            return []
+        placeholders = ', '.join('?' for _ in card_ids)
+        return self.backend.query(f'SELECT * FROM flashcards WHERE _id IN ({placeholders})', list(card_ids))
+    
+    def find_set(self, set_id):
+        return self.backend.query('SELECT * FROM flashcards WHERE set_id = ? ORDER BY rank, _id', (set_id,))
+    
+    def find_page(self, set_id, after=None, limit=50):
+        sql, params = 'SELECT * FROM flashcards WHERE set_id = ?', [set_id]
+        if after:
+            # NULL ranks (cards stored before ranks existed) sort first
+            rank, card_id = after
+            if rank is None:
+                sql += ' AND (rank IS NOT NULL OR _id > ?)'
+                params.append(card_id)
+            else:
+                sql += ' AND (rank > ? OR (rank = ? AND _id > ?))'
+                params += [rank, rank, card_id]
+        sql += ' ORDER BY rank, _id LIMIT ?'
+        params.append(limit or -1)
+        return self.backend.query(sql, params)
+    
+    def find_last(self, set_id):
+        return self.backend.query_one(
+            'SELECT * FROM flashcards WHERE set_id = ? ORDER BY rank DESC, _id DESC LIMIT 1', (set_id,))
+    
+    def set_fields(self, set_id, fields, change_seq):
+        now = datetime.utcnow()
+        # One executemany per set of columns written
+        rows_by_columns = {}
+        for card_id, values in fields.items():
+            rows_by_columns.setdefault(tuple(values), []).append((*values.values(), change_seq, now, card_id))
+        for columns, rows in rows_by_columns.items():
+            assignments = ''.join(f'{column} = ?, ' for column in columns)
+            self.backend.write_many(
+                f'UPDATE flashcards SET {assignments}change_seq = ?, updated_at = ? WHERE _id = ?', rows)
+    
+    def find_sets_to_rank(self, max_length):
+        rows = self.backend.query(
+            'SELECT DISTINCT set_id FROM flashcards WHERE rank IS NULL OR length(rank) > ?', (max_length,))
+        return [row['set_id'] for row in rows]
+    
+    def find_sets_to_render(self, render_version):
+        rows = self.backend.query(
+            'SELECT DISTINCT set_id FROM flashcards WHERE render_version IS NOT ?', (render_version,))
+        return [row['set_id'] for row in rows]
+    
+    def find_ids(self, set_id):
+        rows = self.backend.query('SELECT _id FROM flashcards WHERE set_id = ? ORDER BY _id', (set_id,))
+        return [row['_id'] for row in rows]
+    
+    def find_image_refs(self, image_ids, set_id=None):
+        image_ids = list(image_ids)
+        if not image_ids:
+            return set()
+        sql = f'SELECT DISTINCT image_id FROM flashcards WHERE image_id IN ({", ".join("?" for _ in image_ids)})'
+        params = image_ids
+        if set_id is not None:
+            sql += ' AND set_id = ?'
+            params = image_ids + [set_id]
+        return {row['image_id'] for row in self.backend.query(sql, params)}
+    
+    def count(self, set_id):
+        return self.backend.query_one('SELECT COUNT(*) AS n FROM flashcards WHERE set_id = ?', (set_id,))['n']
+    
+    def find_changed(self, set_id, since, until):
+        return self.backend.query(
+            'SELECT * FROM flashcards WHERE set_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq',
+            (set_id, since, until))
+    
+    def find_with_set(self, card_id):
+        card = self.find_one(card_id)
+        if not card:
+            return None, None, None
+        flashcard_set, owner = self.backend.sets.find_with_owner(card['set_id'])
+        return card, flashcard_set, owner
+    
+    def add_tombstone(self, card_id, set_id, change_seq):
+        return self.backend.write(
+            'INSERT INTO card_tombstones (_id, set_id, change_seq, deleted_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (_id) DO UPDATE SET set_id = excluded.set_id, change_seq = excluded.change_seq, '
+            'deleted_at = excluded.deleted_at',
+            (card_id, set_id, change_seq, datetime.utcnow()))
+    
+    def find_deleted(self, set_id, since, until):
+        rows = self.backend.query(
+            'SELECT _id FROM card_tombstones WHERE set_id = ? AND change_seq > ? AND change_seq <= ? '
+            'ORDER BY change_seq', (set_id, since, until))
+        return [row['_id'] for row in rows]
+
+class SQLiteFeedRepository(FeedRepository):
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def find_recent(self, limit):
+        return self.backend.query('SELECT * FROM set_feed ORDER BY created_at DESC LIMIT ?', (limit,))
+    
+    def find_popular(self, limit):
+        return self.backend.query('SELECT * FROM set_feed ORDER BY views DESC, created_at DESC LIMIT ?', (limit,))
+    
+    def find_titles(self):
+        return self.backend.query('SELECT _id, title, username, card_count, views FROM set_feed')
+    
+    def find_many(self, set_ids):
+        set_ids = list(set_ids)
+        if not set_ids:
+            return []
+        placeholders = ', '.join('?' for _ in set_ids)
+        return self.backend.query(f'SELECT * FROM set_feed WHERE _id IN ({placeholders})', set_ids)
+    
+    def update(self, set_id, update, upsert=False, immediate=False):
+        return self.backend.update('set_feed', set_id, update, upsert=upsert)
+    
+    def add_views(self, counts):
+        conn = self.backend.connection()
+        with conn:
+            conn.executemany('UPDATE set_feed SET views = views + ? WHERE _id = ?',
+                             [(views, set_id) for set_id, views in counts.items()])
+    
+    def delete(self, set_id):
+        return self.backend.write('DELETE FROM set_feed WHERE _id = ?', (set_id,)).rowcount
+    
+    def rebuild(self):
+        # One transaction: upsert every public set (keeping view counts), then
+        # drop entries for sets that are no longer public
+        conn = self.backend.connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO set_feed (_id, title, description, user_id, username, card_count, views,
+                                      created_at, updated_at)
+                SELECT s._id, s.title, s.description, s.user_id, u.username,
+                       (SELECT COUNT(*) FROM flashcards c WHERE c.set_id = s._id), 0,
+                       s.created_at, s.updated_at
+                FROM flashcard_sets s LEFT JOIN users u ON u._id = s.user_id
+                WHERE s.is_public = 1
+                ON CONFLICT (_id) DO UPDATE SET
+                    title = excluded.title, description = excluded.description, user_id = excluded.user_id,
+                    username = excluded.username, card_count = excluded.card_count,
+                    created_at = excluded.created_at, updated_at = excluded.updated_at
+            """)
+            return conn.execute(
+                'DELETE FROM set_feed WHERE _id NOT IN (SELECT _id FROM flashcard_sets WHERE is_public = 1)'
+            ).rowcount
+
+class SQLiteJobRepository(JobRepository):
+    # Committed at once, not with the unit of work: progress must be visible
+    # to other connections while the job runs
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def insert(self, job):
+        self.backend.insert('jobs', job)
+        self.backend.connection().commit()
+    
+    def update(self, job_id, update):
+        matched = self.backend.update('jobs', job_id, update)
+        self.backend.connection().commit()
+        return matched
+    
+    def find_by_id(self, job_id):
+        return self.backend.query_one('SELECT * FROM jobs WHERE _id = ?', (job_id,))
+
+class SQLiteFile:
+    """An attachment opened for reading: its blob, with GridOut's attributes"""
+    
+    def __init__(self, blob, row):
+        self._blob = blob
+        self.length = row['length']
+        self.upload_date = row['upload_date']
+        self.metadata = {field: row[field] for field in ('set_id', 'kind', 'image_id', 'content_type')
+                         if row[field] is not None}
+    
+    def read(self, size=-1):
+        return self._blob.read(size)
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._blob.seek(offset, whence)
+        return self._blob.tell()
+    
+    def tell(self):
+        return self._blob.tell()
+    
+    def seekable(self):
+        return True
+    
+    def close(self):
+        self._blob.close()
+
+class SQLiteAttachmentRepository(AttachmentRepository):
+    # Committed at once, like jobs: the file must exist before a card refers to it
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def put(self, stream, metadata):
+        # The blob is allocated at its full size, then filled chunk by chunk
+        start = stream.tell()
+        length = stream.seek(0, os.SEEK_END) - start
+        stream.seek(start)
+        attachment_id = ObjectId()
+        conn = self.backend.connection()
+        rowid = self.backend.execute(
+            'INSERT INTO attachments (_id, set_id, kind, image_id, content_type, length, upload_date, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, zeroblob(?))',
+            (attachment_id, metadata.get('set_id'), metadata['kind'], metadata.get('image_id'),
+             metadata.get('content_type'), length, datetime.utcnow(), length)).lastrowid
+        try:
+            with conn.blobopen('attachments', 'data', rowid) as blob:
+                while chunk := stream.read(ATTACHMENT_CHUNK_SIZE):
+                    blob.write(chunk)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        return attachment_id
+    
+    def open(self, attachment_id):
+        row = self.backend.query_one(
+            'SELECT rowid, set_id, kind, image_id, content_type, length, upload_date FROM attachments WHERE _id = ?',
+            (attachment_id,))
+        if not row:
+            return None
+        return SQLiteFile(self.backend.connection().blobopen('attachments', 'data', row['rowid'], readonly=True), row)
+    
+    def find_thumbnail(self, image_id):
+        row = self.backend.query_one('SELECT _id FROM attachments WHERE image_id = ?', (image_id,))
+        return row['_id'] if row else None
+    
+    def find_images(self, set_id=None, uploaded_before=None, after=None, limit=500):
+        sql, params = "SELECT _id FROM attachments WHERE kind = 'image'", []
+        if set_id is not None:
+            sql += ' AND set_id = ?'
+            params.append(set_id)
+        if uploaded_before is not None:
+            sql += ' AND upload_date < ?'
+            params.append(uploaded_before)
+        if after is not None:
+            sql += ' AND _id > ?'
+            params.append(after)
+        sql += ' ORDER BY _id LIMIT ?'
+        params.append(limit)
+        return [row['_id'] for row in self.backend.query(sql, params)]
+    
+    def delete(self, image_ids):
+        image_ids = list(image_ids)
+        if not image_ids:
+            return
+        placeholders = ', '.join('?' for _ in image_ids)
+        self.backend.execute(
+            f'DELETE FROM attachments WHERE _id IN ({placeholders}) OR image_id IN ({placeholders})',
+            image_ids + image_ids)
+        self.backend.connection().commit()
+
+class SQLiteMinHashRepository(MinHashRepository):
+    # Committed at once, like attachments: written after the card writes commit
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def _delete(self, conn, item_ids):
+        placeholders = ', '.join('?' for _ in item_ids)
+        conn.execute(f'DELETE FROM minhash_keys WHERE item_id IN ({placeholders})', item_ids)
+        conn.execute(f'DELETE FROM minhashes WHERE _id IN ({placeholders})', item_ids)
+    
+    def put_many(self, documents):
+        if not documents:
+            return
+        conn = self.backend.connection()
+        with conn:
+            self._delete(conn, [d['_id'] for d in documents])
+            conn.executemany(
+                'INSERT INTO minhashes (_id, kind, set_id, fingerprint, signature) VALUES (?, ?, ?, ?, ?)',
+                [(d['_id'], d['kind'], d['set_id'], d['fingerprint'], d['signature']) for d in documents])
+            conn.executemany(
+                'INSERT INTO minhash_keys (key, kind, set_id, item_id) VALUES (?, ?, ?, ?)',
+                [(key, d['kind'], d['set_id'], d['_id']) for d in documents for key in d['keys']])
+    
+    def delete_many(self, item_ids):
+        item_ids = list(item_ids)
+        if item_ids:
+            conn = self.backend.connection()
+            with conn:
+                self._delete(conn, item_ids)
+    
+    def delete_set(self, set_id):
+        conn = self.backend.connection()
+        with conn:
+            conn.execute('DELETE FROM minhash_keys WHERE set_id = ?', (set_id,))
+            conn.execute('DELETE FROM minhashes WHERE set_id = ?', (set_id,))
+    
+    def _with_keys(self, rows):
+        keys = {}
+        if rows:
+            item_ids = [row['_id'] for row in rows]
+            placeholders = ', '.join('?' for _ in item_ids)
+            for row in self.backend.query(
+                    f'SELECT item_id, key FROM minhash_keys WHERE item_id IN ({placeholders})', item_ids):
+                keys.setdefault(row['item_id'], []).append(row['key'])
+        return [{**row, 'keys': keys.get(row['_id'], [])} for row in rows]
+    
+    def find_many(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return []
+        placeholders = ', '.join('?' for _ in item_ids)
+        return self._with_keys(self.backend.query(f'SELECT * FROM minhashes WHERE _id IN ({placeholders})', item_ids))
+    
+    def find_fingerprints(self, set_id):
+        rows = self.backend.query("SELECT fingerprint FROM minhashes WHERE set_id = ? AND kind = 'card'", (set_id,))
+        return [row['fingerprint'] for row in rows]
+    
+    def find_matches(self, kind, keys, set_id=None):
+        keys = list(keys)
+        if not keys:
+            return []
+        sql = (f'SELECT DISTINCT m.* FROM minhash_keys k JOIN minhashes m ON m._id = k.item_id '
+               f'WHERE k.kind = ? AND k.key IN ({", ".join("?" for _ in keys)})')
+        params = [kind] + keys
+        if set_id is not None:
+            sql += ' AND k.set_id = ?'
+            params.append(set_id)
+        return self._with_keys(self.backend.query(sql, params))
+    
+    def find_collisions(self, set_id):
+        rows = self.backend.query(
+            "SELECT key, item_id FROM minhash_keys WHERE set_id = ? AND kind = 'card' AND key IN ("
+            "SELECT key FROM minhash_keys WHERE set_id = ? AND kind = 'card' GROUP BY key HAVING COUNT(*) > 1)",
+            (set_id, set_id))
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['key'], []).append(row['item_id'])
+        return list(groups.values())
+
+class SQLiteStatsRepository(StatsRepository):
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def find_user(self, user_id):
+        return self.backend.query_one('SELECT * FROM user_stats WHERE _id = ?', (user_id,))
+    
+    def find_sets(self, user_id):
+        return self.backend.query('SELECT * FROM set_stats WHERE user_id = ?', (user_id,))
+    
+    def insert_set(self, document):
+        return self.backend.insert('set_stats', document)
+    
+    def update_set(self, set_id, update):
+        return self.backend.update('set_stats', set_id, update)
+    
+    def add_to_set(self, set_id, counts):
+        self.backend._check_columns('set_stats', counts)
+        assignments = ', '.join(f'{field} = {field} + ?' for field in counts)
+        row = self.backend.write(f'UPDATE set_stats SET {assignments} WHERE _id = ? RETURNING user_id',
+                                 [*counts.values(), set_id], fetch=lambda cursor: cursor.fetchone())
+        return row['user_id'] if row else None
+    
+    def update_user(self, user_id, update, upsert=False):
+        return self.backend.update('user_stats', user_id, update, upsert=upsert)
+    
+    def advance_streak(self, user_id, day, previous_day, reviewed_at):
+        # On conflict the bare column names are the stored row's
+        streak = 'CASE last_review_day WHEN :day THEN streak WHEN :previous_day THEN streak + 1 ELSE 1 END'
+        self.backend.write(f"""
+            INSERT INTO user_stats (_id, streak, longest_streak, last_review_day, updated_at)
+            VALUES (:user_id, 1, 1, :day, :reviewed_at)
+            ON CONFLICT (_id) DO UPDATE SET
+                streak = {streak},
+                longest_streak = MAX(longest_streak, {streak}),
+                last_review_day = :day,
+                updated_at = :reviewed_at
+        """, {'user_id': user_id, 'day': day, 'previous_day': previous_day, 'reviewed_at': reviewed_at})
+    
+    def delete_set(self, set_id):
+        row = self.backend.write('DELETE FROM set_stats WHERE _id = ? RETURNING *', (set_id,),
+                                 fetch=lambda cursor: cursor.fetchone())
+        return dict(row) if row else None
+    
+    def rebuild(self):
+        # One transaction: upsert the counters of every set (keeping nothing
+        # else), drop the rows of deleted sets, then upsert the sums of each
+        # user's sets (keeping streaks) and zero users left without sets
+        counters = ', '.join(COUNTERS)
+        updates = ', '.join(f'{key} = excluded.{key}' for key in COUNTERS)
+        conn = self.backend.connection()
+        with conn:
+            conn.execute(f"""
+                INSERT INTO set_stats (_id, user_id, {counters}, last_reviewed)
+                SELECT s._id, s.user_id, COUNT(c._id), COALESCE(SUM(c.times_reviewed > 0), 0),
+                       COALESCE(SUM(c.difficulty = ?), 0), COALESCE(SUM(c.times_reviewed), 0), MAX(c.last_reviewed)
+                FROM flashcard_sets s LEFT JOIN flashcards c ON c.set_id = s._id
+                GROUP BY s._id
+                ON CONFLICT (_id) DO UPDATE SET user_id = excluded.user_id, {updates},
+                    last_reviewed = excluded.last_reviewed
+            """, (MASTERED,))
+            conn.execute('DELETE FROM set_stats WHERE _id NOT IN (SELECT _id FROM flashcard_sets)')
+            conn.execute(f"""
+                INSERT INTO user_stats (_id, sets, {counters})
+                SELECT user_id, COUNT(*), {', '.join(f'SUM({key})' for key in COUNTERS)}
+                FROM set_stats WHERE user_id IS NOT NULL
+                GROUP BY user_id
+                ON CONFLICT (_id) DO UPDATE SET sets = excluded.sets, {updates}
+            """)
+            conn.execute(f"""
+                UPDATE user_stats SET sets = 0, {', '.join(f'{key} = 0' for key in COUNTERS)}
+                WHERE _id NOT IN (SELECT user_id FROM set_stats WHERE user_id IS NOT NULL)
+            """)
+            return conn.execute('SELECT (SELECT COUNT(*) FROM set_stats) + (SELECT COUNT(*) FROM user_stats)').fetchone()[0]
@@ -0,0 +1,98 @@
+"""
+Rich text for card faces: Markdown with code and TeX math, rendered to
+sanitized HTML once, when a card is written, and stored with the card.
+    
+    **bold**, *italic*, `code`, ```fenced code```, lists, tables, links
+    $x^2$ inline math, $$\\sum_i x_i$$ display math (rendered to MathML)
+
+Pages insert the stored HTML as is, so nothing is rendered per request. The
+HTML carries the RENDERER_VERSION it was made with; bump it whenever the
+output of render() changes, and scripts/rerender_cards.py renders every
+card made with an older version again.
+"""
+from latex2mathml.converter import convert as latex_to_mathml
+from markdown_it import MarkdownIt
+from markupsafe import escape
+import nh3
+
+RENDERER_VERSION = 1
+
+# What render() may emit; anything else is dropped by the sanitizer
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'strong', 'em', 's', 'code', 'pre', 'blockquote', 'a',
+    'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td', 'span',
+    # MathML, as produced by latex2mathml
+    'math', 'semantics', 'annotation', 'mrow', 'mi', 'mn', 'mo', 'ms', 'mtext', 'mspace', 'mstyle',
+    'mfrac', 'msqrt', 'mroot', 'msub', 'msup', 'msubsup', 'munder', 'mover', 'munderover',
+    'mtable', 'mtr', 'mtd', 'mpadded', 'mphantom', 'menclose', 'merror',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'code': {'class'},
+    'ol': {'start'},
+    'span': {'class'},
+    'th': {'style'},
+    'td': {'style'},
+    '*': {'xmlns', 'display', 'mathvariant', 'stretchy', 'fence', 'separator', 'lspace', 'rspace',
+          'minsize', 'maxsize', 'movablelimits', 'accent', 'accentunder', 'columnalign', 'rowspacing',
+          'columnspacing', 'displaystyle', 'scriptlevel', 'width', 'height', 'depth', 'notation'},
+}
+
+def _math(state, silent):
+    """Inline rule for $...$ and $$...$$ (code spans are matched first, so $ in code stays literal)"""
+    src, start = state.src, state.pos
+    if src[start] != '$':
+        return False
+    delimiter = '$$' if src.startswith('$$', start) else '$'
+    content_start = start + len(delimiter)
+    end = src.find(delimiter, content_start)
+    while end != -1 and src[end - 1] == '\\':
+        end = src.find(delimiter, end + 1)
+    if end == -1 or end == content_start:
+        return False
+    content = src[content_start:end]
+    # "$5 and $10" is not math: inline math may not start or end with a space
+    if delimiter == '$' and (content[0].isspace() or content[-1].isspace()):
+        return False
+    if not silent:
+        token = state.push('math_display' if delimiter == '$$' else 'math_inline', 'math', 0)
+        token.content = content
+    state.pos = end + len(delimiter)
+    return True
+
+def _render_math(display):
+    def render_token(renderer, tokens, idx, options, env):
+        content = tokens[idx].content
+        try:
+            return latex_to_mathml(content, display='block' if display else 'inline')
+        except Exception:
+            # Invalid TeX is shown as typed
+            return f'<code class="math-error">{escape(content)}</code>'
+    return render_token
+
+_markdown = (MarkdownIt('commonmark', {'html': False, 'typographer': False})
+             .enable(['table', 'strikethrough']))
+_markdown.inline.ruler.before('escape', 'math', _math)
+_markdown.add_render_rule('math_inline', _render_math(display=False))
+_markdown.add_render_rule('math_display', _render_math(display=True))
+
+def render(source):
+    """
+    Render card text to sanitized HTML.
+    
+    Args:
+        source (str): Markdown with optional $TeX$ math
+    
+    Returns:
+        str: HTML that is safe to insert into a page as is
+    """
+    if not source:
+        return ''
+    html = _markdown.render(source)
+    return nh3.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                     url_schemes={'http', 'https', 'mailto'}, link_rel='noopener noreferrer nofollow')
+
+def fallback_html(source):
+    """HTML for text stored before cards were rendered: the source, escaped"""
+    return str(escape(source or ''))
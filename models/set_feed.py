@@ -0,0 +1,233 @@
+import atexit
+import logging
+import threading
+import time
+from bson import ObjectId
+from config import setting, with_app_settings
+from models.user import User
+from models.repositories import repositories, STORAGE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+class ViewCounter:
+    """
+    Page views counted in memory and added to the feed in one write per
+    flush interval, instead of one write per page view.
+    
+    A view arriving once the interval has passed starts the flush in a
+    background thread; the rest are written when the worker exits. Views
+    still counted in memory when a worker is killed are lost, which is
+    acceptable for a popularity signal.
+    """
+    
+    def __init__(self):
+        self._counts = {}  # set ID -> views not written yet
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._flushing = False
+        self._registered = False
+    
+    def add(self, set_id, flush_seconds):
+        """Count a view, starting a flush if the last one was at least flush_seconds ago"""
+        with self._lock:
+            self._counts[set_id] = self._counts.get(set_id, 0) + 1
+            start = not self._flushing and time.monotonic() - self._flushed_at >= flush_seconds
+            if start:
+                self._flushing = True
+            register, self._registered = not self._registered, True
+        if register:
+            atexit.register(with_app_settings(self.flush))
+        if start:
+            threading.Thread(target=with_app_settings(self._flush_in_background), name='view-counter',
+                             daemon=True).start()
+    
+    def flush(self):
+        """
+        Write the views counted so far.
+        
+        Returns:
+            int: Number of sets whose views were written
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._flushed_at = time.monotonic()
+        if not counts:
+            return 0
+        try:
+            repositories().feed.add_views(counts)
+        except STORAGE_ERRORS as e:
+            # Kept for the next flush
+            logger.warning(f'Failed to record page views: {e}')
+            with self._lock:
+                for set_id, views in counts.items():
+                    self._counts[set_id] = self._counts.get(set_id, 0) + views
+            return 0
+        return len(counts)
+    
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flushing = False
+
+_views = ViewCounter()
+
+class SetFeedEntry:
+    """
+    Denormalized summary of a public flashcard set.
+    
+    The set_feed collection holds one document per public set, keyed by the
+    set's _id, with the owner's username and card count already resolved.
+    It is kept current incrementally by the FlashcardSet/Flashcard write paths
+    and rebuilt from scratch by scripts/rebuild_feed.py, so the home page and
+    the public browse API are each served by a single indexed read.
+    """
+    
+    def __init__(self, _id, title, description=None, user_id=None, username=None,
+                 card_count=0, views=0, created_at=None, updated_at=None):
+        self._id = _id  # Same _id as the flashcard set
+        self.title = title
+        self.description = description or ""
+        self.user_id = user_id
+        self.username = username
+        self.card_count = card_count
+        self.views = views  # Popularity signal: public page views
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.is_public = True  # Only public sets are in the feed
+    
+    def to_dict(self):
+        """Convert feed entry to dictionary for MongoDB storage"""
+        return {
+            '_id': self._id,
+            'title': self.title,
+            'description': self.description,
+            'user_id': self.user_id,
+            'username': self.username,
+            'card_count': self.card_count,
+            'views': self.views,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create SetFeedEntry instance from MongoDB document"""
+        return cls(
+            _id=data['_id'],
+            title=data['title'],
+            description=data.get('description', ''),
+            user_id=data.get('user_id'),
+            username=data.get('username'),
+            card_count=data.get('card_count', 0),
+            views=data.get('views', 0),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at')
+        )
+    
+    @classmethod
+    def find_recent(cls, limit=10):
+        """Most recently created public sets"""
+        entries = repositories().feed.find_recent(limit)
+        return [cls.from_dict(e) for e in entries]
+    
+    @classmethod
+    def find_popular(cls, limit=10):
+        """Most viewed public sets"""
+        entries = repositories().feed.find_popular(limit)
+        return [cls.from_dict(e) for e in entries]
+    
+    @classmethod
+    def find_by_ids(cls, set_ids):
+        """Feed entries of the given sets that are public, in the order the IDs were given"""
+        set_ids = [ObjectId(s) if isinstance(s, str) else s for s in set_ids]
+        entries = {e['_id']: cls.from_dict(e) for e in repositories().feed.find_many(set_ids)}
+        return [entries[s] for s in set_ids if s in entries]
+    
+    @classmethod
+    def sync_set(cls, flashcard_set, was_public=None):
+        """
+        Bring the feed entry for a set in line after the set was written.
+        
+        Args:
+            flashcard_set (FlashcardSet): The set that was written
+            was_public (bool): Whether the set was public before the write, if
+                known. The entry is then written in a single operation that can
+                be queued on a unit of work; otherwise an update is tried first
+                and the entry created if there was none.
+        """
+        feed = repositories().feed
+        if not flashcard_set.is_public:
+            return cls.remove(flashcard_set._id)
+        
+        fields = {
+            'title': flashcard_set.title,
+            'description': flashcard_set.description,
+            'user_id': flashcard_set.user_id,
+            'created_at': flashcard_set.created_at,
+            'updated_at': flashcard_set.updated_at
+        }
+        if isinstance(fields['user_id'], str):
+            fields['user_id'] = ObjectId(fields['user_id'])
+        
+        if was_public:
+            return feed.update(flashcard_set._id, {'$set': fields})
+        if was_public is None:
+            matched = feed.update(flashcard_set._id, {'$set': fields}, immediate=True)
+            if matched:
+                return matched
+        
+        # Newly public: resolve the owner's username and the card count once
+        owner = User.find_by_id(fields['user_id']) if fields['user_id'] else None
+        return feed.update(
+            flashcard_set._id,
+            {
+                '$set': fields,
+                '$setOnInsert': {
+                    'username': owner.username if owner else None,
+                    'card_count': repositories().cards.count(flashcard_set._id),
+                    'views': 0
+                }
+            },
+            upsert=True
+        )
+    
+    @classmethod
+    def remove(cls, set_id):
+        """Drop a set from the feed (deleted or made private)"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().feed.delete(set_id)
+    
+    @classmethod
+    def adjust_card_count(cls, set_id, delta):
+        """Apply a card insert/delete to the set's feed entry, if it has one"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        return repositories().feed.update(set_id, {'$inc': {'card_count': delta}})
+    
+    @classmethod
+    def record_view(cls, set_id):
+        """Count a page view towards the set's popularity (written within VIEW_FLUSH_SECONDS, see ViewCounter)"""
+        if isinstance(set_id, str):
+            set_id = ObjectId(set_id)
+        _views.add(set_id, setting('VIEW_FLUSH_SECONDS'))
+    
+    @classmethod
+    def flush_views(cls):
+        """Write the page views this worker has counted but not written yet"""
+        return _views.flush()
+    
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute every feed entry from the stored sets, users and cards.
+        
+        Entries are merged in place so view counts survive; entries whose set
+        is no longer public are removed afterwards.
+        
+        Returns:
+            int: Number of stale entries removed
+        """
+        return repositories().feed.rebuild()
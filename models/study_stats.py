@@ -0,0 +1,182 @@
+import logging
+import weakref
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models.repositories import repositories, STORAGE_ERRORS
+from models import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# Counters kept per set and per user: the sums of what each card adds (see card_counts)
+COUNTERS = ('cards', 'reviewed', 'mastered', 'reviews')
+
+# A card counts as mastered while its last review rated it this difficulty
+MASTERED = 'easy'
+
+# Counter changes not applied yet: unit of work -> {set ID: {counter: delta}}
+_pending = weakref.WeakKeyDictionary()
+
+def _object_id(value):
+    return ObjectId(value) if isinstance(value, str) else value
+
+def card_counts(card):
+    """What one card (a Flashcard.to_dict() document) adds to its set's counters"""
+    times_reviewed = card.get('times_reviewed') or 0
+    return {
+        'cards': 1,
+        'reviewed': int(times_reviewed > 0),
+        'mastered': int(card.get('difficulty') == MASTERED),
+        'reviews': times_reviewed
+    }
+
+def _mastery(counts):
+    return round(counts['mastered'] / counts['cards'], 3) if counts['cards'] else 0.0
+
+class StudyStats:
+    """
+    Study statistics of each user and each of their sets, kept current
+    incrementally.
+    
+    Every set has a set_stats document, created with the set, counting its
+    cards, the cards reviewed at least once, the cards mastered and the
+    reviews in total. Every user with a set has a user_stats document with
+    the sums over their sets and their daily review streak. Card writes $inc
+    both once the unit of work commits, the changes to one set applied
+    together, so the dashboard reads one document instead of every card. A
+    failed write only leaves the counters off; scripts/rebuild_stats.py
+    recomputes them.
+    """
+    
+    @classmethod
+    def for_user(cls, user_id):
+        """A user's totals and streak (zeros for a user with no stats yet)"""
+        document = repositories().stats.find_user(_object_id(user_id)) or {}
+        counts = {key: document.get(key) or 0 for key in COUNTERS}
+        today = datetime.utcnow().date()
+        last_day = document.get('last_review_day')
+        # A streak is broken once a whole day passes without a review
+        current = last_day in (today.isoformat(), (today - timedelta(days=1)).isoformat())
+        return {
+            'sets': document.get('sets') or 0,
+            **counts,
+            'mastery': _mastery(counts),
+            'streak': (document.get('streak') or 0) if current else 0,
+            'longest_streak': document.get('longest_streak') or 0,
+            'last_review_day': last_day
+        }
+    
+    @classmethod
+    def for_sets(cls, user_id):
+        """{set ID: counters, mastery and last_reviewed} of a user's sets that have stats"""
+        result = {}
+        for document in repositories().stats.find_sets(_object_id(user_id)):
+            counts = {key: document.get(key) or 0 for key in COUNTERS}
+            result[document['_id']] = {**counts, 'mastery': _mastery(counts),
+                                       'last_reviewed': document.get('last_reviewed')}
+        return result
+    
+    @classmethod
+    def set_created(cls, flashcard_set):
+        """Start the counters of a new set at zero and count it for its owner"""
+        stats = repositories().stats
+        set_id, user_id = _object_id(flashcard_set._id), _object_id(flashcard_set.user_id)
+        stats.insert_set({'_id': set_id, 'user_id': user_id, **dict.fromkeys(COUNTERS, 0), 'last_reviewed': None})
+        if user_id is not None:
+            stats.update_user(user_id, {'$inc': {'sets': 1}, '$setOnInsert': dict.fromkeys(COUNTERS, 0)},
+                              upsert=True)
+    
+    @classmethod
+    def set_removed(cls, set_id, user_id):
+        """Take a deleted set's counters off its owner's, once the current unit of work commits"""
+        set_id, user_id = _object_id(set_id), _object_id(user_id)
+        unit_of_work.after_commit(lambda: cls._quietly(cls._remove_set, set_id, user_id))
+    
+    @classmethod
+    def cards_changed(cls, set_id, before=(), after=()):
+        """
+        Apply card writes to the counters of their set and its owner, once
+        the current unit of work commits.
+        
+        Args:
+            set_id: The cards' set
+            before (list): The cards' documents before the write (none for new cards)
+            after (list): Their documents after it (none for deleted cards)
+        """
+        counts = dict.fromkeys(COUNTERS, 0)
+        for documents, sign in ((after, 1), (before, -1)):
+            for document in documents:
+                for key, value in card_counts(document).items():
+                    counts[key] += sign * value
+        if not any(counts.values()):
+            return
+        set_id = _object_id(set_id)
+        uow = unit_of_work.current_unit_of_work()
+        if uow is None:
+            return cls._quietly(cls._add_to_set, set_id, counts)
+        changes = _pending.setdefault(uow, {})
+        if set_id not in changes:
+            changes[set_id] = dict.fromkeys(COUNTERS, 0)
+            uow.after_commit(lambda: cls._quietly(cls._add_to_set, set_id, changes.pop(set_id)))
+        for key, value in counts.items():
+            changes[set_id][key] += value
+    
+    @classmethod
+    def record_review(cls, user_id, set_id, reviewed_at):
+        """
+        Advance a user's daily review streak and a set's last review time
+        (the review itself is counted by cards_changed), once the current
+        unit of work commits.
+        
+        Days are UTC days: a review the day after the last one extends the
+        streak, a later one starts a new streak. The streak is advanced in
+        one write conditional on the stored last review day, so concurrent
+        reviews cannot both extend it.
+        """
+        user_id, set_id = _object_id(user_id), _object_id(set_id)
+        unit_of_work.after_commit(lambda: cls._quietly(cls._review, set_id, user_id, reviewed_at))
+    
+    @staticmethod
+    def _quietly(write, *args):
+        try:
+            write(*args)
+        except STORAGE_ERRORS as e:
+            # Left for scripts/rebuild_stats.py
+            logger.warning(f'Failed to update study stats of set {args[0]}: {e}')
+    
+    @staticmethod
+    def _add_to_set(set_id, counts):
+        counts = {key: value for key, value in counts.items() if value}
+        if not counts:
+            return
+        stats = repositories().stats
+        # A set without stats (stored before they existed) is counted by the next rebuild
+        user_id = stats.add_to_set(set_id, counts)
+        if user_id is not None:
+            stats.update_user(user_id, {'$inc': counts, '$set': {'updated_at': datetime.utcnow()}})
+    
+    @staticmethod
+    def _review(set_id, user_id, reviewed_at):
+        stats = repositories().stats
+        if user_id is not None:
+            day = reviewed_at.date()
+            stats.advance_streak(user_id, day.isoformat(), (day - timedelta(days=1)).isoformat(), reviewed_at)
+        stats.update_set(set_id, {'$set': {'last_reviewed': reviewed_at}})
+    
+    @staticmethod
+    def _remove_set(set_id, user_id):
+        stats = repositories().stats
+        document = stats.delete_set(set_id)
+        if document is not None and user_id is not None:
+            counts = {key: -(document.get(key) or 0) for key in COUNTERS}
+            stats.update_user(user_id, {'$inc': {'sets': -1, **counts}, '$set': {'updated_at': datetime.utcnow()}})
+    
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute every set's and user's counters from the stored sets and
+        cards. Streaks are kept: the cards only record their last review.
+        
+        Returns:
+            int: Number of set and user documents written
+        """
+        return repositories().stats.rebuild()
@@ -0,0 +1,101 @@
+class StaleWriteError(Exception):
+    """Raised when a version-checked update finds the document was changed by someone else"""
+
+class ChangeTracking:
+    """
+    Mixin that tracks which fields of a model changed since it was loaded.
+    
+    Models snapshot their to_dict() output when read from or written to the
+    database, and updates send only the difference: changed fields as $set,
+    changed COUNTER_FIELDS as $inc (so concurrent increments are not lost)
+    and a $inc of the document's version. Unchanged documents are not written.
+    """
+    
+    COUNTER_FIELDS = ()
+    
+    def _mark_clean(self):
+        """Record the current state as what is stored in the database"""
+        self._persisted = True
+        self._snapshot = self.to_dict()
+    
+    @property
+    def is_persisted(self):
+        """Whether this object was loaded from or written to the database"""
+        return getattr(self, '_persisted', False)
+    
+    def changed_fields(self):
+        """Names of the fields that differ from the stored document"""
+        snapshot = getattr(self, '_snapshot', {})
+        return [key for key, value in self.to_dict().items()
+                if key not in ('_id', 'version') and (key not in snapshot or snapshot[key] != value)]
+    
+    def _update_document(self, upsert=False):
+        """
+        Build the minimal update document for the fields changed since the snapshot.
+        
+        Args:
+            upsert (bool): Also carry the unchanged fields in $setOnInsert, so an
+                upsert that inserts writes the complete document
+        
+        Returns:
+            dict: Update document, or None if nothing changed
+        """
+        current = self.to_dict()
+        snapshot = getattr(self, '_snapshot', {})
+        set_fields, inc_fields = {}, {}
+        
+        for key in self.changed_fields():
+            old, new = snapshot.get(key), current[key]
+            if key in self.COUNTER_FIELDS and isinstance(old, int) and isinstance(new, int):
+                inc_fields[key] = new - old
+            else:
+                set_fields[key] = new
+        
+        if not set_fields and not inc_fields:
+            return None
+        
+        inc_fields['version'] = 1
+        update = {'$inc': inc_fields}
+        if set_fields:
+            update['$set'] = set_fields
+        if upsert:
+            unchanged = {key: value for key, value in current.items()
+                         if key not in set_fields and key not in inc_fields and key != '_id'}
+            if unchanged:
+                update['$setOnInsert'] = unchanged
+        return update
+    
+    def _write_changes(self, repository, check_version=False, upsert=False):
+        """
+        Write the changed fields of this object through its repository.
+        
+        Args:
+            repository: The model's repository (see models/repositories)
+            check_version (bool): Only apply the update if the stored version is
+                still self.version (optimistic concurrency control)
+            upsert (bool): Insert the document if it does not exist
+        
+        Returns:
+            int: Documents matched, or None if there was nothing to write or the
+            write was deferred to the active unit of work
+        
+        Raises:
+            StaleWriteError: check_version was set and the stored version differs
+        """
+        update = self._update_document(upsert=upsert)
+        if update is None:
+            return None
+        
+        # A version-checked write needs its own match count, so it is never deferred
+        matched = repository.update(
+            self._id, update,
+            expected_version=self.version if check_version else None,
+            upsert=upsert,
+            immediate=check_version
+        )
+        if check_version and not matched:
+            raise StaleWriteError(f'{type(self).__name__} {self._id} was modified since version {self.version}')
+        
+        self.version += 1
+        self._mark_clean()
+        return matched
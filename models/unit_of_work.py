@@ -0,0 +1,158 @@
+from contextvars import ContextVar
+from pymongo import InsertOne, UpdateOne, DeleteOne, DeleteMany
+from models.database import Database
+
+_current = ContextVar('unit_of_work', default=None)
+
+class UnitOfWork:
+    """
+    Collects model writes and flushes them as one ordered bulk_write per collection.
+    
+    While a unit of work is active (opened per request by app.py, or explicitly
+    with `with UnitOfWork():`), the model write paths queue their inserts,
+    updates and deletes here instead of sending them one by one. Collections
+    are flushed in the order they were first written to, and operations keep
+    their order within a collection.
+    
+    Writes are deferred, so code inside a unit of work does not see its own
+    queued writes when it reads from the database.
+    
+    Backends that write through their own transaction (the SQLite backend)
+    enlist it instead, and it is committed or rolled back with the unit of work.
+    """
+    
+    def __init__(self, transactional=False):
+        self.transactional = transactional  # Used only if the server supports it
+        self._operations = {}  # collection name -> [operation], in first-use order
+        self._transactions = {}  # key -> (commit, rollback) of enlisted backend transactions
+        self._after_commit = []  # callbacks run once the writes are committed
+        self._token = None
+    
+    def __enter__(self):
+        return self.begin()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.end()
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+    
+    def begin(self):
+        """Make this the active unit of work for the current context"""
+        self._token = _current.set(self)
+        return self
+    
+    def end(self):
+        """Stop queueing writes here (does not commit)"""
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+    
+    @property
+    def pending(self):
+        """Number of queued operations"""
+        return sum(len(ops) for ops in self._operations.values())
+    
+    def add(self, collection, operation):
+        """Queue a pymongo write operation (InsertOne, UpdateOne, ...) for a collection"""
+        self._operations.setdefault(collection.name, []).append(operation)
+    
+    def enlist(self, key, commit, rollback):
+        """Commit or roll back a backend transaction together with this unit of work"""
+        self._transactions.setdefault(key, (commit, rollback))
+    
+    def after_commit(self, callback):
+        """Call callback() once this unit of work has committed (not at all if it rolls back)"""
+        self._after_commit.append(callback)
+    
+    def rollback(self):
+        """Discard all queued operations and roll back enlisted transactions"""
+        self._operations = {}
+        self._after_commit = []
+        transactions, self._transactions = self._transactions, {}
+        for _, rollback in transactions.values():
+            rollback()
+    
+    def commit(self):
+        """
+        Flush queued operations, one bulk_write per collection, then commit
+        enlisted transactions (or roll them back if the flush fails).
+        
+        Returns:
+            dict: collection name -> BulkWriteResult
+        """
+        operations, self._operations = self._operations, {}
+        transactions, self._transactions = self._transactions, {}
+        callbacks, self._after_commit = self._after_commit, []
+        try:
+            results = self._flush_operations(operations) if operations else {}
+        except Exception:
+            for _, rollback in transactions.values():
+                rollback()
+            raise
+        for commit, _ in transactions.values():
+            commit()
+        # Callbacks write at once, not into an enclosing unit of work (which
+        # may still roll back)
+        token = _current.set(None)
+        try:
+            for callback in callbacks:
+                callback()
+        finally:
+            _current.reset(token)
+        return results
+    
+    def _flush_operations(self, operations):
+        db = Database()
+        if self.transactional and db.supports_transactions():
+            with db.client.start_session() as session:
+                return session.with_transaction(lambda s: self._flush(db, operations, s))
+        return self._flush(db, operations)
+    
+    @staticmethod
+    def _flush(db, operations, session=None):
+        return {
+            name: db.db[name].bulk_write(ops, ordered=True, session=session)
+            for name, ops in operations.items()
+        }
+
+def current_unit_of_work():
+    """The active UnitOfWork, or None"""
+    return _current.get()
+
+# Write helpers used by the models: queued when a unit of work is active,
+# sent immediately (returning the pymongo result) otherwise.
+
+def insert_one(collection, document):
+    uow = _current.get()
+    if uow is None:
+        return collection.insert_one(document)
+    uow.add(collection, InsertOne(document))
+
+def update_one(collection, query, update, upsert=False):
+    uow = _current.get()
+    if uow is None:
+        return collection.update_one(query, update, upsert=upsert)
+    uow.add(collection, UpdateOne(query, update, upsert=upsert))
+
+def delete_one(collection, query):
+    uow = _current.get()
+    if uow is None:
+        return collection.delete_one(query)
+    uow.add(collection, DeleteOne(query))
+
+def delete_many(collection, query):
+    uow = _current.get()
+    if uow is None:
+        return collection.delete_many(query)
+    uow.add(collection, DeleteMany(query))
+
+def after_commit(callback):
+    """Call callback() after the active unit of work commits, or now if there is none"""
+    uow = _current.get()
+    if uow is None:
+        callback()
+    else:
+        uow.after_commit(callback)
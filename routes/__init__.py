@@ -1,12 +1,20 @@
-from .auth import auth_bp
-from .flashcard_sets import sets_bp
-from .flashcards import cards_bp
-from .views import views_bp
-
-def register_blueprints(app):
-    """Register all blueprints with the Flask app"""
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(sets_bp, url_prefix='/sets')
-    app.register_blueprint(cards_bp, url_prefix='/cards')
-    app.register_blueprint(views_bp)
-
+from .auth import auth_bp
+from .flashcard_sets import sets_bp
+from .flashcards import cards_bp
+from .views import views_bp
+from .admin import admin_bp
+from .jobs import jobs_bp
+from .batch import batch_bp
+from .stats import stats_bp
+
+def register_blueprints(app):
+    """Register all blueprints with the Flask app"""
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(sets_bp, url_prefix='/sets')
+    app.register_blueprint(cards_bp, url_prefix='/cards')
+    app.register_blueprint(views_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(stats_bp, url_prefix='/stats')
+
@@ -0,0 +1,24 @@
+from flask import Blueprint, current_app, jsonify, send_file, url_for
+from utils.auth import admin_required
+from utils.profiling import list_profiles, profile_path
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def get_profiles(current_user):
+    """Recently captured request profiles, slowest first"""
+    profiles = list_profiles(current_app.config['PROFILE_DIR'])
+    for profile in profiles:
+        profile['speedscope_url'] = url_for('admin.get_profile', profile_id=profile['id'])
+    return jsonify({'profiles': profiles}), 200
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(current_user, profile_id):
+    """Download a profile as a speedscope file (open it at https://www.speedscope.app)"""
+    path = profile_path(current_app.config['PROFILE_DIR'], profile_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/json', as_attachment=True,
+                     download_name=f'{profile_id}.speedscope.json')
@@ -0,0 +1,307 @@
+import copy
+from flask import Blueprint, request, jsonify, current_app
+from bson import ObjectId
+from bson.errors import InvalidId
+from models.flashcard_set import FlashcardSet
+from models.flashcard import Flashcard
+from models.tracking import StaleWriteError
+from utils.auth import login_required
+
+batch_bp = Blueprint('batch', __name__)
+
+OPERATIONS = ('set.update', 'set.delete', 'card.create', 'card.update', 'card.delete')
+
+class OperationError(Exception):
+    """An operation that cannot run; it gets this status and message, the others still run"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _object_id(value, name):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise OperationError(400, f'{name} must be an ID')
+
+def _version(operation):
+    try:
+        return int(operation['version'])
+    except (TypeError, ValueError):
+        raise OperationError(400, 'version must be an integer')
+
+def _set_json(flashcard_set):
+    return {
+        'id': str(flashcard_set._id),
+        'title': flashcard_set.title,
+        'description': flashcard_set.description,
+        'user_id': str(flashcard_set.user_id),
+        'is_public': flashcard_set.is_public,
+        'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None,
+        'version': flashcard_set.version
+    }
+
+def _card_json(flashcard):
+    return {
+        'id': str(flashcard._id),
+        'front': flashcard.front,
+        'back': flashcard.back,
+        'front_html': flashcard.html[0],
+        'back_html': flashcard.html[1],
+        'set_id': str(flashcard.set_id),
+        'difficulty': flashcard.difficulty,
+        'times_reviewed': flashcard.times_reviewed,
+        'created_at': flashcard.created_at.isoformat() if flashcard.created_at else None,
+        'version': flashcard.version
+    }
+
+class Batch:
+    """
+    The operations of one POST /batch request, run in order for one user.
+    
+    Every set and card the operations name is read up front (one query for
+    the cards, one for the sets), and ownership is checked against the
+    already authenticated user, so no operation reads anything itself. The
+    writes are queued on the request's unit of work and committed together,
+    as one bulk write per collection; card writes to a set share one change
+    sequence number, and the cards created in a set are inserted together.
+    A version-checked update is written immediately, so it is refused for a
+    card or set the batch has already changed: it would be checked against
+    the stored document, without the batch's queued writes.
+    """
+    
+    def __init__(self, user, operations):
+        self.user = user
+        self.operations = operations
+        self.sets = {}  # set ID -> FlashcardSet, or None once deleted by the batch
+        self.cards = {}  # card ID -> Flashcard, or None once deleted by the batch
+        self.change_seqs = {}  # set ID -> change sequence number of the batch's card writes
+        self.changed = set()  # IDs of the cards and sets with writes queued by the batch
+        self.touched = set()  # IDs of the sets whose cards the batch deleted
+    
+    def run(self):
+        """
+        Run the operations.
+        
+        Returns:
+            list: One result per operation, in order: {'status': int, ...}
+        """
+        self._load()
+        results = [None] * len(self.operations)
+        for index, group in self._plan():
+            try:
+                if group is None:
+                    results[index] = self._run_one(self.operations[index])
+                else:
+                    for group_index, result in self._create_cards(group):
+                        results[group_index] = result
+            except OperationError as e:
+                targets = [index] if group is None else [i for i, _ in group]
+                for target in targets:
+                    results[target] = {'status': e.status, 'error': e.message}
+        self._touch_sets()
+        return results
+    
+    def _touch_sets(self):
+        """Bump updated_at once for each set the batch deleted cards from, as DELETE /cards/<id> does"""
+        for set_id in self.touched:
+            flashcard_set = self.sets.get(set_id)
+            if flashcard_set is not None:
+                flashcard_set.update()
+                self.changed.add(set_id)
+    
+    def _plan(self):
+        """
+        The order to run the operations in: (index, None) for one operation,
+        or (index, [(index, operation)]) for the card.create operations of a
+        set, run together at the first of them (until the set is deleted).
+        """
+        plan, open_groups = [], {}
+        for index, operation in enumerate(self.operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            set_id = str(operation.get('set_id')) if op in ('card.create', 'set.delete') else None
+            if op == 'card.create':
+                if set_id not in open_groups:
+                    open_groups[set_id] = []
+                    plan.append((index, open_groups[set_id]))
+                open_groups[set_id].append((index, operation))
+                continue
+            if op == 'set.delete':
+                open_groups.pop(set_id, None)
+            plan.append((index, None))
+        return plan
+    
+    def _load(self):
+        """Read every card and set the operations name, in one query each"""
+        card_ids, set_ids = set(), set()
+        for operation in self.operations:
+            if not isinstance(operation, dict):
+                continue
+            try:
+                if operation.get('op', '').startswith('card.') and 'card_id' in operation:
+                    card_ids.add(ObjectId(operation['card_id']))
+                elif 'set_id' in operation:
+                    set_ids.add(ObjectId(operation['set_id']))
+            except (InvalidId, TypeError, AttributeError):
+                continue
+        self.cards = {card._id: card for card in Flashcard.find_by_ids(list(card_ids))}
+        set_ids |= {ObjectId(card.set_id) if isinstance(card.set_id, str) else card.set_id
+                    for card in self.cards.values()}
+        self.sets = {s._id: s for s in FlashcardSet.find_by_ids(list(set_ids))}
+    
+    def _owned_set(self, set_id, forbidden_message):
+        flashcard_set = self.sets.get(set_id)
+        if flashcard_set is None:
+            raise OperationError(404, 'Flashcard set not found')
+        if str(flashcard_set.user_id) != str(self.user._id):
+            raise OperationError(403, forbidden_message)
+        return flashcard_set
+    
+    def _owned_card(self, operation, forbidden_message):
+        card_id = _object_id(operation.get('card_id'), 'card_id')
+        flashcard = self.cards.get(card_id)
+        if flashcard is None:
+            raise OperationError(404, 'Flashcard not found')
+        set_id = ObjectId(flashcard.set_id) if isinstance(flashcard.set_id, str) else flashcard.set_id
+        return flashcard, self._owned_set(set_id, forbidden_message)
+    
+    def _change_seq(self, flashcard_set):
+        """One change sequence number per set for all the batch's card writes to it"""
+        if flashcard_set._id not in self.change_seqs:
+            self.change_seqs[flashcard_set._id] = flashcard_set.next_change_seq()
+        return self.change_seqs[flashcard_set._id]
+    
+    def _run_one(self, operation):
+        if not isinstance(operation, dict):
+            raise OperationError(400, 'Each operation must be an object')
+        handler = self.HANDLERS.get(operation.get('op'))
+        if handler is None:
+            raise OperationError(400, f'op must be one of {", ".join(OPERATIONS)}')
+        return handler(self, operation)
+    
+    def _update_set(self, operation):
+        set_id = _object_id(operation.get('set_id'), 'set_id')
+        # Changed on a copy, kept only once written: a rejected update must
+        # not be saved by a later operation on the set
+        flashcard_set = copy.copy(self._owned_set(set_id, 'You can only update your own flashcard sets'))
+        version = _version(operation) if 'version' in operation else None
+        if version is not None and set_id in self.changed:
+            raise OperationError(409, 'Flashcard set was already changed by this batch, '
+                                      'send its version-checked update before its other changes')
+        if 'title' in operation and not operation['title']:
+            raise OperationError(400, 'Title is required')
+        if 'title' in operation:
+            flashcard_set.title = operation['title']
+        if 'description' in operation:
+            flashcard_set.description = operation['description']
+        if 'is_public' in operation:
+            flashcard_set.is_public = bool(operation['is_public'])
+        if version is not None:
+            flashcard_set.version = version
+        try:
+            flashcard_set.update(check_version=version is not None)
+        except StaleWriteError:
+            raise OperationError(409, 'Flashcard set was modified by another request, reload and try again')
+        self.sets[set_id] = flashcard_set
+        if version is None:
+            self.changed.add(set_id)
+        return {'status': 200, 'set': _set_json(flashcard_set)}
+    
+    def _delete_set(self, operation):
+        set_id = _object_id(operation.get('set_id'), 'set_id')
+        flashcard_set = self._owned_set(set_id, 'You can only delete your own flashcard sets')
+        flashcard_set.delete()
+        self.sets[set_id] = None
+        return {'status': 200, 'message': 'Flashcard set deleted successfully'}
+    
+    def _create_cards(self, group):
+        """Insert the cards of a set's card.create operations together"""
+        set_id = _object_id(group[0][1].get('set_id'), 'set_id')
+        flashcard_set = self._owned_set(set_id, 'You can only add flashcards to your own sets')
+        results, valid = [], []
+        for index, operation in group:
+            if not operation.get('front') or not operation.get('back'):
+                results.append((index, {'status': 400, 'error': 'Both front and back are required'}))
+            else:
+                valid.append((index, operation))
+        flashcards = flashcard_set.add_flashcards([(operation['front'], operation['back']) for _, operation in valid])
+        self.changed.add(set_id)
+        for (index, _), flashcard in zip(valid, flashcards):
+            self.cards[flashcard._id] = flashcard
+            results.append((index, {'status': 201, 'flashcard': _card_json(flashcard)}))
+        return results
+    
+    def _update_card(self, operation):
+        flashcard, flashcard_set = self._owned_card(operation, 'You can only update flashcards in your own sets')
+        # Changed on a copy, as in _update_set
+        flashcard = copy.copy(flashcard)
+        version = _version(operation) if 'version' in operation else None
+        if version is not None and flashcard._id in self.changed:
+            raise OperationError(409, 'Flashcard was already changed by this batch, '
+                                      'send its version-checked update before its other changes')
+        if 'front' in operation:
+            flashcard.front = operation['front']
+        if 'back' in operation:
+            flashcard.back = operation['back']
+        if 'difficulty' in operation:
+            flashcard.difficulty = operation['difficulty']
+        if version is not None:
+            flashcard.version = version
+        try:
+            flashcard.update(check_version=version is not None, change_seq=self._change_seq(flashcard_set))
+        except StaleWriteError:
+            raise OperationError(409, 'Flashcard was modified by another request, reload and try again')
+        self.cards[flashcard._id] = flashcard
+        if version is None:
+            self.changed.add(flashcard._id)
+        return {'status': 200, 'flashcard': _card_json(flashcard)}
+    
+    def _delete_card(self, operation):
+        flashcard, flashcard_set = self._owned_card(operation, 'You can only delete flashcards from your own sets')
+        flashcard.delete(change_seq=self._change_seq(flashcard_set))
+        self.cards[flashcard._id] = None
+        self.touched.add(flashcard_set._id)
+        return {'status': 200, 'message': 'Flashcard deleted successfully'}
+    
+    HANDLERS = {
+        'set.update': _update_set,
+        'set.delete': _delete_set,
+        'card.update': _update_card,
+        'card.delete': _delete_card,
+    }
+
+@batch_bp.route('/batch', methods=['POST'])
+@login_required
+def run_batch(current_user):
+    """
+    Run an ordered list of set and card operations in one request:
+    {"operations": [{"op": "card.update", "card_id": ..., "front": ...}, ...]}
+    
+    Operations, with the fields of their single-item endpoints:
+        set.update   set_id, title, description, is_public, version
+        set.delete   set_id
+        card.create  set_id, front, back
+        card.update  card_id, front, back, difficulty, version
+        card.delete  card_id
+    
+    Each operation gets a result with the status its endpoint would answer
+    with; one failing does not stop the others. Card moves are not batched:
+    each reads the ranks of its new neighbours, which the batch's own queued
+    writes would not show.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('operations'), list):
+        return jsonify({'error': 'operations is required (a list of operations)'}), 400
+    
+    operations = data['operations']
+    max_operations = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > max_operations:
+        return jsonify({'error': f'A batch can hold at most {max_operations} operations'}), 413
+    
+    try:
+        results = Batch(current_user, operations).run()
+        return jsonify({'results': results, 'count': len(results)}), 200
+    except Exception as e:
+        return jsonify({'error': f'Batch failed: {str(e)}'}), 500
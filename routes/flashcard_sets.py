@@ -1,252 +1,647 @@
-from flask import Blueprint, request, jsonify
-from bson import ObjectId
-from models.flashcard_set import FlashcardSet
-from models.flashcard import Flashcard
-from utils.auth import login_required
-
-sets_bp = Blueprint('sets', __name__)
-
-@sets_bp.route('', methods=['POST'])
-@login_required
-def create_set(current_user):
-    """Create a new flashcard set"""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
-    
-    title = data.get('title')
-    description = data.get('description', '')
-    is_public = data.get('is_public', False)
-    
-    if not title:
-        return jsonify({'error': 'Title is required'}), 400
-    
-    # Create flashcard set
-    flashcard_set = FlashcardSet(
-        title=title,
-        description=description,
-        user_id=str(current_user._id),
-        is_public=is_public
-    )
-    
-    try:
-        flashcard_set.save()
-        return jsonify({
-            'message': 'Flashcard set created successfully',
-            'set': {
-                'id': str(flashcard_set._id),
-                'title': flashcard_set.title,
-                'description': flashcard_set.description,
-                'user_id': str(flashcard_set.user_id),
-                'is_public': flashcard_set.is_public,
-                'created_at': flashcard_set.created_at.isoformat() if flashcard_set.created_at else None
-            }
-        }), 201
-    except Exception as e:
-        return jsonify({'error': f'Failed to create flashcard set: {str(e)}'}), 500
-
-@sets_bp.route('', methods=['GET'])
-def get_sets():
-    """Get flashcard sets - user's own sets if authenticated, or public sets"""
-    user_id = request.args.get('user_id')  # Optional: get specific user's sets
-    public_only = request.args.get('public_only', 'false').lower() == 'true'
-    
-    # Check if requesting user's own sets
-    from flask import session
-    current_user_id = session.get('user_id')
-    
-    if user_id:
-        # Get specific user's sets
-        sets = FlashcardSet.find_by_user_id(user_id)
-        # Only show public sets if not the owner
-        if not current_user_id or str(user_id) != current_user_id:
-            sets = [s for s in sets if s.is_public]
-    elif public_only or not current_user_id:
-        # Get public sets only
-        limit = int(request.args.get('limit', 50))
-        sets = FlashcardSet.find_public_sets(limit=limit)
-    else:
-        # Get current user's sets
-        sets = FlashcardSet.find_by_user_id(current_user_id)
-    
-    return jsonify({
-        'sets': [{
-            'id': str(s._id),
-            'title': s.title,
-            'description': s.description,
-            'user_id': str(s.user_id) if s.user_id else None,
-            'is_public': s.is_public,
-            'created_at': s.created_at.isoformat() if s.created_at else None,
-            'updated_at': s.updated_at.isoformat() if s.updated_at else None
-        } for s in sets]
-    }), 200
-
-@sets_bp.route('/<set_id>', methods=['GET'])
-def get_set(set_id):
-    """Get a specific flashcard set by ID"""
-    try:
-        flashcard_set = FlashcardSet.find_by_id(set_id)
-        
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check if user has access (owner or public)
-        from flask import session
-        current_user_id = session.get('user_id')
-        
-        is_owner = current_user_id and str(flashcard_set.user_id) == current_user_id
-        if not flashcard_set.is_public and not is_owner:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        # Get flashcards in this set
-        flashcards = flashcard_set.get_flashcards()
-        
-        return jsonify({
-            'set': {
-                'id': str(flashcard_set._id),
-                'title': flashcard_set.title,
-                'description': flashcard_set.description,
-                'user_id': str(flashcard_set.user_id) if flashcard_set.user_id else None,
-                'is_public': flashcard_set.is_public,
-                'created_at': flashcard_set.created_at.isoformat() if flashcard_set.created_at else None,
-                'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None,
-                'is_owner': is_owner
-            },
-            'flashcards': [{
-                'id': str(c._id),
-                'front': c.front,
-                'back': c.back,
-                'set_id': str(c.set_id),
-                'difficulty': c.difficulty,
-                'times_reviewed': c.times_reviewed,
-                'created_at': c.created_at.isoformat() if c.created_at else None
-            } for c in flashcards]
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to get flashcard set: {str(e)}'}), 500
-
-@sets_bp.route('/<set_id>', methods=['PUT'])
-@login_required
-def update_set(set_id, current_user):
-    """Update a flashcard set (only owner can update)"""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
-    
-    try:
-        flashcard_set = FlashcardSet.find_by_id(set_id)
-        
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check ownership
-        if str(flashcard_set.user_id) != str(current_user._id):
-            return jsonify({'error': 'You can only update your own flashcard sets'}), 403
-        
-        # Update fields
-        if 'title' in data:
-            flashcard_set.title = data['title']
-        if 'description' in data:
-            flashcard_set.description = data['description']
-        if 'is_public' in data:
-            flashcard_set.is_public = bool(data['is_public'])
-        
-        flashcard_set.update()
-        
-        return jsonify({
-            'message': 'Flashcard set updated successfully',
-            'set': {
-                'id': str(flashcard_set._id),
-                'title': flashcard_set.title,
-                'description': flashcard_set.description,
-                'user_id': str(flashcard_set.user_id),
-                'is_public': flashcard_set.is_public,
-                'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to update flashcard set: {str(e)}'}), 500
-
-@sets_bp.route('/<set_id>', methods=['DELETE'])
-@login_required
-def delete_set(set_id, current_user):
-    """Delete a flashcard set (only owner can delete)"""
-    try:
-        flashcard_set = FlashcardSet.find_by_id(set_id)
-        
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check ownership
-        if str(flashcard_set.user_id) != str(current_user._id):
-            return jsonify({'error': 'You can only delete your own flashcard sets'}), 403
-        
-        flashcard_set.delete()
-        
-        return jsonify({'message': 'Flashcard set deleted successfully'}), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to delete flashcard set: {str(e)}'}), 500
-
-@sets_bp.route('/my-sets', methods=['GET'])
-@login_required
-def get_my_sets(current_user):
-    """Get current user's flashcard sets"""
-    try:
-        sets = FlashcardSet.find_by_user_id(str(current_user._id))
-        
-        return jsonify({
-            'sets': [{
-                'id': str(s._id),
-                'title': s.title,
-                'description': s.description,
-                'user_id': str(s.user_id),
-                'is_public': s.is_public,
-                'created_at': s.created_at.isoformat() if s.created_at else None,
-                'updated_at': s.updated_at.isoformat() if s.updated_at else None
-            } for s in sets]
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to get flashcard sets: {str(e)}'}), 500
-
-@sets_bp.route('/search', methods=['GET'])
-def search_sets():
-    """Search flashcard sets by title"""
-    query = request.args.get('q', '').strip()
-    
-    if not query:
-        return jsonify({'error': 'Search query is required'}), 400
-    
-    try:
-        from models.user import User
-        limit = int(request.args.get('limit', 50))
-        sets = FlashcardSet.search_by_title(query, limit=limit)
-        
-        # Get usernames for each set
-        sets_with_usernames = []
-        for s in sets:
-            username = None
-            if s.user_id:
-                user = User.find_by_id(str(s.user_id))
-                if user:
-                    username = user.username
-            
-            sets_with_usernames.append({
-                'id': str(s._id),
-                'title': s.title,
-                'description': s.description,
-                'user_id': str(s.user_id) if s.user_id else None,
-                'username': username,
-                'is_public': s.is_public,
-                'created_at': s.created_at.isoformat() if s.created_at else None
-            })
-        
-        return jsonify({
-            'query': query,
-            'sets': sets_with_usernames,
-            'count': len(sets_with_usernames)
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Search failed: {str(e)}'}), 500
-
+import gzip
+from flask import Blueprint, request, jsonify, send_file, Response, current_app, url_for
+from werkzeug.wsgi import wrap_file
+from bson import ObjectId
+from bson.errors import InvalidId
+from models.attachment import Attachment
+from models.duplicates import DuplicateIndex
+from models.minhash import DUPLICATE_THRESHOLD, MIN_THRESHOLD
+from models.flashcard_set import FlashcardSet
+from models.flashcard import Flashcard
+from models.set_feed import SetFeedEntry
+from models.tracking import StaleWriteError
+from models.job import Job
+from utils.auth import login_required
+from utils.validators import validate_version
+from utils.snapshots import snapshot_for, snapshot_path
+from utils.quiz import build_quiz, QUIZ_SIZE, CHOICES
+from utils.similar import NEIGHBOURS
+from utils.study import new_shuffle_seed
+from utils.permissions import resolve_set, is_owner as session_owns, can_read, set_owner_required
+
+sets_bp = Blueprint('sets', __name__)
+
+@sets_bp.route('', methods=['POST'])
+@login_required
+def create_set(current_user):
+    """Create a new flashcard set"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    title = data.get('title')
+    description = data.get('description', '')
+    is_public = data.get('is_public', False)
+    
+    if not title:
+        return jsonify({'error': 'Title is required'}), 400
+    
+    # Create flashcard set
+    flashcard_set = FlashcardSet(
+        title=title,
+        description=description,
+        user_id=str(current_user._id),
+        is_public=is_public
+    )
+    
+    try:
+        flashcard_set.save()
+        return jsonify({
+            'message': 'Flashcard set created successfully',
+            'set': {
+                'id': str(flashcard_set._id),
+                'title': flashcard_set.title,
+                'description': flashcard_set.description,
+                'user_id': str(flashcard_set.user_id),
+                'is_public': flashcard_set.is_public,
+                'created_at': flashcard_set.created_at.isoformat() if flashcard_set.created_at else None
+            }
+        }), 201
+    except Exception as e:
+        return jsonify({'error': f'Failed to create flashcard set: {str(e)}'}), 500
+
+@sets_bp.route('', methods=['GET'])
+def get_sets():
+    """Get flashcard sets - user's own sets if authenticated, or public sets"""
+    user_id = request.args.get('user_id')  # Optional: get specific user's sets
+    public_only = request.args.get('public_only', 'false').lower() == 'true'
+    
+    # Check if requesting user's own sets
+    from flask import session
+    current_user_id = session.get('user_id')
+    
+    if user_id:
+        # Get specific user's sets
+        sets = FlashcardSet.find_by_user_id(user_id)
+        # Only show public sets if not the owner
+        if not current_user_id or str(user_id) != current_user_id:
+            sets = [s for s in sets if s.is_public]
+    elif public_only or not current_user_id:
+        # Get public sets only, served from the precomputed feed
+        limit = int(request.args.get('limit', 50))
+        if request.args.get('sort') == 'popular':
+            entries = SetFeedEntry.find_popular(limit=limit)
+        else:
+            entries = SetFeedEntry.find_recent(limit=limit)
+        
+        return jsonify({
+            'sets': [{
+                'id': str(e._id),
+                'title': e.title,
+                'description': e.description,
+                'user_id': str(e.user_id) if e.user_id else None,
+                'username': e.username,
+                'card_count': e.card_count,
+                'is_public': e.is_public,
+                'created_at': e.created_at.isoformat() if e.created_at else None,
+                'updated_at': e.updated_at.isoformat() if e.updated_at else None
+            } for e in entries]
+        }), 200
+    else:
+        # Get current user's sets
+        sets = FlashcardSet.find_by_user_id(current_user_id)
+    
+    return jsonify({
+        'sets': [{
+            'id': str(s._id),
+            'title': s.title,
+            'description': s.description,
+            'user_id': str(s.user_id) if s.user_id else None,
+            'is_public': s.is_public,
+            'created_at': s.created_at.isoformat() if s.created_at else None,
+            'updated_at': s.updated_at.isoformat() if s.updated_at else None
+        } for s in sets]
+    }), 200
+
+@sets_bp.route('/<set_id>', methods=['GET'])
+def get_set(set_id):
+    """Get a specific flashcard set by ID"""
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        # Check if user has access (owner or public)
+        is_owner = session_owns(flashcard_set)
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        # Get flashcards in this set
+        flashcards = flashcard_set.get_flashcards()
+        
+        return jsonify({
+            'set': {
+                'id': str(flashcard_set._id),
+                'title': flashcard_set.title,
+                'description': flashcard_set.description,
+                'user_id': str(flashcard_set.user_id) if flashcard_set.user_id else None,
+                'is_public': flashcard_set.is_public,
+                'created_at': flashcard_set.created_at.isoformat() if flashcard_set.created_at else None,
+                'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None,
+                'version': flashcard_set.version,
+                'is_owner': is_owner
+            },
+            'sync_token': str(flashcard_set.sync_token()),
+            'flashcards': [{
+                'id': str(c._id),
+                'front': c.front,
+                'back': c.back,
+                'front_html': c.html[0],
+                'back_html': c.html[1],
+                'set_id': str(c.set_id),
+                'difficulty': c.difficulty,
+                'times_reviewed': c.times_reviewed,
+                'created_at': c.created_at.isoformat() if c.created_at else None
+            } for c in flashcards]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get flashcard set: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/changes', methods=['GET'])
+def get_set_changes(set_id):
+    """Get the cards created, updated or deleted since a sync token (?since=)"""
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({'error': 'Invalid sync token'}), 400
+        
+        # No token, or one this set never issued: the client must replace its copy
+        reset = since <= 0 or since > flashcard_set.change_seq
+        if reset:
+            changed, deleted = flashcard_set.get_flashcards(), []
+            token = flashcard_set.sync_token()
+        else:
+            changed, deleted, token = flashcard_set.get_changes(since)
+        
+        return jsonify({
+            'set': {
+                'id': str(flashcard_set._id),
+                'title': flashcard_set.title,
+                'description': flashcard_set.description,
+                'is_public': flashcard_set.is_public,
+                'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None,
+                'version': flashcard_set.version
+            },
+            'reset': reset,
+            'changed': [{
+                'id': str(c._id),
+                'front': c.front,
+                'back': c.back,
+                'front_html': c.html[0],
+                'back_html': c.html[1],
+                'difficulty': c.difficulty,
+                'times_reviewed': c.times_reviewed,
+                'rank': c.rank,
+                'image_id': str(c.image_id) if c.image_id else None,
+                'created_at': c.created_at.isoformat() if c.created_at else None,
+                'updated_at': c.updated_at.isoformat() if c.updated_at else None,
+                'version': c.version
+            } for c in changed],
+            'deleted': [str(card_id) for card_id in deleted],
+            'sync_token': str(token)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get changes: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/quiz', methods=['GET'])
+def get_set_quiz(set_id):
+    """
+    Multiple-choice questions from a set's cards (?size=&choices=&seed=):
+    each card's front, with its back among the backs most like it.
+    """
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        seed = request.args.get('seed', type=int)
+        if seed is None:
+            seed = new_shuffle_seed()
+        quiz = build_quiz(
+            flashcard_set,
+            size=request.args.get('size', QUIZ_SIZE, type=int),
+            choices=request.args.get('choices', CHOICES, type=int),
+            seed=seed
+        )
+        
+        return jsonify({
+            'set_id': str(flashcard_set._id),
+            'seed': seed,
+            'questions': [{
+                'id': str(card._id),
+                'front': card.front,
+                'front_html': card.html[0],
+                'image_id': str(card.image_id) if card.image_id else None,
+                'choices': [{
+                    'id': str(option._id),
+                    'back': option.back,
+                    'back_html': option.html[1]
+                } for option in options],
+                'answer': answer
+            } for card, options, answer in quiz]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to build quiz: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/duplicates', methods=['GET'])
+def get_set_duplicates(set_id):
+    """
+    Groups of near-duplicate cards in a set, and public sets that are near
+    copies of it (?threshold=, an estimated Jaccard similarity, 0.7 to 1)
+    """
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        threshold = request.args.get('threshold', DUPLICATE_THRESHOLD, type=float)
+        threshold = min(max(threshold, MIN_THRESHOLD), 1.0)
+        
+        groups = DuplicateIndex.find_duplicate_cards(flashcard_set._id, threshold=threshold)
+        cards = {c._id: c for c in Flashcard.find_by_ids([card_id for card_ids, _ in groups for card_id in card_ids])}
+        copies = []
+        for copy_id, similarity in DuplicateIndex.find_copies(flashcard_set._id, threshold=threshold):
+            copy = FlashcardSet.find_by_id(copy_id)
+            if copy and copy.is_public:
+                copies.append({'id': str(copy._id), 'title': copy.title, 'similarity': round(similarity, 3)})
+        
+        return jsonify({
+            'set_id': str(flashcard_set._id),
+            'threshold': threshold,
+            'groups': [{
+                'similarity': round(similarity, 3),
+                'cards': [{
+                    'id': str(cards[card_id]._id),
+                    'front': cards[card_id].front,
+                    'back': cards[card_id].back
+                } for card_id in card_ids if card_id in cards]
+            } for card_ids, similarity in groups],
+            'copies': copies
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to find duplicates: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/similar', methods=['GET'])
+def get_similar_sets(set_id):
+    """Public sets about the same subject as this one, most similar first (?limit=)"""
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        limit = request.args.get('limit', current_app.config['SIMILAR_MAX_RESULTS'], type=int)
+        limit = max(1, min(limit, NEIGHBOURS))
+        neighbours, indexed = current_app.extensions['similar'].similar(flashcard_set)
+        similarity = {neighbour_id: score for neighbour_id, score in neighbours if neighbour_id != flashcard_set._id}
+        # Through the feed: sets made private or deleted since the index was built drop out
+        entries = SetFeedEntry.find_by_ids(list(similarity))[:limit]
+        
+        return jsonify({
+            'set_id': str(flashcard_set._id),
+            'indexed': indexed,
+            'sets': [{
+                'id': str(entry._id),
+                'title': entry.title,
+                'description': entry.description,
+                'username': entry.username,
+                'card_count': entry.card_count,
+                'similarity': round(similarity[entry._id], 3)
+            } for entry in entries]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to find similar sets: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/snapshot', methods=['GET'])
+def get_current_snapshot(set_id):
+    """Hash and URL of the snapshot of a set's current version, compiling it if needed"""
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        snapshot_hash, card_count = snapshot_for(flashcard_set)
+        
+        response = jsonify({
+            'snapshot_hash': snapshot_hash,
+            'card_count': card_count,
+            'url': url_for('sets.get_set_snapshot', set_id=str(flashcard_set._id), snapshot_hash=snapshot_hash)
+        })
+        # The current version changes with every edit; the snapshot it names does not
+        response.headers['Cache-Control'] = 'no-cache'
+        return response, 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get snapshot: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/snapshot/<snapshot_hash>', methods=['GET'])
+def get_set_snapshot(set_id, snapshot_hash):
+    """Download an immutable, content-addressed snapshot of a set (gzipped JSON)"""
+    flashcard_set, owner = resolve_set(set_id)
+    
+    if not flashcard_set:
+        return jsonify({'error': 'Flashcard set not found'}), 404
+    
+    if not can_read(flashcard_set):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    path = snapshot_path(flashcard_set, snapshot_hash)
+    if not path:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    
+    cache_control = f"{'public' if flashcard_set.is_public else 'private'}, max-age=31536000, immutable"
+    
+    if 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        with open(path, 'rb') as f:
+            response = Response(gzip.decompress(f.read()), mimetype='application/json')
+        response.set_etag(snapshot_hash)
+    else:
+        # Served as stored; send_file handles If-None-Match and Range
+        response = send_file(path, mimetype='application/json', etag=snapshot_hash, conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@sets_bp.route('/<set_id>/images/<image_id>', methods=['GET'])
+def get_set_image(set_id, image_id):
+    """Download an image used by a card of the set"""
+    return _send_image(set_id, image_id, thumbnail=False)
+
+@sets_bp.route('/<set_id>/images/<image_id>/thumbnail', methods=['GET'])
+def get_set_image_thumbnail(set_id, image_id):
+    """Download the thumbnail of an image used by a card of the set"""
+    return _send_image(set_id, image_id, thumbnail=True)
+
+def _send_image(set_id, image_id, thumbnail):
+    flashcard_set, owner = resolve_set(set_id)
+    
+    if not flashcard_set:
+        return jsonify({'error': 'Flashcard set not found'}), 404
+    
+    if not can_read(flashcard_set):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    try:
+        image = Attachment.open_image(flashcard_set._id, image_id, thumbnail=thumbnail)
+    except InvalidId:
+        image = None
+    if image is None:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    # Streamed a chunk at a time; a Range request seeks in the stored file.
+    # Files are never changed in place (a new image gets a new ID), so the
+    # ID is a strong ETag and the response can be cached forever.
+    response = current_app.response_class(
+        wrap_file(request.environ, image, buffer_size=64 * 1024),
+        mimetype=image.metadata.get('content_type', 'application/octet-stream'),
+        direct_passthrough=True
+    )
+    response.content_length = image.length
+    response.last_modified = image.upload_date
+    response.set_etag(f"{image_id}{'-thumbnail' if thumbnail else ''}")
+    response.headers['Cache-Control'] = f"{'public' if flashcard_set.is_public else 'private'}, max-age=31536000, immutable"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response.make_conditional(request, accept_ranges=True, complete_length=image.length)
+
+@sets_bp.route('/<set_id>', methods=['PUT'])
+@set_owner_required('You can only update your own flashcard sets')
+def update_set(set_id, current_user, flashcard_set):
+    """Update a flashcard set (only owner can update)"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    if 'version' in data:
+        is_valid, error = validate_version(data['version'])
+        if not is_valid:
+            return jsonify({'error': error}), 400
+    
+    try:
+        # Update fields
+        if 'title' in data:
+            flashcard_set.title = data['title']
+        if 'description' in data:
+            flashcard_set.description = data['description']
+        if 'is_public' in data:
+            flashcard_set.is_public = bool(data['is_public'])
+        
+        # Optional optimistic concurrency: reject the write if the set changed
+        # since the version the client read
+        if 'version' in data:
+            flashcard_set.version = int(data['version'])
+        flashcard_set.update(check_version='version' in data)
+        
+        return jsonify({
+            'message': 'Flashcard set updated successfully',
+            'set': {
+                'id': str(flashcard_set._id),
+                'title': flashcard_set.title,
+                'description': flashcard_set.description,
+                'user_id': str(flashcard_set.user_id),
+                'is_public': flashcard_set.is_public,
+                'updated_at': flashcard_set.updated_at.isoformat() if flashcard_set.updated_at else None,
+                'version': flashcard_set.version
+            }
+        }), 200
+    except StaleWriteError:
+        return jsonify({'error': 'Flashcard set was modified by another request, reload and try again'}), 409
+    except Exception as e:
+        return jsonify({'error': f'Failed to update flashcard set: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>', methods=['DELETE'])
+@set_owner_required('You can only delete your own flashcard sets')
+def delete_set(set_id, current_user, flashcard_set):
+    """Delete a flashcard set (only owner can delete)"""
+    try:
+        flashcard_set.delete()
+        
+        return jsonify({'message': 'Flashcard set deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to delete flashcard set: {str(e)}'}), 500
+
+@sets_bp.route('/<set_id>/clone', methods=['POST'])
+@login_required
+def clone_set(set_id, current_user):
+    """
+    Copy a readable set, cards included, into a new private set of the
+    current user. Large sets are copied by a background job: the response is
+    then 202 with the job to poll for progress.
+    """
+    source, _ = resolve_set(set_id)
+    
+    if not source:
+        return jsonify({'error': 'Flashcard set not found'}), 404
+    
+    if not can_read(source):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    chunk_size = current_app.config['CLONE_CHUNK_SIZE']
+    
+    try:
+        total = Flashcard.count_by_set_id(source._id)
+        copy = source.create_copy(current_user._id, title=data.get('title'))
+        copy_json = {
+            'id': str(copy._id),
+            'title': copy.title,
+            'description': copy.description,
+            'user_id': str(copy.user_id),
+            'is_public': copy.is_public,
+            'created_at': copy.created_at.isoformat() if copy.created_at else None
+        }
+        
+        if total <= current_app.config['CLONE_SYNC_LIMIT']:
+            copied = copy.copy_cards_from(source._id, chunk_size=chunk_size)
+            return jsonify({
+                'message': 'Flashcard set copied successfully',
+                'set': copy_json,
+                'card_count': copied
+            }), 201
+        
+        job = Job('clone', user_id=current_user._id, target_id=copy._id, total=total)
+        job.save()
+        job.run(lambda job: copy.copy_cards_from(source._id, chunk_size=chunk_size, progress=job.report))
+        job_url = url_for('jobs.get_job', job_id=str(job._id))
+        return jsonify({
+            'message': 'Copying flashcards',
+            'set': copy_json,
+            'job': {
+                'id': str(job._id),
+                'status': job.status,
+                'done': job.done,
+                'total': job.total,
+                'url': job_url
+            }
+        }), 202, {'Location': job_url}
+    except Exception as e:
+        return jsonify({'error': f'Failed to copy flashcard set: {str(e)}'}), 500
+
+@sets_bp.route('/my-sets', methods=['GET'])
+@login_required
+def get_my_sets(current_user):
+    """Get current user's flashcard sets"""
+    try:
+        sets = FlashcardSet.find_by_user_id(str(current_user._id))
+        
+        return jsonify({
+            'sets': [{
+                'id': str(s._id),
+                'title': s.title,
+                'description': s.description,
+                'user_id': str(s.user_id),
+                'is_public': s.is_public,
+                'created_at': s.created_at.isoformat() if s.created_at else None,
+                'updated_at': s.updated_at.isoformat() if s.updated_at else None
+            } for s in sets]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get flashcard sets: {str(e)}'}), 500
+
+@sets_bp.route('/suggest', methods=['GET'])
+def suggest_sets():
+    """Typeahead: the most popular public set titles matching what has been typed"""
+    query = request.args.get('q', '')
+    
+    try:
+        limit = int(request.args.get('limit', 0)) or None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    try:
+        entries = current_app.extensions['suggest'].suggest(query, limit=limit)
+    except Exception as e:
+        return jsonify({'error': f'Failed to get suggestions: {str(e)}'}), 500
+    
+    response = jsonify({
+        'query': query,
+        'suggestions': [{
+            'id': str(e['_id']),
+            'title': e['title'],
+            'username': e.get('username'),
+            'card_count': e.get('card_count', 0)
+        } for e in entries]
+    })
+    # Same answer for everyone until the index is next refreshed
+    response.headers['Cache-Control'] = f"public, max-age={int(current_app.config['SUGGEST_REFRESH_SECONDS'])}"
+    return response, 200
+
+@sets_bp.route('/search', methods=['GET'])
+def search_sets():
+    """
+    Search flashcard sets by title. Near-identical sets (copies of one deck)
+    are folded into the first of them and listed in its `copies`, unless
+    ?collapse=0.
+    """
+    query = request.args.get('q', '').strip()
+    
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    
+    try:
+        from models.user import User
+        limit = int(request.args.get('limit', 50))
+        sets = FlashcardSet.search_by_title(query, limit=limit)
+        
+        if request.args.get('collapse', '1') != '0':
+            folded = DuplicateIndex.collapse_sets([s._id for s in sets])
+        else:
+            folded = {s._id: [] for s in sets}
+        collapsed = len(sets) - len(folded)
+        sets = [s for s in sets if s._id in folded]
+        
+        # Get usernames for each set
+        sets_with_usernames = []
+        for s in sets:
+            username = None
+            if s.user_id:
+                user = User.find_by_id(str(s.user_id))
+                if user:
+                    username = user.username
+            
+            sets_with_usernames.append({
+                'id': str(s._id),
+                'title': s.title,
+                'description': s.description,
+                'user_id': str(s.user_id) if s.user_id else None,
+                'username': username,
+                'is_public': s.is_public,
+                'created_at': s.created_at.isoformat() if s.created_at else None,
+                'copies': [str(copy_id) for copy_id in folded[s._id]]
+            })
+        
+        return jsonify({
+            'query': query,
+            'sets': sets_with_usernames,
+            'count': len(sets_with_usernames),
+            'collapsed': collapsed
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Search failed: {str(e)}'}), 500
+
@@ -1,197 +1,373 @@
-from flask import Blueprint, request, jsonify
-from models.flashcard_set import FlashcardSet
-from models.flashcard import Flashcard
-from utils.auth import login_required
-
-cards_bp = Blueprint('cards', __name__)
-
-@cards_bp.route('/set/<set_id>', methods=['POST'])
-@login_required
-def create_flashcard(set_id, current_user):
-    """Add a flashcard to a set (only owner can add)"""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
-    
-    front = data.get('front')
-    back = data.get('back')
-    
-    if not front or not back:
-        return jsonify({'error': 'Both front and back are required'}), 400
-    
-    try:
-        # Get the flashcard set
-        flashcard_set = FlashcardSet.find_by_id(set_id)
-        
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check ownership
-        if str(flashcard_set.user_id) != str(current_user._id):
-            return jsonify({'error': 'You can only add flashcards to your own sets'}), 403
-        
-        # Add flashcard to set
-        flashcard = flashcard_set.add_flashcard(front=front, back=back)
-        
-        return jsonify({
-            'message': 'Flashcard added successfully',
-            'flashcard': {
-                'id': str(flashcard._id),
-                'front': flashcard.front,
-                'back': flashcard.back,
-                'set_id': str(flashcard.set_id),
-                'created_at': flashcard.created_at.isoformat() if flashcard.created_at else None
-            }
-        }), 201
-    except Exception as e:
-        return jsonify({'error': f'Failed to create flashcard: {str(e)}'}), 500
-
-@cards_bp.route('/set/<set_id>', methods=['GET'])
-def get_flashcards(set_id):
-    """Get all flashcards in a set"""
-    try:
-        flashcard_set = FlashcardSet.find_by_id(set_id)
-        
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check if user has access (owner or public)
-        from flask import session
-        current_user_id = session.get('user_id')
-        
-        is_owner = current_user_id and str(flashcard_set.user_id) == current_user_id
-        if not flashcard_set.is_public and not is_owner:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        flashcards = flashcard_set.get_flashcards()
-        
-        return jsonify({
-            'flashcards': [{
-                'id': str(c._id),
-                'front': c.front,
-                'back': c.back,
-                'set_id': str(c.set_id),
-                'difficulty': c.difficulty,
-                'times_reviewed': c.times_reviewed,
-                'last_reviewed': c.last_reviewed.isoformat() if c.last_reviewed else None,
-                'created_at': c.created_at.isoformat() if c.created_at else None
-            } for c in flashcards]
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to get flashcards: {str(e)}'}), 500
-
-@cards_bp.route('/<card_id>', methods=['GET'])
-def get_flashcard(card_id):
-    """Get a specific flashcard by ID"""
-    try:
-        flashcard = Flashcard.find_by_id(card_id)
-        
-        if not flashcard:
-            return jsonify({'error': 'Flashcard not found'}), 404
-        
-        # Get the set to check access
-        flashcard_set = FlashcardSet.find_by_id(str(flashcard.set_id))
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check if user has access (owner or public)
-        from flask import session
-        current_user_id = session.get('user_id')
-        
-        is_owner = current_user_id and str(flashcard_set.user_id) == current_user_id
-        if not flashcard_set.is_public and not is_owner:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        return jsonify({
-            'flashcard': {
-                'id': str(flashcard._id),
-                'front': flashcard.front,
-                'back': flashcard.back,
-                'set_id': str(flashcard.set_id),
-                'difficulty': flashcard.difficulty,
-                'times_reviewed': flashcard.times_reviewed,
-                'last_reviewed': flashcard.last_reviewed.isoformat() if flashcard.last_reviewed else None,
-                'created_at': flashcard.created_at.isoformat() if flashcard.created_at else None
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to get flashcard: {str(e)}'}), 500
-
-@cards_bp.route('/<card_id>', methods=['PUT'])
-@login_required
-def update_flashcard(card_id, current_user):
-    """Update a flashcard (only owner of the set can update)"""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No data provided'}), 400
-    
-    try:
-        flashcard = Flashcard.find_by_id(card_id)
-        
-        if not flashcard:
-            return jsonify({'error': 'Flashcard not found'}), 404
-        
-        # Get the set to check ownership
-        flashcard_set = FlashcardSet.find_by_id(str(flashcard.set_id))
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check ownership
-        if str(flashcard_set.user_id) != str(current_user._id):
-            return jsonify({'error': 'You can only update flashcards in your own sets'}), 403
-        
-        # Update fields
-        if 'front' in data:
-            flashcard.front = data['front']
-        if 'back' in data:
-            flashcard.back = data['back']
-        if 'difficulty' in data:
-            flashcard.difficulty = data['difficulty']
-        
-        flashcard.update()
-        
-        return jsonify({
-            'message': 'Flashcard updated successfully',
-            'flashcard': {
-                'id': str(flashcard._id),
-                'front': flashcard.front,
-                'back': flashcard.back,
-                'set_id': str(flashcard.set_id),
-                'difficulty': flashcard.difficulty,
-                'times_reviewed': flashcard.times_reviewed
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to update flashcard: {str(e)}'}), 500
-
-@cards_bp.route('/<card_id>', methods=['DELETE'])
-@login_required
-def delete_flashcard(card_id, current_user):
-    """Delete a flashcard (only owner of the set can delete)"""
-    try:
-        flashcard = Flashcard.find_by_id(card_id)
-        
-        if not flashcard:
-            return jsonify({'error': 'Flashcard not found'}), 404
-        
-        # Get the set to check ownership
-        flashcard_set = FlashcardSet.find_by_id(str(flashcard.set_id))
-        if not flashcard_set:
-            return jsonify({'error': 'Flashcard set not found'}), 404
-        
-        # Check ownership
-        if str(flashcard_set.user_id) != str(current_user._id):
-            return jsonify({'error': 'You can only delete flashcards from your own sets'}), 403
-        
-        flashcard.delete()
-        
-        # Update set's updated_at timestamp
-        flashcard_set.updated_at = flashcard_set.updated_at
-        flashcard_set.update()
-        
-        return jsonify({'message': 'Flashcard deleted successfully'}), 200
-    except Exception as e:
-        return jsonify({'error': f'Failed to delete flashcard: {str(e)}'}), 500
-
+import os
+from flask import Blueprint, request, jsonify, current_app
+from bson.errors import InvalidId
+from models.attachment import Attachment
+from models.duplicates import DuplicateIndex
+from models.flashcard import Flashcard
+from models.tracking import StaleWriteError
+from utils.images import inspect_image, make_thumbnail
+from utils.permissions import resolve_set, resolve_card, can_read, set_owner_required, card_owner_required
+from utils.study import study_window, STUDY_WINDOW
+from utils.validators import validate_version
+
+cards_bp = Blueprint('cards', __name__)
+
+@cards_bp.route('/set/<set_id>', methods=['POST'])
+@set_owner_required('You can only add flashcards to your own sets')
+def create_flashcard(set_id, current_user, flashcard_set):
+    """Add a flashcard to a set (only owner can add)"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    front = data.get('front')
+    back = data.get('back')
+    
+    if not front or not back:
+        return jsonify({'error': 'Both front and back are required'}), 400
+    
+    try:
+        # Add flashcard to set (ownership was checked by set_owner_required)
+        flashcard = flashcard_set.add_flashcard(front=front, back=back)
+        
+        return jsonify({
+            'message': 'Flashcard added successfully',
+            'flashcard': {
+                'id': str(flashcard._id),
+                'front': flashcard.front,
+                'back': flashcard.back,
+                'front_html': flashcard.html[0],
+                'back_html': flashcard.html[1],
+                'set_id': str(flashcard.set_id),
+                'created_at': flashcard.created_at.isoformat() if flashcard.created_at else None
+            }
+        }), 201
+    except Exception as e:
+        return jsonify({'error': f'Failed to create flashcard: {str(e)}'}), 500
+
+@cards_bp.route('/set/<set_id>/import', methods=['POST'])
+@set_owner_required('You can only add flashcards to your own sets')
+def import_flashcards(set_id, current_user, flashcard_set):
+    """
+    Add many flashcards to the end of a set at once:
+    {"cards": [{"front": ..., "back": ...}, ...], "skip_duplicates": false}
+    
+    Cards that nearly duplicate a card of the set, or an earlier card of the
+    import, are reported in `duplicates` (and left out with skip_duplicates).
+    """
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('cards'), list):
+        return jsonify({'error': 'cards must be a list of {front, back}'}), 400
+    
+    max_cards = current_app.config['IMPORT_MAX_CARDS']
+    if len(data['cards']) > max_cards:
+        return jsonify({'error': f'At most {max_cards} cards can be imported at once'}), 413
+    
+    cards = []
+    for i, card in enumerate(data['cards']):
+        if not isinstance(card, dict) or not all(isinstance(card.get(side), str) and card[side]
+                                                 for side in ('front', 'back')):
+            return jsonify({'error': f'Card {i}: both front and back are required'}), 400
+        cards.append((card['front'], card['back']))
+    
+    try:
+        duplicates = DuplicateIndex.check_cards(flashcard_set._id, cards)
+        if data.get('skip_duplicates'):
+            skipped = {d['index'] for d in duplicates}
+            cards = [card for i, card in enumerate(cards) if i not in skipped]
+        flashcards = flashcard_set.add_flashcards(cards)
+        
+        return jsonify({
+            'message': f'{len(flashcards)} flashcard(s) imported successfully',
+            'duplicates': [{
+                'index': d['index'],
+                'card_id': str(d['card_id']) if 'card_id' in d else None,
+                'duplicate_of': d.get('duplicate_of'),
+                'similarity': round(d['similarity'], 3)
+            } for d in duplicates],
+            'flashcards': [{
+                'id': str(c._id),
+                'front': c.front,
+                'back': c.back,
+                'front_html': c.html[0],
+                'back_html': c.html[1],
+                'set_id': str(c.set_id),
+                'rank': c.rank
+            } for c in flashcards]
+        }), 201
+    except Exception as e:
+        return jsonify({'error': f'Failed to import flashcards: {str(e)}'}), 500
+
+@cards_bp.route('/set/<set_id>', methods=['GET'])
+def get_flashcards(set_id):
+    """Get all flashcards in a set, or one page of them when ?limit= is given"""
+    try:
+        flashcard_set, owner = resolve_set(set_id)
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        # Check if user has access (owner or public)
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        # Paged mode (used by the study and set pages): ?limit=&cursor=&seed=
+        if 'limit' in request.args:
+            seed = request.args.get('seed', type=int)
+            try:
+                flashcards, next_cursor = study_window(
+                    flashcard_set,
+                    seed=seed,
+                    cursor=request.args.get('cursor'),
+                    limit=request.args.get('limit', STUDY_WINDOW, type=int)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            flashcards = flashcard_set.get_flashcards()
+            next_cursor = None
+        
+        return jsonify({
+            'next_cursor': next_cursor,
+            'flashcards': [{
+                'id': str(c._id),
+                'front': c.front,
+                'back': c.back,
+                'front_html': c.html[0],
+                'back_html': c.html[1],
+                'set_id': str(c.set_id),
+                'rank': c.rank,
+                'image_id': str(c.image_id) if c.image_id else None,
+                'difficulty': c.difficulty,
+                'times_reviewed': c.times_reviewed,
+                'last_reviewed': c.last_reviewed.isoformat() if c.last_reviewed else None,
+                'created_at': c.created_at.isoformat() if c.created_at else None
+            } for c in flashcards]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get flashcards: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>', methods=['GET'])
+def get_flashcard(card_id):
+    """Get a specific flashcard by ID"""
+    try:
+        # Card, set and owner in one round trip
+        flashcard, flashcard_set, owner = resolve_card(card_id)
+        
+        if not flashcard:
+            return jsonify({'error': 'Flashcard not found'}), 404
+        
+        if not flashcard_set:
+            return jsonify({'error': 'Flashcard set not found'}), 404
+        
+        # Check if user has access (owner or public)
+        if not can_read(flashcard_set):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return jsonify({
+            'flashcard': {
+                'id': str(flashcard._id),
+                'front': flashcard.front,
+                'back': flashcard.back,
+                'front_html': flashcard.html[0],
+                'back_html': flashcard.html[1],
+                'set_id': str(flashcard.set_id),
+                'image_id': str(flashcard.image_id) if flashcard.image_id else None,
+                'difficulty': flashcard.difficulty,
+                'times_reviewed': flashcard.times_reviewed,
+                'last_reviewed': flashcard.last_reviewed.isoformat() if flashcard.last_reviewed else None,
+                'created_at': flashcard.created_at.isoformat() if flashcard.created_at else None,
+                'version': flashcard.version
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get flashcard: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>', methods=['PUT'])
+@card_owner_required('You can only update flashcards in your own sets')
+def update_flashcard(card_id, current_user, flashcard, flashcard_set):
+    """Update a flashcard (only owner of the set can update)"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    if 'version' in data:
+        is_valid, error = validate_version(data['version'])
+        if not is_valid:
+            return jsonify({'error': error}), 400
+    
+    try:
+        # Update fields
+        if 'front' in data:
+            flashcard.front = data['front']
+        if 'back' in data:
+            flashcard.back = data['back']
+        if 'difficulty' in data:
+            flashcard.difficulty = data['difficulty']
+        
+        # Optional optimistic concurrency: reject the write if the card changed
+        # since the version the client read
+        if 'version' in data:
+            flashcard.version = int(data['version'])
+        flashcard.update(check_version='version' in data)
+        
+        return jsonify({
+            'message': 'Flashcard updated successfully',
+            'flashcard': {
+                'id': str(flashcard._id),
+                'front': flashcard.front,
+                'back': flashcard.back,
+                'front_html': flashcard.html[0],
+                'back_html': flashcard.html[1],
+                'set_id': str(flashcard.set_id),
+                'difficulty': flashcard.difficulty,
+                'times_reviewed': flashcard.times_reviewed,
+                'version': flashcard.version
+            }
+        }), 200
+    except StaleWriteError:
+        return jsonify({'error': 'Flashcard was modified by another request, reload and try again'}), 409
+    except Exception as e:
+        return jsonify({'error': f'Failed to update flashcard: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>/review', methods=['POST'])
+@card_owner_required('You can only review flashcards in your own sets')
+def review_flashcard(card_id, current_user, flashcard, flashcard_set):
+    """
+    Record a study review of a card: {"difficulty": "easy" | "medium" | "hard"}.
+    A card last rated "easy" counts as mastered in GET /stats.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    if data.get('difficulty') not in Flashcard.DIFFICULTIES:
+        return jsonify({'error': f'difficulty must be one of {", ".join(Flashcard.DIFFICULTIES)}'}), 400
+    
+    try:
+        flashcard_set.review_card(flashcard, data['difficulty'])
+        
+        return jsonify({
+            'message': 'Review recorded',
+            'flashcard': {
+                'id': str(flashcard._id),
+                'difficulty': flashcard.difficulty,
+                'times_reviewed': flashcard.times_reviewed,
+                'last_reviewed': flashcard.last_reviewed.isoformat(),
+                'version': flashcard.version
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to record review: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>/move', methods=['POST'])
+@card_owner_required('You can only reorder flashcards in your own sets')
+def move_flashcard(card_id, current_user, flashcard, flashcard_set):
+    """
+    Move a flashcard within its set: {"after": <card id>} places it right
+    after that card, {"after": null} makes it the first card. Only the moved
+    card is written.
+    """
+    data = request.get_json()
+    
+    if not data or 'after' not in data:
+        return jsonify({'error': 'after is required (a card ID, or null for the start of the set)'}), 400
+    
+    after = None
+    if data['after']:
+        try:
+            after = Flashcard.find_by_id(data['after'])
+        except InvalidId:
+            pass
+        if not after or str(after.set_id) != str(flashcard_set._id) or after._id == flashcard._id:
+            return jsonify({'error': 'after must be another flashcard of the same set'}), 400
+    
+    try:
+        flashcard.move(after=after)
+        
+        return jsonify({
+            'message': 'Flashcard moved successfully',
+            'flashcard': {
+                'id': str(flashcard._id),
+                'set_id': str(flashcard.set_id),
+                'rank': flashcard.rank,
+                'version': flashcard.version
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to move flashcard: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>/image', methods=['PUT'])
+@card_owner_required('You can only add images to flashcards in your own sets')
+def upload_image(card_id, current_user, flashcard, flashcard_set):
+    """
+    Attach an image to a flashcard (multipart field `image`), replacing any
+    previous one. Its thumbnail is made now, so pages never resize on read.
+    """
+    max_bytes = current_app.config['ATTACHMENT_MAX_BYTES']
+    max_pixels = current_app.config['ATTACHMENT_MAX_PIXELS']
+    too_large = f'Images may be at most {max_bytes // 1024} KB'
+    
+    # Refused before the body is read (allowing for the multipart framing)
+    if request.content_length and request.content_length > max_bytes + 64 * 1024:
+        return jsonify({'error': too_large}), 413
+    
+    upload = request.files.get('image')
+    if not upload:
+        return jsonify({'error': 'No image provided (multipart field "image")'}), 400
+    
+    # Werkzeug spools large uploads to a temporary file
+    stream = upload.stream
+    if stream.seek(0, os.SEEK_END) > max_bytes:
+        return jsonify({'error': too_large}), 413
+    stream.seek(0)
+    
+    try:
+        content_type = inspect_image(stream, max_pixels)
+        thumbnail, thumbnail_type = make_thumbnail(stream, current_app.config['THUMBNAIL_SIZE'], max_pixels)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        image_id = Attachment.store_image(flashcard_set._id, stream, content_type, thumbnail, thumbnail_type)
+        flashcard.set_image(image_id)
+        
+        return jsonify({
+            'message': 'Image attached successfully',
+            'flashcard': {
+                'id': str(flashcard._id),
+                'set_id': str(flashcard.set_id),
+                'image_id': str(flashcard.image_id),
+                'version': flashcard.version
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to attach image: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>/image', methods=['DELETE'])
+@card_owner_required('You can only remove images from flashcards in your own sets')
+def delete_image(card_id, current_user, flashcard, flashcard_set):
+    """Detach a flashcard's image (the file is deleted once no card uses it)"""
+    try:
+        flashcard.set_image(None)
+        
+        return jsonify({'message': 'Image removed successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to remove image: {str(e)}'}), 500
+
+@cards_bp.route('/<card_id>', methods=['DELETE'])
+@card_owner_required('You can only delete flashcards from your own sets')
+def delete_flashcard(card_id, current_user, flashcard, flashcard_set):
+    """Delete a flashcard (only owner of the set can delete)"""
+    try:
+        flashcard.delete()
+        
+        # Update set's updated_at timestamp
+        flashcard_set.updated_at = flashcard_set.updated_at
+        flashcard_set.update()
+        
+        return jsonify({'message': 'Flashcard deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to delete flashcard: {str(e)}'}), 500
+
@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify
+from bson.errors import InvalidId
+from models.job import Job
+from utils.auth import login_required
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id, current_user):
+    """Progress of a background job started by the current user"""
+    try:
+        job = Job.find_by_id(job_id)
+    except InvalidId:
+        job = None
+    if not job or str(job.user_id) != str(current_user._id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'id': str(job._id),
+        'kind': job.kind,
+        'status': 'stalled' if job.stalled else job.status,
+        'done': job.done,
+        'total': job.total,
+        'error': job.error,
+        'target_id': str(job.target_id) if job.target_id else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None
+    }), 200
@@ -0,0 +1,28 @@
+from flask import Blueprint, jsonify
+from models.study_stats import StudyStats
+from utils.auth import login_required
+
+stats_bp = Blueprint('stats', __name__)
+
+@stats_bp.route('', methods=['GET'])
+@login_required
+def get_stats(current_user):
+    """The current user's study totals, mastery and review streak (one document read)"""
+    try:
+        return jsonify({'stats': StudyStats.for_user(current_user._id)}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get stats: {str(e)}'}), 500
+
+@stats_bp.route('/sets', methods=['GET'])
+@login_required
+def get_set_stats(current_user):
+    """Study progress of each of the current user's sets"""
+    try:
+        sets = [{
+            'set_id': str(set_id),
+            **{key: value for key, value in stats.items() if key != 'last_reviewed'},
+            'last_reviewed': stats['last_reviewed'].isoformat() if stats['last_reviewed'] else None
+        } for set_id, stats in StudyStats.for_sets(current_user._id).items()]
+        return jsonify({'sets': sets, 'count': len(sets)}), 200
+    except Exception as e:
+        return jsonify({'error': f'Failed to get set stats: {str(e)}'}), 500
@@ -1,117 +1,167 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
-from models.flashcard_set import FlashcardSet
-from models.user import User
-from utils.auth import get_current_user
-
-views_bp = Blueprint('views', __name__)
-
-@views_bp.route('/')
-def home():
-    """Home page - search and browse public flashcard sets"""
-    current_user = get_current_user()
-    
-    # Get recent public sets
-    recent_sets = FlashcardSet.find_public_sets(limit=12)
-    
-    return render_template('home.html', 
-                         user=current_user,
-                         recent_sets=recent_sets)
-
-@views_bp.route('/dashboard')
-def dashboard():
-    """User dashboard - manage own flashcard sets"""
-    current_user = get_current_user()
-    
-    if not current_user:
-        return redirect(url_for('views.login'))
-    
-    # Get user's flashcard sets
-    user_sets = FlashcardSet.find_by_user_id(str(current_user._id))
-    
-    # Get flashcard count for each set
-    set_counts = {}
-    for s in user_sets:
-        card_count = len(s.get_flashcards())
-        set_counts[str(s._id)] = card_count
-    
-    return render_template('dashboard.html',
-                         user=current_user,
-                         sets=user_sets,
-                         set_counts=set_counts)
-
-@views_bp.route('/login')
-def login():
-    """Login page"""
-    current_user = get_current_user()
-    
-    if current_user:
-        return redirect(url_for('views.dashboard'))
-    
-    return render_template('login.html')
-
-@views_bp.route('/register')
-def register():
-    """Registration page"""
-    current_user = get_current_user()
-    
-    if current_user:
-        return redirect(url_for('views.dashboard'))
-    
-    return render_template('register.html')
-
-@views_bp.route('/set/<set_id>')
-def view_set(set_id):
-    """View a flashcard set"""
-    flashcard_set = FlashcardSet.find_by_id(set_id)
-    current_user = get_current_user()
-    
-    if not flashcard_set:
-        return render_template('404.html'), 404
-    
-    # Check access
-    is_owner = current_user and str(flashcard_set.user_id) == str(current_user._id)
-    if not flashcard_set.is_public and not is_owner:
-        return render_template('403.html'), 403
-    
-    flashcards = flashcard_set.get_flashcards()
-    
-    return render_template('view_set.html',
-                         set=flashcard_set,
-                         flashcards=flashcards,
-                         user=current_user,
-                         is_owner=is_owner)
-
-@views_bp.route('/set/<set_id>/study')
-def study_set(set_id):
-    """Study a flashcard set"""
-    flashcard_set = FlashcardSet.find_by_id(set_id)
-    current_user = get_current_user()
-    
-    if not flashcard_set:
-        return render_template('404.html'), 404
-    
-    # Check access
-    is_owner = current_user and str(flashcard_set.user_id) == str(current_user._id)
-    if not flashcard_set.is_public and not is_owner:
-        return render_template('403.html'), 403
-    
-    flashcards = flashcard_set.get_flashcards()
-    
-    if not flashcards:
-        return redirect(url_for('views.view_set', set_id=set_id))
-    
-    # Convert Flashcard objects to dictionaries for JSON serialization
-    flashcards_data = [{
-        'id': str(card._id),
-        'front': card.front,
-        'back': card.back,
-        'set_id': str(card.set_id)
-    } for card in flashcards]
-    
-    return render_template('study.html',
-                         set=flashcard_set,
-                         flashcards=flashcards,
-                         flashcards_data=flashcards_data,
-                         user=current_user,
-                         is_owner=is_owner)
-
+from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
+from models.flashcard_set import FlashcardSet
+from models.flashcard import Flashcard
+from models.set_feed import SetFeedEntry
+from models.study_stats import StudyStats
+from models.user import User
+from utils.auth import get_current_user
+from utils.permissions import resolve_set, current_user_for
+from utils.study import study_window, new_shuffle_seed, STUDY_WINDOW, SET_PAGE_SIZE
+
+views_bp = Blueprint('views', __name__)
+
+@views_bp.route('/')
+def home():
+    """Home page - search and browse public flashcard sets"""
+    current_user = get_current_user()
+    
+    # Get recent public sets from the precomputed feed
+    recent_sets = SetFeedEntry.find_recent(limit=12)
+    
+    return render_template('home.html', 
+                         user=current_user,
+                         recent_sets=recent_sets)
+
+@views_bp.route('/dashboard')
+def dashboard():
+    """User dashboard - manage own flashcard sets"""
+    current_user = get_current_user()
+    
+    if not current_user:
+        return redirect(url_for('views.login'))
+    
+    # Get user's flashcard sets
+    user_sets = FlashcardSet.find_by_user_id(str(current_user._id))
+    
+    # Card counts and progress from the materialized study stats; sets
+    # stored before the stats existed are counted until the next rebuild
+    set_stats = {str(set_id): stats for set_id, stats in StudyStats.for_sets(current_user._id).items()}
+    for s in user_sets:
+        if str(s._id) not in set_stats:
+            set_stats[str(s._id)] = {'cards': Flashcard.count_by_set_id(s._id), 'mastered': 0}
+    
+    return render_template('dashboard.html',
+                         user=current_user,
+                         sets=user_sets,
+                         set_stats=set_stats,
+                         stats=StudyStats.for_user(current_user._id))
+
+@views_bp.route('/login')
+def login():
+    """Login page"""
+    current_user = get_current_user()
+    
+    if current_user:
+        return redirect(url_for('views.dashboard'))
+    
+    return render_template('login.html')
+
+@views_bp.route('/register')
+def register():
+    """Registration page"""
+    current_user = get_current_user()
+    
+    if current_user:
+        return redirect(url_for('views.dashboard'))
+    
+    return render_template('register.html')
+
+@views_bp.route('/set/<set_id>')
+def view_set(set_id):
+    """View a flashcard set"""
+    # Set and owner in one round trip; an owner's own session needs no extra read
+    flashcard_set, owner = resolve_set(set_id)
+    current_user = current_user_for(owner)
+    
+    if not flashcard_set:
+        return render_template('404.html'), 404
+    
+    # Check access
+    is_owner = current_user and str(flashcard_set.user_id) == str(current_user._id)
+    if not flashcard_set.is_public and not is_owner:
+        return render_template('403.html'), 403
+    
+    if flashcard_set.is_public:
+        SetFeedEntry.record_view(flashcard_set._id)
+    
+    # Render only the first page; the rest is loaded from the card API on scroll
+    total_cards = Flashcard.count_by_set_id(flashcard_set._id)
+    flashcards, next_cursor = study_window(flashcard_set, limit=SET_PAGE_SIZE)
+    
+    set_view = {
+        'set_id': str(flashcard_set._id),
+        'is_owner': bool(is_owner),
+        'next_cursor': next_cursor,
+        'page_size': SET_PAGE_SIZE,
+        'cards': [{
+            'id': str(card._id),
+            'front': card.front,
+            'back': card.back,
+            'front_html': card.html[0],
+            'back_html': card.html[1],
+            'image_id': str(card.image_id) if card.image_id else None
+        } for card in flashcards]
+    }
+    
+    return render_template('view_set.html',
+                         set=flashcard_set,
+                         flashcards=flashcards,
+                         total_cards=total_cards,
+                         next_cursor=next_cursor,
+                         set_view=set_view,
+                         user=current_user,
+                         is_owner=is_owner)
+
+@views_bp.route('/set/<set_id>/study')
+def study_set(set_id):
+    """Study a flashcard set"""
+    flashcard_set, owner = resolve_set(set_id)
+    current_user = current_user_for(owner)
+    
+    if not flashcard_set:
+        return render_template('404.html'), 404
+    
+    # Check access
+    is_owner = current_user and str(flashcard_set.user_id) == str(current_user._id)
+    if not flashcard_set.is_public and not is_owner:
+        return render_template('403.html'), 403
+    
+    total_cards = Flashcard.count_by_set_id(flashcard_set._id)
+    
+    if not total_cards:
+        return redirect(url_for('views.view_set', set_id=set_id))
+    
+    if flashcard_set.is_public:
+        SetFeedEntry.record_view(flashcard_set._id)
+    
+    # Order and shuffle are decided server-side (seeded, so a shuffled session
+    # can be reloaded or shared); the page boots with the first window and the
+    # client pages in the rest, then fetches the set's snapshot in the background
+    seed = None
+    if request.args.get('shuffle') == '1':
+        seed = request.args.get('seed', type=int) or new_shuffle_seed()
+    flashcards, next_cursor = study_window(flashcard_set, seed=seed)
+    
+    study_session = {
+        'set_id': str(flashcard_set._id),
+        'total': total_cards,
+        'seed': seed,
+        'next_cursor': next_cursor,
+        'window': STUDY_WINDOW,
+        'can_review': bool(is_owner),
+        'cards': [{
+            'id': str(card._id),
+            'front_html': card.html[0],
+            'back_html': card.html[1],
+            'image_id': str(card.image_id) if card.image_id else None
+        } for card in flashcards]
+    }
+    
+    return render_template('study.html',
+                         set=flashcard_set,
+                         study_session=study_session,
+                         total_cards=total_cards,
+                         shuffled=seed is not None,
+                         user=current_user,
+                         is_owner=is_owner)
+
@@ -0,0 +1,99 @@
+"""
+Benchmark the card storage layouts against each other.
+
+Seeds the same decks into both layouts in a scratch database, then times
+loading whole decks and first pages through each card store and reports
+collection and index sizes from collStats:
+    
+    python -m scripts.bench_card_storage [--uri mongodb://localhost:27017/]
+        [--sets 200] [--cards 300] [--loads 500] [--keep]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from bson import ObjectId
+from pymongo import MongoClient
+from config import Config
+from models.database import Database
+from models.card_store import card_store, CARD_STORES
+from models.flashcard import Flashcard
+
+def seed(sets, cards_per_set):
+    """Insert identical decks into every layout. Returns the set ids."""
+    set_ids = []
+    for s in range(sets):
+        set_id = ObjectId()
+        deck = [Flashcard(front=f'Question {c} of deck {s}', back=f'Answer {c}', set_id=set_id).to_dict()
+                for c in range(cards_per_set)]
+        for name in CARD_STORES:
+            card_store(name).insert_many([dict(card) for card in deck])
+        set_ids.append(set_id)
+    return set_ids
+
+def time_loads(load, set_ids, loads):
+    """Milliseconds per call of load(set_id) over random sets"""
+    rng = random.Random(7)
+    for set_id in set_ids[:20]:
+        load(set_id)  # Warm the cache so both layouts are measured in memory
+    timings = []
+    for _ in range(loads):
+        set_id = rng.choice(set_ids)
+        start = time.perf_counter()
+        load(set_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[int(len(timings) * 0.95) - 1],
+        'mean': statistics.fmean(timings)
+    }
+
+def run_benchmark(uri, database_name, sets, cards_per_set, loads, keep=False):
+    client = MongoClient(uri)
+    client.drop_database(database_name)
+    Database._client = client
+    Database._db = client[database_name]
+    try:
+        Database().ensure_indexes()
+        set_ids = seed(sets, cards_per_set)
+        results = {}
+        for name in CARD_STORES:
+            store = card_store(name)
+            stats = Database._db.command('collStats', store.collection_name)
+            results[name] = {
+                'deck': time_loads(store.find_set, set_ids, loads),
+                'page': time_loads(lambda set_id: store.find_page(set_id, limit=50), set_ids, loads),
+                'documents': stats['count'],
+                'data_kb': stats['size'] / 1024,
+                'index_kb': stats['totalIndexSize'] / 1024
+            }
+        return results
+    finally:
+        if not keep:
+            client.drop_database(database_name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare deck-load latency and index size of the card layouts')
+    parser.add_argument('--uri', default=Config.MONGODB_URI, help='MongoDB URI to benchmark against')
+    parser.add_argument('--database', default=f'{Config.DATABASE_NAME}_card_storage_bench',
+                        help='Scratch database name (dropped before and after the run)')
+    parser.add_argument('--sets', type=int, default=200, help='Number of decks')
+    parser.add_argument('--cards', type=int, default=300, help='Cards per deck')
+    parser.add_argument('--loads', type=int, default=500, help='Timed loads per measurement')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded database for inspection')
+    args = parser.parse_args(argv)
+    
+    results = run_benchmark(args.uri, args.database, args.sets, args.cards, args.loads, keep=args.keep)
+    
+    print(f'{args.sets} decks x {args.cards} cards, {args.loads} loads per measurement')
+    print(f"{'layout':<10} {'docs':>8} {'data KB':>10} {'index KB':>10} "
+          f"{'deck p50':>9} {'deck p95':>9} {'page p50':>9} {'page p95':>9}  (ms)")
+    for name, r in results.items():
+        print(f"{name:<10} {r['documents']:>8} {r['data_kb']:>10.0f} {r['index_kb']:>10.0f} "
+              f"{r['deck']['p50']:>9.2f} {r['deck']['p95']:>9.2f} {r['page']['p50']:>9.2f} {r['page']['p95']:>9.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark application startup.
+
+Times each boot phase of a worker in fresh interpreters: importing the app
+module, create_app(), preload() and the first request (GET /health), plus
+how long creating one more app takes in a warm process (as tests do):
+    
+    python -m scripts.bench_startup [--runs 10] [--apps 50]
+
+Exits non-zero if booting opened a database connection, which would make
+cold starts wait on the database and break connections shared across a
+gunicorn --preload fork.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PHASES = ['import', 'create_app', 'preload', 'first_request']
+
+# Run in a fresh interpreter; prints {phase: ms, ..., 'connected': bool}
+BOOT_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app({'TESTING': True})
+t2 = time.perf_counter()
+app_module.preload(app)
+t3 = time.perf_counter()
+app.test_client().get('/health')
+t4 = time.perf_counter()
+for _ in range(%(apps)d):
+    app_module.create_app({'TESTING': True})
+t5 = time.perf_counter()
+from models.database import Database
+from models.repositories import _backends
+print(json.dumps({
+    'import': (t1 - t0) * 1000,
+    'create_app': (t2 - t1) * 1000,
+    'preload': (t3 - t2) * 1000,
+    'first_request': (t4 - t3) * 1000,
+    'extra_app': (t5 - t4) * 1000 / max(%(apps)d, 1),
+    'connected': Database._client is not None or bool(_backends),
+}))
+"""
+
+def boot_once(apps):
+    """Boot the app in a new interpreter. Returns its timings."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT % {'apps': apps}],
+        cwd=root, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_benchmark(runs, apps):
+    samples = [boot_once(apps) for _ in range(runs)]
+    results = {}
+    for phase in PHASES + ['extra_app']:
+        timings = sorted(sample[phase] for sample in samples)
+        results[phase] = {'p50': statistics.median(timings), 'max': timings[-1]}
+    results['connected'] = any(sample['connected'] for sample in samples)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time app import, creation, preload and first request')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to boot')
+    parser.add_argument('--apps', type=int, default=50, help='Extra apps created per run for the per-app cost')
+    args = parser.parse_args(argv)
+    
+    results = run_benchmark(args.runs, args.apps)
+    
+    print(f'{args.runs} cold boots, {args.apps} extra apps per boot')
+    print(f"{'phase':<14} {'p50':>8} {'max':>8}  (ms)")
+    for phase in PHASES:
+        print(f"{phase:<14} {results[phase]['p50']:>8.1f} {results[phase]['max']:>8.1f}")
+    total = sum(results[phase]['p50'] for phase in PHASES)
+    print(f"{'total':<14} {total:>8.1f}")
+    print(f"{'extra app':<14} {results['extra_app']['p50']:>8.2f} {results['extra_app']['max']:>8.2f}")
+    if results['connected']:
+        print('FAIL: booting opened a database connection')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
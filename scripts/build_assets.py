@@ -0,0 +1,133 @@
+"""
+Build the page scripts and styles in static/src/ into static/dist/.
+
+Every source file is minified and written as <name>.<content hash>.<ext>,
+and static/dist/manifest.json maps source names to the built files for the
+asset_url() template helper (utils/assets.py). Run it on every deploy, before
+starting the app:
+    
+    python -m scripts.build_assets [--keep-old]
+
+Files from earlier builds are removed unless --keep-old is given (keep them
+while old workers may still serve pages that reference them).
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+from utils.assets import SOURCE_DIR, DIST_DIR, MANIFEST
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+def minify_js(source):
+    """
+    Conservative JavaScript minifier: drops comments, indentation, blank
+    lines and repeated spaces, but keeps line breaks (so automatic semicolon
+    insertion is unaffected) and never touches string or template literals.
+    Regex literals are passed through as code; they must not contain quotes,
+    backticks or comment markers.
+    """
+    out, line = [], []
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in '\'"`':
+            # String or template literal, copied verbatim
+            j = i + 1
+            while j < n and source[j] != c:
+                j += 2 if source[j] == '\\' else 1
+            line.append(source[i:j + 1])
+            i = j + 1
+        elif source.startswith('//', i):
+            i = source.find('\n', i)
+            i = n if i == -1 else i
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                line.append('\n')
+            else:
+                line.append(' ')
+            i = end
+        elif c in ' \t':
+            if line and not line[-1].endswith((' ', '\n')):
+                line.append(' ')
+            i += 1
+        else:
+            line.append(c)
+            i += 1
+    for text_line in ''.join(line).split('\n'):
+        text_line = text_line.strip()
+        if text_line:
+            out.append(text_line)
+    return '\n'.join(out) + '\n'
+
+def minify_css(source):
+    """Drop comments and whitespace that CSS does not need"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+def build(static_dir=STATIC_DIR, keep_old=False):
+    """Build every asset under static/src. Returns the manifest."""
+    source_dir = os.path.join(static_dir, SOURCE_DIR)
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    for root, _, files in os.walk(source_dir):
+        for filename in sorted(files):
+            base, ext = os.path.splitext(filename)
+            if ext not in MINIFIERS:
+                continue
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source_dir).replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                built = MINIFIERS[ext](f.read().replace('\r\n', '\n')).encode('utf-8')
+            digest = hashlib.sha256(built).hexdigest()[:12]
+            built_name = posixpath.join(posixpath.dirname(name), f'{base}.{digest}{ext}')
+            built_path = os.path.join(dist_dir, built_name)
+            os.makedirs(os.path.dirname(built_path), exist_ok=True)
+            if not os.path.exists(built_path):
+                with open(built_path, 'wb') as f:
+                    f.write(built)
+            manifest[name] = built_name
+    
+    if not keep_old:
+        current = {os.path.normpath(os.path.join(dist_dir, built)) for built in manifest.values()}
+        for root, _, files in os.walk(dist_dir):
+            for filename in files:
+                path = os.path.normpath(os.path.join(root, filename))
+                if filename != MANIFEST and path not in current:
+                    os.remove(path)
+    
+    manifest_path = os.path.join(dist_dir, MANIFEST)
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(f'{manifest_path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Minify and fingerprint the page scripts and styles')
+    parser.add_argument('--keep-old', action='store_true', help='Keep files from earlier builds')
+    args = parser.parse_args(argv)
+    
+    manifest = build(keep_old=args.keep_old)
+    source_bytes = built_bytes = 0
+    for name, built in sorted(manifest.items()):
+        source_size = os.path.getsize(os.path.join(STATIC_DIR, SOURCE_DIR, name))
+        built_size = os.path.getsize(os.path.join(STATIC_DIR, DIST_DIR, built))
+        source_bytes += source_size
+        built_bytes += built_size
+        print(f'{name:<28} -> {built:<36} {source_size:>7} -> {built_size:>7} bytes')
+    print(f'{len(manifest)} assets, {source_bytes} -> {built_bytes} bytes')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
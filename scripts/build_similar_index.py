@@ -0,0 +1,36 @@
+"""
+Build or refresh the "similar sets" index (see utils/similar.py).
+
+Only public sets that changed since the last build are embedded again, so
+this can run often (e.g. every 15 minutes from cron); --full embeds every
+set and fits the projection again (e.g. nightly). Workers pick up the new
+index within SIMILAR_REFRESH_SECONDS:
+    
+    python -m scripts.build_similar_index [--full] [--dir SIMILAR_INDEX_DIR]
+"""
+import argparse
+import sys
+import time
+from config import Config
+from utils.similar import build_index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or refresh the similar sets index')
+    parser.add_argument('--full', action='store_true', help='Embed every set and fit the projection again')
+    parser.add_argument('--dir', dest='directory', default=Config.SIMILAR_INDEX_DIR,
+                        help='Index directory (default: SIMILAR_INDEX_DIR)')
+    args = parser.parse_args(argv)
+    
+    started = time.perf_counter()
+    stats = build_index(args.directory, full=args.full)
+    elapsed = time.perf_counter() - started
+    if not stats['embedded'] and not stats['removed']:
+        print(f'Similar sets index is up to date ({stats["sets"]} set(s))')
+    else:
+        print(f'Similar sets index: {stats["sets"]} set(s), {stats["embedded"]} embedded, '
+              f'{stats["removed"]} removed{", projection refitted" if stats["refit"] else ""} '
+              f'in {elapsed:.1f}s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
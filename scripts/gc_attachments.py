@@ -0,0 +1,42 @@
+"""
+Delete card images that no card refers to any more, with their thumbnails.
+
+Images are released as soon as their card, set or replacement is committed;
+this sweep catches what that misses: uploads whose card write failed, images
+whose delete failed, and images shared with a copied set that outlived the
+set they were uploaded to. Run it periodically (e.g. daily from cron):
+    
+    python -m scripts.gc_attachments [--set SET_ID] [--grace-seconds 3600]
+
+Images younger than the grace period are kept, as their card write may still
+be in flight.
+"""
+import argparse
+import sys
+from datetime import timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from config import Config
+from models.attachment import Attachment
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete card images no card refers to')
+    parser.add_argument('--set', dest='set_id', metavar='SET_ID',
+                        help='Only images uploaded to this set (default: every set)')
+    parser.add_argument('--grace-seconds', type=float, default=Config.ATTACHMENT_GC_GRACE_SECONDS,
+                        help=f'Keep images younger than this (default {Config.ATTACHMENT_GC_GRACE_SECONDS:g})')
+    args = parser.parse_args(argv)
+    
+    set_id = None
+    if args.set_id:
+        try:
+            set_id = ObjectId(args.set_id)
+        except InvalidId:
+            parser.error('--set must be a set ID')
+    
+    deleted = Attachment.collect_garbage(set_id=set_id, grace=timedelta(seconds=args.grace_seconds))
+    print(f'Deleted {deleted} unreferenced image(s)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Move every flashcard from one card storage layout to the other.
+    
+    python -m scripts.migrate_card_storage --to bucket [--drop-source]
+    python -m scripts.migrate_card_storage --to document [--drop-source]
+
+Cards are copied set by set; a set's cards already in the target layout are
+replaced, so an interrupted run can simply be started again. Writes made
+while it runs are not copied: stop the app (or take it read-only), migrate,
+set CARD_STORAGE to the new layout and start it again. With --drop-source a
+set's cards are removed from the old layout once the copy is verified.
+"""
+import argparse
+import sys
+from models.database import Database
+from models.card_store import card_store, CARD_STORES
+
+def migrate(source, target, drop_source=False):
+    """
+    Copy all cards from one card store to another.
+    
+    Returns:
+        tuple: (sets migrated, cards migrated, sets whose copy did not verify)
+    """
+    db = Database()
+    sets = cards = 0
+    mismatched = []
+    for set_data in db.flashcard_sets.find({}, {'_id': 1}):
+        set_id = set_data['_id']
+        set_cards = source.find_set(set_id)
+        target.delete_set(set_id)
+        target.insert_many(set_cards)
+        
+        if target.count(set_id) != len(set_cards):
+            mismatched.append(set_id)
+            continue
+        if drop_source:
+            source.delete_set(set_id)
+        sets += 1
+        cards += len(set_cards)
+    return sets, cards, mismatched
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move flashcards between card storage layouts')
+    parser.add_argument('--to', required=True, choices=sorted(CARD_STORES), help='Target layout')
+    parser.add_argument('--drop-source', action='store_true',
+                        help='Remove cards from the old layout after copying them')
+    args = parser.parse_args(argv)
+    
+    target = card_store(args.to)
+    source = card_store(next(name for name in CARD_STORES if name != args.to))
+    Database().ensure_indexes()
+    
+    sets, cards, mismatched = migrate(source, target, drop_source=args.drop_source)
+    print(f'Migrated {cards} card(s) in {sets} set(s) from {source.name} to {target.name} layout')
+    for set_id in mismatched:
+        print(f'FAIL  set {set_id}: card count differs after copy (source left in place)')
+    if not mismatched:
+        print(f'Set CARD_STORAGE={target.name} to serve cards from the new layout')
+    return 1 if mismatched else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Query-plan audit for every query shape issued by the models and routes.
+
+Seeds a scratch database, drives the finders, search, dashboard and delete
+paths through the Flask app with command monitoring enabled, then re-runs
+each captured command under ``explain`` and reports plans that:
+
+- scan a whole collection (COLLSCAN),
+- sort in memory (a blocking SORT stage), or
+- examine far more index keys / documents than they return.
+
+Exits non-zero when an unexpected finding is reported, so CI can run it as
+a test against a disposable MongoDB:
+    
+    python -m scripts.query_audit [--uri mongodb://localhost:27017/] [--keep]
+
+New routes or finders should get a scenario in SCENARIOS below.
+"""
+import argparse
+import io
+import sys
+import tempfile
+from PIL import Image
+from pymongo import MongoClient, monitoring
+from werkzeug.security import generate_password_hash
+from config import Config
+from models.database import Database
+from models.user import User
+from models.flashcard_set import FlashcardSet
+from models.flashcard import Flashcard
+from models.set_feed import SetFeedEntry
+from models.repositories import repositories
+
+# Commands that carry a query shape and can be explained
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+
+# Write commands that carry a batch of statements, and the batch field
+BATCHED_STATEMENTS = {'update': 'updates', 'delete': 'deletes'}
+
+# Driver/session fields that explain does not accept on the inner command
+SESSION_FIELDS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber',
+                  'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+
+# A plan may examine at most this many keys/documents per document returned
+MAX_EXAMINED_RATIO = 2.0
+
+# $lookup join strategies that scan the foreign collection
+SCANNING_JOIN_STRATEGIES = {'NestedLoopJoin', 'HashJoin'}
+
+# (scenario, collection, check) -> reason the finding is accepted
+KNOWN_EXCEPTIONS = {
+    ('sets.search', 'flashcard_sets', 'ratio'):
+        'unanchored case-insensitive title regex cannot be bounded by an index',
+    ('sets.suggest', 'set_feed', 'collscan'):
+        'the typeahead index is built from every feed entry, then served from memory',
+}
+
+AUDIT_PASSWORD = 'audit-pass1'
+
+class CommandRecorder(monitoring.CommandListener):
+    """Collects explainable commands issued while a scenario is running"""
+    
+    def __init__(self):
+        self.scenario = None
+        self.commands = []
+    
+    def started(self, event):
+        if self.scenario and event.command_name in EXPLAINABLE_COMMANDS:
+            command = dict(event.command)
+            # explain accepts one write statement at a time, so batched
+            # (bulk_write) updates and deletes are recorded per statement
+            statements = BATCHED_STATEMENTS.get(event.command_name)
+            if statements and len(command.get(statements, [])) > 1:
+                for statement in command[statements]:
+                    self.commands.append((self.scenario, event.command_name, {**command, statements: [statement]}))
+            else:
+                self.commands.append((self.scenario, event.command_name, command))
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+def seed(users=40, sets_per_user=6, cards_per_set=20):
+    """Populate the audit database with enough volume that a bad plan is
+    distinguishable from a good one. Returns fixture ids for the scenarios."""
+    db = Database()
+    password_hash = generate_password_hash(AUDIT_PASSWORD)
+    topics = ['Biology', 'Chemistry', 'History', 'Spanish', 'Calculus', 'Physics']
+    
+    user_docs, set_docs, card_docs = [], [], []
+    for u in range(users):
+        user = User(username=f'audit_user{u}', email=f'audit{u}@example.com',
+                    password_hash=password_hash)
+        user_docs.append(user.to_dict())
+        for s in range(sets_per_user):
+            flashcard_set = FlashcardSet(
+                title=f'{topics[s % len(topics)]} {u}-{s}',
+                description='Seeded by the query audit',
+                user_id=user._id,
+                is_public=s % 2 == 0
+            )
+            set_docs.append(flashcard_set.to_dict())
+            for c in range(cards_per_set):
+                card = Flashcard(front=f'Question {c}', back=f'Answer {c}', set_id=flashcard_set._id)
+                card_docs.append(card.to_dict())
+    
+    db.users.insert_many(user_docs)
+    db.flashcard_sets.insert_many(set_docs)
+    db.flashcards.insert_many(card_docs)
+    SetFeedEntry.rebuild()
+    
+    owner = user_docs[0]
+    own_sets = [s for s in set_docs if s['user_id'] == owner['_id']]
+    other_public = next(s for s in set_docs if s['user_id'] != owner['_id'] and s['is_public'])
+    own_cards = [c for c in card_docs if c['set_id'] == own_sets[0]['_id']]
+    public_cards = [c for c in card_docs if c['set_id'] == other_public['_id']]
+    return {
+        'owner': owner,
+        'other_user_id': str(other_public['user_id']),
+        'own_set_id': str(own_sets[0]['_id']),
+        'own_deletable_set_id': str(own_sets[1]['_id']),
+        'public_set_id': str(other_public['_id']),
+        'public_card_id': str(public_cards[len(public_cards) // 2]['_id']),
+        'own_card_id': str(own_cards[0]['_id']),
+        'own_deletable_card_id': str(own_cards[1]['_id']),
+    }
+
+def _upload_image(c, fx):
+    """Attach a small generated PNG to the owner's card; later scenarios read it back"""
+    image = io.BytesIO()
+    Image.new('RGB', (64, 48), (40, 90, 160)).save(image, format='PNG')
+    image.seek(0)
+    response = c.put(f"/cards/{fx['own_card_id']}/image", data={'image': (image, 'audit.png')},
+                     content_type='multipart/form-data')
+    fx['image_id'] = response.get_json()['flashcard']['image_id']
+    return response
+
+# Each scenario drives one route through the test client; the commands it
+# issues are what gets explained.
+SCENARIOS = [
+    ('auth.register', lambda c, fx: c.post('/auth/register', json={
+        'username': 'auditnewuser', 'email': 'auditnew@example.com', 'password': AUDIT_PASSWORD})),
+    ('auth.login', lambda c, fx: c.post('/auth/login', json={
+        'username': fx['owner']['username'], 'password': AUDIT_PASSWORD})),
+    ('auth.login_email', lambda c, fx: c.post('/auth/login', json={
+        'username': fx['owner']['email'], 'password': AUDIT_PASSWORD})),
+    ('auth.check', lambda c, fx: c.get('/auth/check')),
+    ('auth.profile', lambda c, fx: c.get('/auth/profile')),
+    ('views.home', lambda c, fx: c.get('/')),
+    ('views.dashboard', lambda c, fx: c.get('/dashboard')),
+    ('views.view_set', lambda c, fx: c.get(f"/set/{fx['public_set_id']}")),
+    ('views.study_set', lambda c, fx: c.get(f"/set/{fx['public_set_id']}/study")),
+    ('views.study_shuffled', lambda c, fx: c.get(f"/set/{fx['public_set_id']}/study?shuffle=1&seed=7")),
+    ('sets.list_public', lambda c, fx: c.get('/sets?public_only=true')),
+    ('sets.list_popular', lambda c, fx: c.get('/sets?public_only=true&sort=popular')),
+    ('sets.list_user', lambda c, fx: c.get(f"/sets?user_id={fx['other_user_id']}")),
+    ('sets.list_own', lambda c, fx: c.get('/sets')),
+    ('sets.my_sets', lambda c, fx: c.get('/sets/my-sets')),
+    ('sets.get', lambda c, fx: c.get(f"/sets/{fx['public_set_id']}")),
+    ('sets.search', lambda c, fx: c.get('/sets/search?q=biology')),
+    ('sets.suggest', lambda c, fx: c.get('/sets/suggest?q=bio')),
+    ('sets.create', lambda c, fx: c.post('/sets', json={'title': 'Audit set'})),
+    ('sets.update', lambda c, fx: c.put(f"/sets/{fx['own_set_id']}", json={'title': 'Renamed'})),
+    ('sets.clone', lambda c, fx: c.post(f"/sets/{fx['public_set_id']}/clone")),
+    ('sets.quiz', lambda c, fx: c.get(f"/sets/{fx['public_set_id']}/quiz?seed=7")),
+    ('sets.similar', lambda c, fx: c.get(f"/sets/{fx['public_set_id']}/similar")),
+    ('sets.duplicates', lambda c, fx: c.get(f"/sets/{fx['public_set_id']}/duplicates")),
+    ('cards.list', lambda c, fx: c.get(f"/cards/set/{fx['public_set_id']}")),
+    ('cards.page', lambda c, fx: c.get(f"/cards/set/{fx['public_set_id']}?limit=5&cursor={fx['public_card_id']}")),
+    ('cards.page_shuffled', lambda c, fx: c.get(f"/cards/set/{fx['public_set_id']}?limit=5&seed=7&cursor=5")),
+    ('cards.get', lambda c, fx: c.get(f"/cards/{fx['own_card_id']}")),
+    ('cards.create', lambda c, fx: c.post(f"/cards/set/{fx['own_set_id']}", json={
+        'front': 'Audit front', 'back': 'Audit back'})),
+    ('cards.import', lambda c, fx: c.post(f"/cards/set/{fx['own_set_id']}/import", json={
+        'cards': [{'front': 'Imported $x^2$', 'back': '**Answer**'}, {'front': 'Second', 'back': 'Card'}]})),
+    ('cards.move', lambda c, fx: c.post(f"/cards/{fx['own_card_id']}/move", json={'after': None})),
+    ('cards.update', lambda c, fx: c.put(f"/cards/{fx['own_card_id']}", json={'front': 'Edited'})),
+    ('cards.review', lambda c, fx: c.post(f"/cards/{fx['own_card_id']}/review", json={'difficulty': 'easy'})),
+    ('stats', lambda c, fx: c.get('/stats')),
+    ('stats.sets', lambda c, fx: c.get('/stats/sets')),
+    ('batch', lambda c, fx: c.post('/batch', json={'operations': [
+        {'op': 'card.update', 'card_id': fx['own_card_id'], 'back': 'Batched'},
+        {'op': 'card.create', 'set_id': fx['own_set_id'], 'front': 'Batch front', 'back': 'Batch back'},
+        {'op': 'set.update', 'set_id': fx['own_set_id'], 'description': 'Batched'}]})),
+    ('cards.image_upload', _upload_image),
+    ('sets.image', lambda c, fx: c.get(f"/sets/{fx['own_set_id']}/images/{fx['image_id']}")),
+    ('sets.image_thumbnail', lambda c, fx: c.get(f"/sets/{fx['own_set_id']}/images/{fx['image_id']}/thumbnail")),
+    ('cards.delete', lambda c, fx: c.delete(f"/cards/{fx['own_deletable_card_id']}")),
+    ('sets.changes', lambda c, fx: c.get(f"/sets/{fx['own_set_id']}/changes?since=1")),
+    ('sets.changes_full', lambda c, fx: c.get(f"/sets/{fx['own_set_id']}/changes")),
+    ('sets.delete', lambda c, fx: c.delete(f"/sets/{fx['own_deletable_set_id']}")),
+]
+
+def _shape(value):
+    """Reduce a command to its shape so repeated queries are explained once"""
+    if isinstance(value, dict):
+        return tuple((k, _shape(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_shape(v) for v in value[:1])
+    return type(value).__name__
+
+def _winning_stages(explain):
+    """Every stage node in the winning plan(s) of an explain result"""
+    stages = []
+    
+    def visit(node, in_plan):
+        if isinstance(node, list):
+            for item in node:
+                visit(item, in_plan)
+        elif isinstance(node, dict):
+            if in_plan and 'stage' in node:
+                stages.append(node)
+            for key, value in node.items():
+                if key in ('rejectedPlans', 'executionStats'):
+                    continue
+                visit(value, in_plan or key == 'winningPlan')
+    
+    visit(explain, False)
+    return stages
+
+def _execution_totals(explain):
+    """Sum (keys examined, docs examined, docs returned) over an explain result"""
+    totals = [0, 0, 0]
+    
+    def visit(node):
+        if isinstance(node, list):
+            for item in node:
+                visit(item)
+        elif isinstance(node, dict):
+            stats = node.get('executionStats')
+            if isinstance(stats, dict):
+                root = stats.get('executionStages') or {}
+                totals[0] += stats.get('totalKeysExamined', 0)
+                totals[1] += stats.get('totalDocsExamined', 0)
+                # Writes report what they would have touched instead of nReturned
+                totals[2] += max(stats.get('nReturned', 0), root.get('nWouldDelete', 0),
+                                 root.get('nMatched', 0), root.get('nWouldModify', 0))
+            for key, value in node.items():
+                if key != 'executionStats':
+                    visit(value)
+    
+    visit(explain)
+    return tuple(totals)
+
+def _is_count(command_name, command):
+    """Counts examine every matching key by design and return one document"""
+    if command_name == 'count':
+        return True
+    pipeline = command.get('pipeline') or []
+    return command_name == 'aggregate' and bool(pipeline) and \
+        any(stage in pipeline[-1] for stage in ('$group', '$count'))
+
+def analyze(explain, count=False):
+    """Return a list of (check, detail) findings for one explain result"""
+    findings = []
+    for stage in _winning_stages(explain):
+        name = str(stage.get('stage', '')).upper()
+        if name == 'COLLSCAN':
+            findings.append(('collscan', 'COLLSCAN in winning plan'))
+        elif name == 'SORT':
+            findings.append(('sort', 'in-memory SORT stage'))
+        elif name == 'EQ_LOOKUP' and stage.get('strategy') in SCANNING_JOIN_STRATEGIES:
+            findings.append(('collscan', f"$lookup uses {stage['strategy']}"))
+    
+    keys, docs, returned = _execution_totals(explain)
+    examined = max(keys, docs)
+    if not count and examined > MAX_EXAMINED_RATIO * max(returned, 1):
+        findings.append(('ratio', f'examined {keys} keys / {docs} docs for {returned} returned'))
+    return findings
+
+def _explain(db, command):
+    command = {k: v for k, v in command.items() if k not in SESSION_FIELDS}
+    return db.command({'explain': command, 'verbosity': 'executionStats'})
+
+def run_audit(uri, database_name, keep=False):
+    """Seed, exercise and explain. Returns (failures, accepted) lists of
+    (scenario, collection, command, check, detail) tuples."""
+    recorder = CommandRecorder()
+    client = MongoClient(uri, event_listeners=[recorder])
+    client.drop_database(database_name)
+    Database._client = client
+    Database._db = client[database_name]
+    
+    try:
+        from app import create_app
+        app = create_app({
+            'TESTING': True,
+            # The audit explains MongoDB plans, whatever backend is configured
+            'STORAGE_BACKEND': 'mongo',
+            # Compile study snapshots somewhere disposable
+            'SNAPSHOT_DIR': tempfile.mkdtemp(prefix='query_audit_snapshots_')
+        })
+        # The app's settings pick the backend, outside its requests too
+        with app.app_context():
+            # The first use of the backend creates the indexes exactly as production does
+            repositories()
+            fixtures = seed()
+        
+        test_client = app.test_client()
+        failures, accepted = [], []
+        for scenario, drive in SCENARIOS:
+            # Every scenario runs as the seeded owner (register/login move the session)
+            with test_client.session_transaction() as sess:
+                sess['user_id'] = str(fixtures['owner']['_id'])
+                sess['username'] = fixtures['owner']['username']
+            recorder.scenario = scenario
+            try:
+                response = drive(test_client, fixtures)
+            finally:
+                recorder.scenario = None
+            if response.status_code >= 400:
+                failures.append((scenario, '-', '-', 'scenario',
+                                 f'route returned HTTP {response.status_code}'))
+        
+        seen = set()
+        for scenario, command_name, command in recorder.commands:
+            key = (scenario, _shape(command))
+            if key in seen:
+                continue
+            seen.add(key)
+            collection = command[command_name]
+            explain = _explain(Database._db, command)
+            for check, detail in analyze(explain, count=_is_count(command_name, command)):
+                finding = (scenario, collection, command_name, check, detail)
+                if (scenario, collection, check) in KNOWN_EXCEPTIONS:
+                    accepted.append(finding)
+                else:
+                    failures.append(finding)
+        return failures, accepted
+    finally:
+        if not keep:
+            client.drop_database(database_name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Audit query plans of every model/route query shape')
+    parser.add_argument('--uri', default=Config.MONGODB_URI, help='MongoDB URI to seed and explain against')
+    parser.add_argument('--database', default=f'{Config.DATABASE_NAME}_query_audit',
+                        help='Scratch database name (dropped before and after the run)')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded database for inspection')
+    args = parser.parse_args(argv)
+    
+    failures, accepted = run_audit(args.uri, args.database, keep=args.keep)
+    
+    for scenario, collection, command_name, check, detail in accepted:
+        reason = KNOWN_EXCEPTIONS[(scenario, collection, check)]
+        print(f'ok*   {scenario:<20} {collection}.{command_name}: {detail} ({reason})')
+    for scenario, collection, command_name, check, detail in failures:
+        print(f'FAIL  {scenario:<20} {collection}.{command_name}: {detail}')
+    
+    print(f'{len(SCENARIOS)} scenarios, {len(failures)} failure(s), {len(accepted)} accepted exception(s)')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
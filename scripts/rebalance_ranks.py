@@ -0,0 +1,56 @@
+"""
+Rewrite the card ranks of sets whose ranks have grown long.
+
+Moving a card between two neighbours gives it a longer rank than theirs
+(see models/ranking.py), so a set that is reordered a lot slowly grows
+longer ranks. This job finds sets with a rank longer than --max-length, or
+with cards stored before ranks existed, and gives all their cards short
+ranks in the same order. Run it periodically (e.g. nightly from cron), and
+once after upgrading to rank the existing cards:
+    
+    python -m scripts.rebalance_ranks [--max-length 16] [--set SET_ID ...]
+"""
+import argparse
+import sys
+from bson import ObjectId
+from bson.errors import InvalidId
+from models.flashcard import Flashcard
+from models.ranking import MAX_RANK_LENGTH
+from models.repositories import repositories
+
+def rebalance(max_length=MAX_RANK_LENGTH, set_ids=None):
+    """
+    Rank the cards of the given sets, or of every set that needs it.
+    
+    Returns:
+        tuple: (sets rebalanced, cards written)
+    """
+    if set_ids is None:
+        set_ids = repositories().cards.find_sets_to_rank(max_length)
+    sets = cards = 0
+    for set_id in set_ids:
+        cards += len(Flashcard.rank_set(set_id))
+        sets += 1
+    return sets, cards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Give sets with long or missing card ranks short ranks')
+    parser.add_argument('--max-length', type=int, default=MAX_RANK_LENGTH,
+                        help=f'Rebalance sets with a rank longer than this (default {MAX_RANK_LENGTH})')
+    parser.add_argument('--set', dest='set_ids', action='append', metavar='SET_ID',
+                        help='Rebalance this set regardless of its ranks (repeatable)')
+    args = parser.parse_args(argv)
+    
+    set_ids = None
+    if args.set_ids:
+        try:
+            set_ids = [ObjectId(set_id) for set_id in args.set_ids]
+        except InvalidId:
+            parser.error('--set must be a set ID')
+    
+    sets, cards = rebalance(max_length=args.max_length, set_ids=set_ids)
+    print(f'Rebalanced {cards} card rank(s) in {sets} set(s)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""
+Rebuild the public set feed (set_feed) from flashcard_sets.
+
+The feed is kept current incrementally on every set/card write; run this
+periodically (e.g. hourly from cron) to repair any drift and to backfill
+after a deploy:
+    
+    python -m scripts.rebuild_feed
+"""
+import sys
+from models.set_feed import SetFeedEntry
+
+def main():
+    removed = SetFeedEntry.rebuild()
+    print(f'Public set feed rebuilt; removed {removed} stale entr{"y" if removed == 1 else "ies"}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Recompute the MinHash signatures of cards and sets (see models/duplicates.py).
+
+Signatures are kept current on every card write; run this once after
+upgrading to sign the existing cards, after changing the constants in
+models/minhash.py, and periodically (e.g. nightly from cron) to repair
+signatures whose write failed or raced with another:
+    
+    python -m scripts.rebuild_minhashes [--set SET_ID ...]
+"""
+import argparse
+import sys
+from bson import ObjectId
+from bson.errors import InvalidId
+from models.duplicates import DuplicateIndex
+from models.repositories import repositories
+
+def rebuild(set_ids=None):
+    """
+    Sign the cards of the given sets, or of every set.
+    
+    Returns:
+        tuple: (sets signed, cards signed)
+    """
+    if set_ids is None:
+        set_ids = repositories().sets.find_ids()
+    sets = cards = 0
+    for set_id in set_ids:
+        cards += DuplicateIndex.rebuild_set(set_id)
+        sets += 1
+    return sets, cards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute the MinHash signatures of cards and sets')
+    parser.add_argument('--set', dest='set_ids', action='append', metavar='SET_ID',
+                        help='Only this set (repeatable)')
+    args = parser.parse_args(argv)
+    
+    set_ids = None
+    if args.set_ids:
+        try:
+            set_ids = [ObjectId(set_id) for set_id in args.set_ids]
+        except InvalidId:
+            parser.error('--set must be a set ID')
+    
+    sets, cards = rebuild(set_ids=set_ids)
+    print(f'Signed {cards} card(s) in {sets} set(s)')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""
+Rebuild the study statistics (set_stats, user_stats) from flashcard_sets and
+the cards.
+
+The statistics are kept current incrementally on every card write and
+review; run this after a deploy to backfill sets stored before they existed,
+and periodically (e.g. nightly from cron) to repair any drift. Review streaks
+are kept, since the cards only record their last review:
+    
+    python -m scripts.rebuild_stats
+"""
+import sys
+from models.study_stats import StudyStats
+
+def main():
+    written = StudyStats.rebuild()
+    print(f'Study stats rebuilt; {written} set and user document{"" if written == 1 else "s"}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
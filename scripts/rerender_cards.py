@@ -0,0 +1,55 @@
+"""
+Render the card text of sets rendered by an older renderer again.
+
+Cards store their text rendered to HTML (see models/rich_text.py), made
+when the card is written. After RENDERER_VERSION is bumped, run this once
+to render every card made by an older version, and cards stored before
+rendering existed:
+    
+    python -m scripts.rerender_cards [--set SET_ID ...]
+
+Until then such cards are still shown, with the HTML they have (or their
+text as is); a card is also rendered again whenever it is edited.
+"""
+import argparse
+import sys
+from bson import ObjectId
+from bson.errors import InvalidId
+from models.flashcard import Flashcard
+from models.rich_text import RENDERER_VERSION
+from models.repositories import repositories
+
+def rerender(set_ids=None):
+    """
+    Render the stale cards of the given sets, or of every set that has any.
+    
+    Returns:
+        tuple: (sets rendered, cards rendered)
+    """
+    if set_ids is None:
+        set_ids = repositories().cards.find_sets_to_render(RENDERER_VERSION)
+    sets = cards = 0
+    for set_id in set_ids:
+        cards += Flashcard.render_set(set_id)
+        sets += 1
+    return sets, cards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render cards made by an older renderer again')
+    parser.add_argument('--set', dest='set_ids', action='append', metavar='SET_ID',
+                        help='Render the stale cards of this set only (repeatable)')
+    args = parser.parse_args(argv)
+    
+    set_ids = None
+    if args.set_ids:
+        try:
+            set_ids = [ObjectId(set_id) for set_id in args.set_ids]
+        except InvalidId:
+            parser.error('--set must be a set ID')
+    
+    sets, cards = rerender(set_ids=set_ids)
+    print(f'Rendered {cards} card(s) in {sets} set(s) with renderer version {RENDERER_VERSION}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+async function logout() {
+    try {
+        const response = await fetch('/auth/logout', {
+            method: 'POST',
+            credentials: 'include'
+        });
+        
+        if (response.ok) {
+            window.location.href = '/';
+        }
+    } catch (error) {
+        console.error('Logout error:', error);
+    }
+}
+
+// Helper function for API calls
+async function apiCall(url, options = {}) {
+    const defaultOptions = {
+        credentials: 'include',
+        headers: {
+            'Content-Type': 'application/json'
+        }
+    };
+    
+    const mergedOptions = { ...defaultOptions, ...options };
+    if (options.body && typeof options.body === 'object') {
+        mergedOptions.body = JSON.stringify(options.body);
+    }
+    
+    const response = await fetch(url, mergedOptions);
+    return await response.json();
+}
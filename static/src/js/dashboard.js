@@ -0,0 +1,67 @@
+function showCreateModal() {
+    const modal = new bootstrap.Modal(document.getElementById('createSetModal'));
+    modal.show();
+}
+
+async function createSet() {
+    const title = document.getElementById('setTitle').value.trim();
+    const description = document.getElementById('setDescription').value.trim();
+    const isPublic = document.getElementById('setPublic').checked;
+    
+    if (!title) {
+        alert('Title is required');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/sets', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({
+                title: title,
+                description: description,
+                is_public: isPublic
+            })
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Reload page to show new set
+        window.location.reload();
+    } catch (error) {
+        console.error('Create set error:', error);
+        alert('Error creating set. Please try again.');
+    }
+}
+
+async function deleteSet(setId, title) {
+    if (!confirm(`Are you sure you want to delete "${title}"? This action cannot be undone.`)) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/sets/${setId}`, {
+            method: 'DELETE',
+            credentials: 'include'
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Reload page
+        window.location.reload();
+    } catch (error) {
+        console.error('Delete set error:', error);
+        alert('Error deleting set. Please try again.');
+    }
+}
@@ -0,0 +1,132 @@
+// Search functionality
+document.getElementById('searchForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const query = document.getElementById('searchQuery').value.trim();
+    
+    if (!query) {
+        alert('Please enter a search query');
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/sets/search?q=${encodeURIComponent(query)}`);
+        const data = await response.json();
+        
+        if (data.error) {
+            document.getElementById('searchResults').innerHTML = 
+                `<div class="alert alert-danger">${data.error}</div>`;
+            return;
+        }
+        
+        if (data.sets.length === 0) {
+            document.getElementById('searchResults').innerHTML = 
+                `<div class="alert alert-info">No results found for "${query}"</div>`;
+            return;
+        }
+        
+        let html = `<h6 class="mb-3">Found ${data.count} result(s):</h6><ul class="list-group">`;
+        data.sets.forEach(set => {
+            html += `
+                <li class="list-group-item list-group-item-action" style="cursor: pointer; background-color: var(--dark-card); border-color: var(--dark-border);" onclick="window.location.href='/set/${set.id}'">
+                    <div class="d-flex justify-content-between align-items-start">
+                        <div class="flex-grow-1">
+                            <h6 class="mb-1">${escapeHtml(set.title)}</h6>
+                            <p class="mb-1 text-muted small">${escapeHtml(set.description || 'No description')}</p>
+                            <small class="text-muted">
+                                <i class="bi bi-person"></i> ${escapeHtml(set.username || 'Unknown user')}
+                            </small>
+                        </div>
+                        ${set.is_public ? '<span class="badge bg-mint text-dark ms-2">Public</span>' : ''}
+                    </div>
+                </li>
+            `;
+        });
+        html += '</ul>';
+        document.getElementById('searchResults').innerHTML = html;
+    } catch (error) {
+        console.error('Search error:', error);
+        document.getElementById('searchResults').innerHTML = 
+            '<div class="alert alert-danger">Error searching. Please try again.</div>';
+    }
+});
+
+// Typeahead: suggest public set titles as the user types
+let suggestRequest = null;
+document.getElementById('searchQuery').addEventListener('input', async (e) => {
+    const query = e.target.value.trim();
+    if (suggestRequest) {
+        suggestRequest.abort();
+    }
+    if (!query) {
+        document.getElementById('searchSuggestions').replaceChildren();
+        return;
+    }
+    
+    suggestRequest = new AbortController();
+    try {
+        const response = await fetch(`/sets/suggest?q=${encodeURIComponent(query)}`, { signal: suggestRequest.signal });
+        const data = await response.json();
+        if (data.error) {
+            return;
+        }
+        const options = data.suggestions.map(s => {
+            const option = document.createElement('option');
+            option.value = s.title;
+            return option;
+        });
+        document.getElementById('searchSuggestions').replaceChildren(...options);
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Suggest error:', error);
+        }
+    }
+});
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Create set (the button and modal are only rendered for logged in users)
+function showCreateModal() {
+    const modal = new bootstrap.Modal(document.getElementById('createSetModal'));
+    modal.show();
+}
+
+async function createSet() {
+    const title = document.getElementById('setTitle').value.trim();
+    const description = document.getElementById('setDescription').value.trim();
+    const isPublic = document.getElementById('setPublic').checked;
+    
+    if (!title) {
+        alert('Title is required');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/sets', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({
+                title: title,
+                description: description,
+                is_public: isPublic
+            })
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Redirect to dashboard or the new set
+        window.location.href = '/dashboard';
+    } catch (error) {
+        console.error('Create set error:', error);
+        alert('Error creating set. Please try again.');
+    }
+}
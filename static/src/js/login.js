@@ -0,0 +1,42 @@
+document.getElementById('loginForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const username = document.getElementById('username').value.trim();
+    const password = document.getElementById('password').value;
+    const errorDiv = document.getElementById('loginError');
+    
+    errorDiv.classList.add('d-none');
+    
+    if (!username || !password) {
+        errorDiv.textContent = 'Please fill in all fields';
+        errorDiv.classList.remove('d-none');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/auth/login', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({
+                username: username,
+                password: password
+            })
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            errorDiv.textContent = data.error;
+            errorDiv.classList.remove('d-none');
+            return;
+        }
+        
+        // Success - redirect to dashboard
+        window.location.href = '/dashboard';
+    } catch (error) {
+        console.error('Login error:', error);
+        errorDiv.textContent = 'Error logging in. Please try again.';
+        errorDiv.classList.remove('d-none');
+    }
+});
@@ -0,0 +1,238 @@
+// The page ships the first window of the session; later windows are paged
+// in from the card API ahead of the current card. Once the first card is up,
+// the set's content-addressed snapshot is fetched in the background: the
+// browser caches it for later and offline sessions, and in set order (the
+// snapshot's order) it replaces the remaining windows.
+const PREFETCH_AHEAD = 10;
+let flashcards = studySession.cards.map(toCard);
+let total = studySession.total;
+let nextCursor = studySession.next_cursor;
+let pendingWindow = null;
+let currentIndex = 0;
+let isFlipped = false;
+let reviewing = false;
+
+// Cards from the API and the snapshot both carry each side as sanitized HTML
+function toCard(card) {
+    return { id: card.id, front: card.front_html, back: card.back_html, image: card.image_id };
+}
+
+function loadNextWindow() {
+    if (!nextCursor) {
+        return Promise.resolve();
+    }
+    if (!pendingWindow) {
+        const params = new URLSearchParams({ limit: studySession.window, cursor: nextCursor });
+        if (studySession.seed !== null) {
+            params.set('seed', studySession.seed);
+        }
+        
+        pendingWindow = fetch(`/cards/set/${studySession.set_id}?${params}`, { credentials: 'include' })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                // The snapshot may have taken over while this window was loading
+                if (nextCursor) {
+                    data.flashcards.forEach(card => flashcards.push(toCard(card)));
+                    nextCursor = data.next_cursor;
+                }
+            })
+            .catch(error => console.error('Load cards error:', error))
+            .finally(() => { pendingWindow = null; });
+    }
+    return pendingWindow;
+}
+
+function prefetch() {
+    if (flashcards.length - currentIndex <= PREFETCH_AHEAD) {
+        loadNextWindow();
+    }
+}
+
+async function loadSnapshot() {
+    try {
+        const current = await fetch(`/sets/${studySession.set_id}/snapshot`, { credentials: 'include' });
+        const snapshot = await current.json();
+        if (snapshot.error) {
+            throw new Error(snapshot.error);
+        }
+        const response = await fetch(snapshot.url, { credentials: 'include' });
+        const data = await response.json();
+        if (studySession.seed !== null) {
+            // Shuffled order comes from the server; the snapshot is only cached
+            return;
+        }
+        const cards = data.cards.map(([id, front, back, image]) => ({ id, front, back, image }));
+        // Keep the current card; if the set changed under it, keep paging instead
+        const index = cards.findIndex(card => card.id === flashcards[currentIndex].id);
+        if (index < 0) {
+            return;
+        }
+        flashcards = cards;
+        currentIndex = index;
+        total = cards.length;
+        nextCursor = null;
+        updateNavigation();
+    } catch (error) {
+        // Windows keep coming from the card API
+        console.error('Load snapshot error:', error);
+    }
+}
+
+// Cards carry only an image ID: images are fetched as their card comes up
+function imageUrl(imageId) {
+    return `/sets/${studySession.set_id}/images/${imageId}`;
+}
+
+function updateCard() {
+    const card = flashcards[currentIndex];
+    const frontText = document.getElementById('frontText');
+    const backText = document.getElementById('backText');
+    
+    if (frontText) frontText.innerHTML = card.front;
+    if (backText) backText.innerHTML = card.back;
+    
+    const frontImage = document.getElementById('frontImage');
+    if (frontImage) {
+        if (card.image) {
+            frontImage.src = imageUrl(card.image);
+            frontImage.classList.remove('d-none');
+        } else {
+            frontImage.removeAttribute('src');
+            frontImage.classList.add('d-none');
+        }
+    }
+    // Fetch the next card's image ahead, so it shows without a wait
+    const nextCard = flashcards[currentIndex + 1];
+    if (nextCard && nextCard.image) {
+        new Image().src = imageUrl(nextCard.image);
+    }
+    
+    updateNavigation();
+    
+    // Reset card to front side
+    resetCard();
+}
+
+function updateNavigation() {
+    const progressIndicator = document.getElementById('progressIndicator');
+    const prevBtn = document.getElementById('prevBtn');
+    const nextBtn = document.getElementById('nextBtn');
+    
+    if (progressIndicator) {
+        progressIndicator.textContent = `${currentIndex + 1} / ${total}`;
+    }
+    
+    // Update navigation buttons
+    if (prevBtn) {
+        prevBtn.disabled = currentIndex === 0;
+    }
+    
+    if (nextBtn) {
+        nextBtn.disabled = currentIndex >= total - 1;
+    }
+}
+
+function flipCard() {
+    const flashcardDisplay = document.getElementById('flashcardDisplay');
+    
+    if (!isFlipped) {
+        // Flip to back
+        if (flashcardDisplay) {
+            flashcardDisplay.style.transform = 'rotateY(180deg)';
+        }
+        isFlipped = true;
+    } else {
+        // Flip back to front
+        if (flashcardDisplay) {
+            flashcardDisplay.style.transform = 'rotateY(0deg)';
+        }
+        isFlipped = false;
+    }
+}
+
+function resetCard() {
+    const flashcardDisplay = document.getElementById('flashcardDisplay');
+    
+    if (flashcardDisplay) {
+        flashcardDisplay.style.transform = 'rotateY(0deg)';
+    }
+    isFlipped = false;
+}
+
+// Owners rate each card as they go; the rating is recorded and the next card shown
+async function rateCard(difficulty) {
+    if (!studySession.can_review || reviewing) {
+        return;
+    }
+    const card = flashcards[currentIndex];
+    reviewing = true;
+    try {
+        const response = await fetch(`/cards/${card.id}/review`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({ difficulty })
+        });
+        const data = await response.json();
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+    } catch (error) {
+        console.error('Review error:', error);
+        alert('Could not record the review. Please try again.');
+        return;
+    } finally {
+        reviewing = false;
+    }
+    nextCard();
+}
+
+function previousCard() {
+    if (currentIndex > 0) {
+        currentIndex--;
+        updateCard();
+    }
+}
+
+async function nextCard() {
+    if (currentIndex >= total - 1) {
+        return;
+    }
+    if (currentIndex + 1 >= flashcards.length) {
+        // Prefetch did not keep up; wait for the next window
+        await loadNextWindow();
+        if (currentIndex + 1 >= flashcards.length) {
+            return;
+        }
+    }
+    currentIndex++;
+    updateCard();
+    prefetch();
+}
+
+// Keyboard navigation; 1-3 rate the card hard, medium or easy
+const RATING_KEYS = { '1': 'hard', '2': 'medium', '3': 'easy' };
+document.addEventListener('keydown', function(e) {
+    if (e.key === 'ArrowLeft') {
+        e.preventDefault();
+        previousCard();
+    } else if (e.key === 'ArrowRight') {
+        e.preventDefault();
+        nextCard();
+    } else if (e.key === ' ' || e.key === 'Enter') {
+        e.preventDefault();
+        flipCard();
+    } else if (e.key in RATING_KEYS) {
+        e.preventDefault();
+        rateCard(RATING_KEYS[e.key]);
+    }
+});
+
+updateCard();
+prefetch();
+// Fetched once the first card is up, so it never holds up the session
+window.addEventListener('load', () => setTimeout(loadSnapshot));
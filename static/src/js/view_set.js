@@ -0,0 +1,151 @@
+// Cards are paged in from the card API as the list scrolls. Every loaded
+// card lives in cardStore; chunks that scroll far out of view are emptied
+// (keeping their height) and re-rendered from the store when they return.
+const cardStore = new Map();
+const chunkCards = new Map();
+const cardChunks = new Map();
+let nextCursor = setView.next_cursor;
+let loadingPage = null;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Cards carry only an image ID; the thumbnail is fetched when the card is shown
+function imageUrl(imageId, thumbnail) {
+    return `/sets/${setView.set_id}/images/${imageId}${thumbnail ? '/thumbnail' : ''}`;
+}
+
+function renderCard(card) {
+    const ownerControls = setView.is_owner ? `
+                    <div class="d-flex justify-content-end gap-2 mt-3">
+                        <button class="btn btn-sm btn-link text-muted p-0" onclick="chooseImage('${card.id}')" title="Attach Image">
+                            <i class="bi bi-image fs-5"></i>
+                        </button>
+                        <button class="btn btn-sm btn-link text-muted p-0" onclick="editCard('${card.id}', event)" title="Edit Flashcard">
+                            <i class="bi bi-pencil fs-5"></i>
+                        </button>
+                        <button class="btn btn-sm btn-link text-muted p-0" onclick="deleteCard('${card.id}')" title="Delete Flashcard">
+                            <i class="bi bi-x-circle fs-5"></i>
+                        </button>
+                    </div>` : '';
+    return `
+            <div class="card mb-4 flashcard-card" id="card-${card.id}" data-card-id="${card.id}"${setView.is_owner ? ' draggable="true"' : ''}>
+                <div class="card-body">${card.image_id ? `
+                    <img class="img-thumbnail mb-3 flashcard-image" src="${imageUrl(card.image_id, true)}" alt="" loading="lazy">` : ''}
+                    <div class="mb-3">
+                        <small class="text-muted">Front:</small>
+                        <div class="flashcard-front rich-text">${card.front_html ?? escapeHtml(card.front)}</div>
+                    </div>
+                    <hr>
+                    <div class="mb-3">
+                        <small class="text-muted">Back:</small>
+                        <div class="flashcard-back rich-text">${card.back_html ?? escapeHtml(card.back)}</div>
+                    </div>${ownerControls}
+                </div>
+            </div>`;
+}
+
+function registerChunk(chunk, cards) {
+    const ids = [];
+    cards.forEach(card => {
+        // Cards added by the owner before their page arrived are already placed
+        if (cardChunks.has(card.id)) {
+            return;
+        }
+        cardStore.set(card.id, card);
+        cardChunks.set(card.id, chunk);
+        ids.push(card.id);
+    });
+    chunkCards.set(chunk, ids);
+    chunkObserver.observe(chunk);
+    return ids;
+}
+
+function detachChunk(chunk) {
+    if (chunk.dataset.detached || chunk.contains(document.activeElement)) {
+        return;
+    }
+    chunk.style.height = `${chunk.offsetHeight}px`;
+    chunk.innerHTML = '';
+    chunk.dataset.detached = '1';
+}
+
+function attachChunk(chunk) {
+    if (!chunk.dataset.detached) {
+        return;
+    }
+    chunk.innerHTML = chunkCards.get(chunk).map(id => renderCard(cardStore.get(id))).join('');
+    chunk.style.height = '';
+    delete chunk.dataset.detached;
+}
+
+const chunkObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            attachChunk(entry.target);
+        } else {
+            detachChunk(entry.target);
+        }
+    });
+}, { rootMargin: '2000px 0px' });
+
+function sentinelNearViewport() {
+    const sentinel = document.getElementById('loadMoreSentinel');
+    return sentinel && sentinel.getBoundingClientRect().top < window.innerHeight + 800;
+}
+
+function loadNextPage() {
+    if (!nextCursor) {
+        return Promise.resolve();
+    }
+    if (!loadingPage) {
+        const params = new URLSearchParams({ limit: setView.page_size, cursor: nextCursor });
+        
+        loadingPage = fetch(`/cards/set/${setView.set_id}?${params}`, { credentials: 'include' })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                
+                const chunk = document.createElement('div');
+                chunk.className = 'flashcard-chunk';
+                const ids = registerChunk(chunk, data.flashcards);
+                chunk.innerHTML = ids.map(id => renderCard(cardStore.get(id))).join('');
+                document.getElementById('flashcardsList').appendChild(chunk);
+                
+                nextCursor = data.next_cursor;
+                if (!nextCursor) {
+                    document.getElementById('loadMoreSentinel').style.display = 'none';
+                }
+            })
+            .catch(error => console.error('Load cards error:', error))
+            .finally(() => {
+                loadingPage = null;
+                // Keep filling while the bottom of the list is still on screen
+                if (nextCursor && sentinelNearViewport()) {
+                    requestAnimationFrame(loadNextPage);
+                }
+            });
+    }
+    return loadingPage;
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const firstChunk = document.querySelector('.flashcard-chunk');
+    if (firstChunk) {
+        registerChunk(firstChunk, setView.cards);
+    }
+    
+    const sentinel = document.getElementById('loadMoreSentinel');
+    if (sentinel) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '800px 0px' }).observe(sentinel);
+    }
+});
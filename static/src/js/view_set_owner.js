@@ -0,0 +1,602 @@
+const MAX_WORDS = 100;
+
+// Card writes go through POST /batch: operations issued within
+// BATCH_DELAY_MS of each other (a burst of edits or deletes) share one request
+const BATCH_DELAY_MS = 50;
+let pendingOperations = [];
+let batchTimer = null;
+
+function runOperation(operation) {
+    return new Promise((resolve, reject) => {
+        pendingOperations.push({ operation, resolve, reject });
+        if (!batchTimer) {
+            batchTimer = setTimeout(flushOperations, BATCH_DELAY_MS);
+        }
+    });
+}
+
+async function flushOperations() {
+    const batch = pendingOperations;
+    pendingOperations = [];
+    batchTimer = null;
+    
+    try {
+        const response = await fetch('/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({ operations: batch.map(item => item.operation) })
+        });
+        const data = await response.json();
+        
+        // Each operation gets its own result ({status, error} when it failed)
+        batch.forEach((item, i) => item.resolve(data.error ? { error: data.error } : data.results[i]));
+    } catch (error) {
+        batch.forEach(item => item.reject(error));
+    }
+}
+
+function showInProgressCard() {
+    const inProgressCard = document.getElementById('inProgressCard');
+    const addButtonContainer = document.getElementById('addCardButtonContainer');
+    
+    if (inProgressCard) {
+        inProgressCard.style.display = 'block';
+        if (addButtonContainer) addButtonContainer.style.display = 'none';
+        
+        // Focus on first input
+        const frontInput = document.getElementById('flashcardFrontInput');
+        if (frontInput) {
+            frontInput.focus();
+        }
+    }
+}
+
+function hideInProgressCard() {
+    const inProgressCard = document.getElementById('inProgressCard');
+    const addButtonContainer = document.getElementById('addCardButtonContainer');
+    
+    if (inProgressCard) {
+        inProgressCard.style.display = 'none';
+        if (addButtonContainer) addButtonContainer.style.display = 'block';
+    }
+    
+    clearInProgressCard();
+}
+
+function clearInProgressCard() {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    const frontError = document.getElementById('frontError');
+    const backError = document.getElementById('backError');
+    
+    if (frontInput) {
+        frontInput.value = '';
+        delete frontInput.dataset.editingCardId;
+    }
+    if (backInput) {
+        backInput.value = '';
+        delete backInput.dataset.editingCardId;
+    }
+    
+    updateWordCount();
+    hideErrors();
+    
+    // Reset save button
+    const saveBtn = document.querySelector('.in-progress-card .btn-primary');
+    if (saveBtn) {
+        saveBtn.innerHTML = '<i class="bi bi-check-circle"></i> Save';
+        saveBtn.onclick = function() { saveInProgressCard(); };
+    }
+}
+
+function countWords(text) {
+    return text.trim().split(/\s+/).filter(word => word.length > 0).length;
+}
+
+function updateWordCount() {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    const frontWordCount = document.getElementById('frontWordCount');
+    const backWordCount = document.getElementById('backWordCount');
+    
+    if (frontInput && frontWordCount) {
+        const wordCount = countWords(frontInput.value);
+        frontWordCount.textContent = `${wordCount}/${MAX_WORDS} words`;
+        if (wordCount > MAX_WORDS) {
+            frontWordCount.classList.add('text-danger');
+        } else {
+            frontWordCount.classList.remove('text-danger');
+        }
+    }
+    
+    if (backInput && backWordCount) {
+        const wordCount = countWords(backInput.value);
+        backWordCount.textContent = `${wordCount}/${MAX_WORDS} words`;
+        if (wordCount > MAX_WORDS) {
+            backWordCount.classList.add('text-danger');
+        } else {
+            backWordCount.classList.remove('text-danger');
+        }
+    }
+}
+
+function validateCardInputs() {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    const frontError = document.getElementById('frontError');
+    const backError = document.getElementById('backError');
+    
+    let isValid = true;
+    hideErrors();
+    
+    const front = frontInput ? frontInput.value.trim() : '';
+    const back = backInput ? backInput.value.trim() : '';
+    
+    // Check if front is filled
+    if (!front) {
+        isValid = false;
+        if (frontError) {
+            frontError.textContent = 'Front text is required';
+            frontError.classList.remove('d-none');
+        }
+    } else {
+        // Check word count for front
+        const frontWords = countWords(front);
+        if (frontWords > MAX_WORDS) {
+            isValid = false;
+            if (frontError) {
+                frontError.textContent = `Front text exceeds ${MAX_WORDS} words (${frontWords} words)`;
+                frontError.classList.remove('d-none');
+            }
+        }
+    }
+    
+    // Check if back is filled
+    if (!back) {
+        isValid = false;
+        if (backError) {
+            backError.textContent = 'Back text is required';
+            backError.classList.remove('d-none');
+        }
+    } else {
+        // Check word count for back
+        const backWords = countWords(back);
+        if (backWords > MAX_WORDS) {
+            isValid = false;
+            if (backError) {
+                backError.textContent = `Back text exceeds ${MAX_WORDS} words (${backWords} words)`;
+                backError.classList.remove('d-none');
+            }
+        }
+    }
+    
+    return isValid;
+}
+
+function hideErrors() {
+    const frontError = document.getElementById('frontError');
+    const backError = document.getElementById('backError');
+    
+    if (frontError) frontError.classList.add('d-none');
+    if (backError) backError.classList.add('d-none');
+}
+
+async function saveInProgressCard() {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    
+    if (!validateCardInputs()) {
+        return;
+    }
+    
+    const front = frontInput.value.trim();
+    const back = backInput.value.trim();
+    
+    try {
+        const data = await runOperation({
+            op: 'card.create',
+            set_id: currentSetId,
+            front: front,
+            back: back
+        });
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // New cards sort last: place it now if the whole list is loaded,
+        // otherwise it arrives with the final page
+        if (!nextCursor) {
+            appendCard(data.flashcard);
+        }
+        
+        // Clear the inputs and hide the in-progress card
+        clearInProgressCard();
+        hideInProgressCard();
+        
+        // Remove editing card ID from inputs
+        const frontInput = document.getElementById('flashcardFrontInput');
+        const backInput = document.getElementById('flashcardBackInput');
+        if (frontInput) delete frontInput.dataset.editingCardId;
+        if (backInput) delete backInput.dataset.editingCardId;
+        
+        // Update card count badge
+        const cardCountBadge = document.querySelector('.badge.bg-info');
+        if (cardCountBadge) {
+            const currentCount = parseInt(cardCountBadge.textContent) || 0;
+            cardCountBadge.textContent = `${currentCount + 1} cards`;
+        }
+    } catch (error) {
+        console.error('Save card error:', error);
+        alert('Error saving card. Please try again.');
+    }
+}
+
+function appendCard(card) {
+    const emptyAlert = document.getElementById('noCardsAlert');
+    if (emptyAlert) {
+        emptyAlert.remove();
+    }
+    
+    const list = document.getElementById('flashcardsList');
+    let chunk = list.lastElementChild;
+    if (!chunk) {
+        chunk = document.createElement('div');
+        chunk.className = 'flashcard-chunk';
+        list.appendChild(chunk);
+        registerChunk(chunk, []);
+    }
+    
+    cardStore.set(card.id, card);
+    cardChunks.set(card.id, chunk);
+    chunkCards.get(chunk).push(card.id);
+    // A detached chunk renders the card from the store when it comes back
+    if (!chunk.dataset.detached) {
+        chunk.insertAdjacentHTML('beforeend', renderCard(card));
+    }
+}
+
+async function editCard(cardId, event) {
+    // Read from the card store so cards that are scrolled out of the DOM,
+    // or not loaded yet, can be edited too
+    let card = cardStore.get(cardId);
+    if (!card) {
+        try {
+            const response = await fetch(`/cards/${cardId}`, { credentials: 'include' });
+            const data = await response.json();
+            if (data.error) {
+                alert('Error: ' + data.error);
+                return;
+            }
+            card = data.flashcard;
+        } catch (error) {
+            console.error('Load card error:', error);
+            alert('Error loading card. Please try again.');
+            return;
+        }
+    }
+    
+    showEditForm(cardId, card.front, card.back);
+}
+
+function showEditForm(cardId, front, back) {
+    // Show the in-progress card form
+    showInProgressCard();
+    
+    // Populate with existing values
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    
+    if (frontInput && backInput) {
+        frontInput.value = front;
+        backInput.value = back;
+        updateWordCount();
+        
+        // Store the card ID we're editing
+        frontInput.dataset.editingCardId = cardId;
+        backInput.dataset.editingCardId = cardId;
+        
+        // Update save button text
+        const saveBtn = document.querySelector('.in-progress-card .btn-primary');
+        if (saveBtn) {
+            saveBtn.innerHTML = '<i class="bi bi-check-circle"></i> Update';
+            saveBtn.onclick = function() { updateCard(cardId); };
+        }
+    }
+}
+
+async function updateCard(cardId) {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    
+    if (!validateCardInputs()) {
+        return;
+    }
+    
+    const front = frontInput.value.trim();
+    const back = backInput.value.trim();
+    
+    try {
+        const data = await runOperation({
+            op: 'card.update',
+            card_id: cardId,
+            front: front,
+            back: back
+        });
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Update the card in the store and, if rendered, in the DOM (with
+        // the sanitized HTML the server rendered)
+        const { front_html, back_html } = data.flashcard;
+        if (cardStore.has(cardId)) {
+            cardStore.set(cardId, { ...cardStore.get(cardId), front, back, front_html, back_html });
+        }
+        const cardElement = document.getElementById(`card-${cardId}`);
+        if (cardElement) {
+            const frontElement = cardElement.querySelector('.flashcard-front');
+            const backElement = cardElement.querySelector('.flashcard-back');
+            
+            if (frontElement) frontElement.innerHTML = front_html;
+            if (backElement) backElement.innerHTML = back_html;
+        }
+        
+        // Clear and hide the form
+        clearInProgressCard();
+        hideInProgressCard();
+        
+        // Reset save button
+        const saveBtn = document.querySelector('.in-progress-card .btn-primary');
+        if (saveBtn) {
+            saveBtn.innerHTML = '<i class="bi bi-check-circle"></i> Save';
+            saveBtn.onclick = function() { saveInProgressCard(); };
+        }
+    } catch (error) {
+        console.error('Update card error:', error);
+        alert('Error updating card. Please try again.');
+    }
+}
+
+function chooseImage(cardId) {
+    const input = document.createElement('input');
+    input.type = 'file';
+    input.accept = 'image/jpeg,image/png,image/gif,image/webp';
+    input.addEventListener('change', () => {
+        if (input.files.length) {
+            uploadImage(cardId, input.files[0]);
+        }
+    });
+    input.click();
+}
+
+async function uploadImage(cardId, file) {
+    const formData = new FormData();
+    formData.append('image', file);
+    
+    try {
+        const response = await fetch(`/cards/${cardId}/image`, {
+            method: 'PUT',
+            credentials: 'include',
+            body: formData
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Update the card in the store and, if rendered, its thumbnail
+        const imageId = data.flashcard.image_id;
+        if (cardStore.has(cardId)) {
+            cardStore.set(cardId, { ...cardStore.get(cardId), image_id: imageId });
+        }
+        const cardElement = document.getElementById(`card-${cardId}`);
+        if (cardElement) {
+            let image = cardElement.querySelector('.flashcard-image');
+            if (!image) {
+                image = document.createElement('img');
+                image.className = 'img-thumbnail mb-3 flashcard-image';
+                image.alt = '';
+                cardElement.querySelector('.card-body').prepend(image);
+            }
+            image.src = imageUrl(imageId, true);
+        }
+    } catch (error) {
+        console.error('Upload image error:', error);
+        alert('Error uploading image. Please try again.');
+    }
+}
+
+async function deleteCard(cardId) {
+    if (!confirm('Are you sure you want to delete this flashcard?')) {
+        return;
+    }
+    
+    try {
+        const data = await runOperation({ op: 'card.delete', card_id: cardId });
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Remove card from the store, its chunk and the DOM
+        const chunk = cardChunks.get(cardId);
+        if (chunk) {
+            chunkCards.set(chunk, chunkCards.get(chunk).filter(id => id !== cardId));
+            cardChunks.delete(cardId);
+        }
+        cardStore.delete(cardId);
+        const cardElement = document.getElementById(`card-${cardId}`);
+        if (cardElement) {
+            cardElement.remove();
+        }
+        
+        // Update card count badge
+        const cardCountBadge = document.querySelector('.badge.bg-info');
+        if (cardCountBadge) {
+            const currentCount = parseInt(cardCountBadge.textContent) || 0;
+            cardCountBadge.textContent = `${Math.max(0, currentCount - 1)} cards`;
+        }
+        
+        // If no cards left, show message
+        if (cardStore.size === 0 && !nextCursor) {
+            const addButtonContainer = document.getElementById('addCardButtonContainer');
+            if (addButtonContainer) {
+                addButtonContainer.insertAdjacentHTML('beforebegin', 
+                    '<div class="alert alert-info text-center mb-4" id="noCardsAlert"><i class="bi bi-info-circle"></i> No flashcards in this set yet. Add your first card below!</div>'
+                );
+            }
+        } else if (nextCursor && sentinelNearViewport()) {
+            loadNextPage();
+        }
+    } catch (error) {
+        console.error('Delete card error:', error);
+        alert('Error deleting card. Please try again.');
+    }
+}
+
+async function deleteSet(setId, title) {
+    if (!confirm(`Are you sure you want to delete "${title}"? This will delete all flashcards in this set.`)) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/sets/${setId}`, {
+            method: 'DELETE',
+            credentials: 'include'
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Redirect to dashboard
+        window.location.href = '/dashboard';
+    } catch (error) {
+        console.error('Delete set error:', error);
+        alert('Error deleting set. Please try again.');
+    }
+}
+
+// Word count updates and validation
+document.addEventListener('DOMContentLoaded', function() {
+    const frontInput = document.getElementById('flashcardFrontInput');
+    const backInput = document.getElementById('flashcardBackInput');
+    
+    if (frontInput && backInput) {
+        // Update word count on input
+        [frontInput, backInput].forEach(input => {
+            input.addEventListener('input', updateWordCount);
+            input.addEventListener('input', hideErrors);
+            
+            // Allow Enter key to save (Ctrl+Enter or Cmd+Enter)
+            input.addEventListener('keydown', function(e) {
+                if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
+                    e.preventDefault();
+                    saveInProgressCard();
+                }
+            });
+        });
+    }
+});
+
+// Drag and drop reordering: the dropped card is moved after the card now
+// before it, which writes only the moved card
+let draggedCardId = null;
+
+function previousCardId(cardElement) {
+    const previous = cardElement.previousElementSibling;
+    if (previous) return previous.dataset.cardId;
+    // First in its chunk: the last card of the chunk before
+    let chunk = cardElement.parentElement.previousElementSibling;
+    while (chunk) {
+        const ids = chunkCards.get(chunk);
+        if (ids && ids.length) return ids[ids.length - 1];
+        chunk = chunk.previousElementSibling;
+    }
+    return null;
+}
+
+function placeCard(cardId, cardElement) {
+    const oldChunk = cardChunks.get(cardId);
+    if (oldChunk) {
+        chunkCards.set(oldChunk, chunkCards.get(oldChunk).filter(id => id !== cardId));
+    }
+    const chunk = cardElement.parentElement;
+    const ids = Array.from(chunk.children).map(el => el.dataset.cardId);
+    chunkCards.set(chunk, ids);
+    cardChunks.set(cardId, chunk);
+}
+
+async function moveCard(cardId, afterId) {
+    try {
+        const response = await fetch(`/cards/${cardId}/move`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            credentials: 'include',
+            body: JSON.stringify({ after: afterId })
+        });
+        
+        const data = await response.json();
+        
+        if (data.error) {
+            alert('Error: ' + data.error);
+            window.location.reload();
+        }
+    } catch (error) {
+        console.error('Move card error:', error);
+        alert('Error moving card. Please try again.');
+        window.location.reload();
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const list = document.getElementById('flashcardsList');
+    if (!list) return;
+    
+    list.addEventListener('dragstart', function(e) {
+        const cardElement = e.target.closest('.flashcard-card');
+        if (!cardElement) return;
+        draggedCardId = cardElement.dataset.cardId;
+        e.dataTransfer.effectAllowed = 'move';
+        e.dataTransfer.setData('text/plain', draggedCardId);
+    });
+    
+    list.addEventListener('dragover', function(e) {
+        if (draggedCardId && e.target.closest('.flashcard-card')) {
+            e.preventDefault();
+        }
+    });
+    
+    list.addEventListener('drop', function(e) {
+        const target = e.target.closest('.flashcard-card');
+        const dragged = draggedCardId && document.getElementById(`card-${draggedCardId}`);
+        draggedCardId = null;
+        if (!target || !dragged || target === dragged) return;
+        e.preventDefault();
+        
+        // Drop on the upper half of a card to go before it, lower half after it
+        const box = target.getBoundingClientRect();
+        const before = e.clientY < box.top + box.height / 2;
+        target.insertAdjacentElement(before ? 'beforebegin' : 'afterend', dragged);
+        
+        const cardId = dragged.dataset.cardId;
+        placeCard(cardId, dragged);
+        moveCard(cardId, previousCardId(dragged));
+    });
+    
+    list.addEventListener('dragend', function() {
+        draggedCardId = null;
+    });
+});
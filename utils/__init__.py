@@ -1,5 +1,9 @@
-from .auth import login_required, get_current_user
-from .validators import validate_email_format, validate_username, validate_password
-
-__all__ = ['login_required', 'get_current_user', 'validate_email_format', 'validate_username', 'validate_password']
-
+from .auth import login_required, admin_required, get_current_user
+from .permissions import set_owner_required, card_owner_required, resolve_set, resolve_card
+from .validators import validate_email_format, validate_username, validate_password
+from .study import study_window, new_shuffle_seed
+
+__all__ = ['login_required', 'admin_required', 'get_current_user', 'set_owner_required', 'card_owner_required',
+           'resolve_set', 'resolve_card', 'validate_email_format', 'validate_username', 'validate_password',
+           'study_window', 'new_shuffle_seed']
+
@@ -0,0 +1,156 @@
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from config import with_app_settings
+from models.repositories import repositories, STORAGE_ERRORS
+
+# Paths that are always served: probes must answer while the app sheds load
+EXEMPT_PATHS = ('/health', '/ready', '/static/')
+
+class StorageProbe:
+    """
+    Database ping latency, measured in the background and cached.
+    
+    Requests never wait on a ping: status() returns the last result and starts
+    a new ping when it is older than `interval`. A ping still running after
+    `timeout` seconds is reported as a failure, so an unreachable database is
+    noticed within the timeout rather than after server selection gives up.
+    """
+    
+    def __init__(self, interval, timeout):
+        self.interval = interval
+        self.timeout = timeout
+        self.latency_ms = None
+        self.error = None
+        self.checked_at = None  # time.monotonic() of the last completed ping
+        self._started_at = None  # time.monotonic() of the running ping
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def status(self, wait=False):
+        """
+        Latest ping result, starting a new ping if it is stale.
+        
+        Args:
+            wait (bool): If no ping has completed yet, wait up to the timeout for one
+        
+        Returns:
+            tuple: (latency_ms or None if unknown, error message or None)
+        """
+        with self._lock:
+            now = time.monotonic()
+            stale = self.checked_at is None or now - self.checked_at >= self.interval
+            if stale and self._started_at is None:
+                self._started_at = now
+                self._thread = threading.Thread(target=with_app_settings(self._ping), name='storage-probe', daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait and self.checked_at is None and thread is not None:
+            thread.join(self.timeout)
+        
+        with self._lock:
+            if self._started_at is not None:
+                running_for = time.monotonic() - self._started_at
+                if running_for > self.timeout:
+                    return running_for * 1000, f'No reply to ping after {running_for:.1f}s'
+            return self.latency_ms, self.error
+    
+    def _ping(self):
+        start = time.monotonic()
+        error = None
+        try:
+            repositories().ping()
+        except STORAGE_ERRORS as e:
+            error = str(e) or type(e).__name__
+        with self._lock:
+            self.checked_at = time.monotonic()
+            self.latency_ms = (self.checked_at - start) * 1000
+            self.error = error
+            self._started_at = None
+
+class AdmissionControl:
+    """
+    Fails requests fast with 503 and Retry-After while the app is overloaded,
+    instead of queueing them behind a slow database.
+    
+    A request is turned away when the last database ping failed or was slower
+    than ADMISSION_MAX_DB_LATENCY_MS, when the connection pool is at least
+    ADMISSION_MAX_POOL_SATURATION in use, or when this worker already has
+    ADMISSION_MAX_IN_FLIGHT requests in flight.
+    """
+    
+    def __init__(self, config):
+        self.max_db_latency_ms = config['ADMISSION_MAX_DB_LATENCY_MS']
+        self.max_pool_saturation = config['ADMISSION_MAX_POOL_SATURATION']
+        self.max_in_flight = config['ADMISSION_MAX_IN_FLIGHT']
+        self.retry_after = config['ADMISSION_RETRY_AFTER']
+        self.probe = StorageProbe(config['READINESS_PROBE_INTERVAL'], config['READINESS_PROBE_TIMEOUT'])
+        self.in_flight = 0
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        app.extensions['admission'] = self
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+    
+    def readiness(self, wait=False):
+        """
+        Readiness report for /ready.
+        
+        Returns:
+            dict: status ('ready' or 'unavailable'), reason, storage latency and
+            error, pool use and this worker's requests in flight
+        """
+        latency_ms, error = self.probe.status(wait=wait)
+        pool = None
+        try:
+            pool = repositories().pool_stats()
+        except STORAGE_ERRORS:
+            pass
+        saturation = pool['in_use'] / pool['max'] if pool and pool['max'] else None
+        
+        if error:
+            reason = f'database unavailable: {error}'
+        elif latency_ms is not None and latency_ms > self.max_db_latency_ms:
+            reason = f'database latency {latency_ms:.0f}ms over {self.max_db_latency_ms:.0f}ms'
+        elif saturation is not None and saturation >= self.max_pool_saturation:
+            reason = f'connection pool {saturation:.0%} in use'
+        elif self.in_flight >= self.max_in_flight:
+            reason = f'{self.in_flight} requests in flight'
+        else:
+            reason = None
+        
+        return {
+            'status': 'unavailable' if reason else 'ready',
+            'reason': reason,
+            'storage': {
+                'backend': current_app.config['STORAGE_BACKEND'],
+                'latency_ms': round(latency_ms, 2) if latency_ms is not None else None,
+                'error': error
+            },
+            'pool': dict(pool, saturation=round(saturation, 3)) if pool else None,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight
+        }
+    
+    def admit(self):
+        """before_request: count the request in, or answer 503"""
+        if request.path.startswith(EXEMPT_PATHS):
+            return None
+        report = self.readiness()
+        if report['reason']:
+            response = jsonify({'error': 'Service temporarily overloaded, please retry'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(self.retry_after)
+            current_app.logger.warning(f'Shedding {request.method} {request.path}: {report["reason"]}')
+            return response
+        with self._lock:
+            self.in_flight += 1
+        g.admitted = True
+        return None
+    
+    def release(self, error=None):
+        """teardown_request: count an admitted request out"""
+        if g.pop('admitted', False):
+            with self._lock:
+                self.in_flight -= 1
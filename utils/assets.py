@@ -0,0 +1,65 @@
+import json
+import os
+from flask import current_app, request, url_for
+
+# Page scripts and styles are written in static/src/ and built by
+# scripts/build_assets.py into static/dist/, minified and named by content
+# hash, with static/dist/manifest.json mapping source names to built files:
+#   {"js/study.js": "js/study.3f2a9c1e.js", ...}
+# A built file never changes under its name, so it is served as immutable.
+
+SOURCE_DIR = 'src'
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+class AssetManifest:
+    """The build manifest, read on first use (and again when rebuilt, in debug mode)"""
+    
+    def __init__(self, static_folder, reload=False):
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+        self.reload = reload
+        self._entries = None
+        self._mtime = None
+    
+    def entries(self):
+        if self._entries is None or self.reload:
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if self._entries is None or mtime != self._mtime:
+                self._entries, self._mtime = self._read(), mtime
+        return self._entries
+    
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+def asset_url(name):
+    """
+    URL of a page asset by its source name, e.g. asset_url('js/study.js').
+    
+    Falls back to the unbuilt source file when the asset has not been built,
+    so a fresh checkout works without the build step (uncached).
+    """
+    built = current_app.extensions['assets'].entries().get(name)
+    if built:
+        return url_for('static', filename=f'{DIST_DIR}/{built}')
+    return url_for('static', filename=f'{SOURCE_DIR}/{name}')
+
+def cache_built_assets(response):
+    """after_request: built (content-hashed) assets may be cached forever"""
+    if (request.endpoint == 'static' and response.status_code in (200, 304)
+            and (request.view_args or {}).get('filename', '').startswith(f'{DIST_DIR}/')):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+def init_app(app):
+    app.extensions['assets'] = AssetManifest(app.static_folder, reload=app.debug)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.after_request(cache_built_assets)
@@ -1,30 +1,44 @@
-from functools import wraps
-from flask import session, jsonify
-from models.user import User
-
-def login_required(f):
-    """Decorator to require authentication for a route"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Authentication required'}), 401
-        
-        user = User.find_by_id(user_id)
-        if not user:
-            session.clear()
-            return jsonify({'error': 'User not found'}), 401
-        
-        # Add user to kwargs so routes can access it
-        kwargs['current_user'] = user
-        return f(*args, **kwargs)
-    return decorated_function
-
-def get_current_user():
-    """Get current logged in user from session"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    return User.find_by_id(user_id)
-
+from functools import wraps
+from flask import session, jsonify, current_app
+from models.user import User
+
+def login_required(f):
+    """Decorator to require authentication for a route"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        user = User.find_by_id(user_id)
+        if not user:
+            session.clear()
+            return jsonify({'error': 'User not found'}), 401
+        
+        # Add user to kwargs so routes can access it
+        kwargs['current_user'] = user
+        return f(*args, **kwargs)
+    return decorated_function
+
+def admin_required(f):
+    """Decorator to require an admin (a user listed in ADMIN_USERNAMES)"""
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if kwargs['current_user'].username not in current_app.config['ADMIN_USERNAMES']:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def is_admin():
+    """Whether the logged in user is an admin (from the session, no database read)"""
+    return bool(session.get('user_id')) and session.get('username') in current_app.config['ADMIN_USERNAMES']
+
+def get_current_user():
+    """Get current logged in user from session"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    
+    return User.find_by_id(user_id)
+
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+def write_atomic(path, data):
+    """
+    Replace a file in one step: readers see either the old or the new
+    contents, never part of a write. The data goes to a temporary file with
+    a unique name in the same directory (so concurrent writers, in any
+    thread or process, never share one), which is then renamed over path.
+    
+    Args:
+        path (str): File to write
+        data (bytes or str): Its new contents
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
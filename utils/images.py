@@ -0,0 +1,69 @@
+import io
+from PIL import Image, ImageOps
+
+# Formats accepted for card images: Pillow format name -> MIME type
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+
+def _open(stream, max_pixels):
+    """Open an image, reading only its header; ValueError if it is not an accepted image"""
+    try:
+        image = Image.open(stream)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError('File is not a valid image') from e
+    if image.format not in CONTENT_TYPES:
+        image.close()
+        raise ValueError('Images must be JPEG, PNG, GIF or WebP')
+    width, height = image.size
+    if width * height > max_pixels:
+        image.close()
+        raise ValueError(f'Images may have at most {max_pixels} pixels')
+    return image
+
+def inspect_image(stream, max_pixels):
+    """
+    MIME type of an uploaded image, from its contents rather than what the
+    client claims. The stream is left where it started.
+    
+    Raises:
+        ValueError: Not a JPEG, PNG, GIF or WebP image, or too many pixels
+    """
+    start = stream.tell()
+    try:
+        with _open(stream, max_pixels) as image:
+            return CONTENT_TYPES[image.format]
+    finally:
+        stream.seek(start)
+
+def make_thumbnail(stream, size, max_pixels):
+    """
+    Scale an image down to fit in size x size pixels (upright, per its EXIF
+    orientation; the first frame of an animation). The stream is left where
+    it started.
+    
+    Returns:
+        tuple: (thumbnail: BytesIO, content_type: str) - PNG if the image
+            has transparency, JPEG otherwise
+    
+    Raises:
+        ValueError: As inspect_image
+    """
+    start = stream.tell()
+    try:
+        with _open(stream, max_pixels) as image:
+            # JPEGs are decoded at the smallest scale that is still large enough
+            image.draft('RGB', (size, size))
+            thumbnail = ImageOps.exif_transpose(image)
+            thumbnail.thumbnail((size, size))
+            output = io.BytesIO()
+            if thumbnail.mode in ('RGBA', 'LA', 'PA') or 'transparency' in thumbnail.info:
+                thumbnail.convert('RGBA').save(output, format='PNG', optimize=True)
+                content_type = 'image/png'
+            else:
+                thumbnail.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+                content_type = 'image/jpeg'
+    except OSError as e:
+        raise ValueError('File is not a valid image') from e
+    finally:
+        stream.seek(start)
+    output.seek(0)
+    return output, content_type
@@ -0,0 +1,142 @@
+from functools import wraps
+from bson.errors import InvalidId
+from flask import g, session, jsonify
+from models.flashcard_set import FlashcardSet
+from models.user import User
+
+# Set and card lookups are cached on flask.g for the rest of the request, so
+# repeated permission checks against the same set cost no further round trips.
+
+def _cache():
+    return g.setdefault('permission_cache', {})
+
+def resolve_set(set_id):
+    """
+    Resolve a set and its owner, at most once per request.
+    
+    Returns:
+        tuple: (FlashcardSet or None, owner User or None)
+    """
+    key = ('set', str(set_id))
+    cache = _cache()
+    if key not in cache:
+        try:
+            cache[key] = FlashcardSet.find_with_owner(set_id)
+        except InvalidId:
+            cache[key] = (None, None)
+    return cache[key]
+
+def resolve_card(card_id):
+    """
+    Resolve a card, its set and the set's owner in one round trip, at most
+    once per request. The set is cached for resolve_set as well.
+    
+    Returns:
+        tuple: (Flashcard or None, FlashcardSet or None, owner User or None)
+    """
+    key = ('card', str(card_id))
+    cache = _cache()
+    if key not in cache:
+        try:
+            cache[key] = FlashcardSet.find_card_with_set(card_id)
+        except InvalidId:
+            cache[key] = (None, None, None)
+        flashcard, flashcard_set, owner = cache[key]
+        if flashcard_set:
+            cache[('set', str(flashcard_set._id))] = (flashcard_set, owner)
+    return cache[key]
+
+def is_owner(flashcard_set):
+    """Whether the session user owns the set"""
+    user_id = session.get('user_id')
+    return bool(user_id) and str(flashcard_set.user_id) == user_id
+
+def can_read(flashcard_set):
+    """Public sets are readable by anyone, private sets only by their owner"""
+    return flashcard_set.is_public or is_owner(flashcard_set)
+
+def current_user_for(owner):
+    """
+    The logged in user, reusing the already loaded set owner when the
+    session belongs to them instead of reading the user again.
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    if owner and str(owner._id) == user_id:
+        return owner
+    return User.find_by_id(user_id)
+
+def _owner_or_error(owner, forbidden_message):
+    """
+    Authenticate the session against a resolved set owner.
+    
+    Returns:
+        tuple: (current_user: User or None, error_response or None)
+    """
+    user_id = session.get('user_id')
+    if owner and str(owner._id) == user_id:
+        return owner, None
+    
+    # Not the owner: tell a stale session apart from a forbidden request
+    if not User.find_by_id(user_id):
+        session.clear()
+        return None, (jsonify({'error': 'User not found'}), 401)
+    return None, (jsonify({'error': forbidden_message}), 403)
+
+def set_owner_required(forbidden_message):
+    """
+    Decorator for routes on one set (<set_id>) that only its owner may use.
+    
+    Replaces login_required + FlashcardSet.find_by_id + the ownership check:
+    the set, its owner and the permission are resolved in one round trip and
+    passed to the route as the current_user and flashcard_set kwargs.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(set_id, *args, **kwargs):
+            if not session.get('user_id'):
+                return jsonify({'error': 'Authentication required'}), 401
+            
+            flashcard_set, owner = resolve_set(set_id)
+            if not flashcard_set:
+                return jsonify({'error': 'Flashcard set not found'}), 404
+            
+            current_user, error = _owner_or_error(owner, forbidden_message)
+            if error:
+                return error
+            
+            kwargs['current_user'] = current_user
+            kwargs['flashcard_set'] = flashcard_set
+            return f(set_id, *args, **kwargs)
+        return decorated_function
+    return decorator
+
+def card_owner_required(forbidden_message):
+    """
+    Decorator for routes on one card (<card_id>) that only the owner of its
+    set may use. Passes current_user, flashcard and flashcard_set kwargs,
+    all resolved in one round trip.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(card_id, *args, **kwargs):
+            if not session.get('user_id'):
+                return jsonify({'error': 'Authentication required'}), 401
+            
+            flashcard, flashcard_set, owner = resolve_card(card_id)
+            if not flashcard:
+                return jsonify({'error': 'Flashcard not found'}), 404
+            if not flashcard_set:
+                return jsonify({'error': 'Flashcard set not found'}), 404
+            
+            current_user, error = _owner_or_error(owner, forbidden_message)
+            if error:
+                return error
+            
+            kwargs['current_user'] = current_user
+            kwargs['flashcard'] = flashcard
+            kwargs['flashcard_set'] = flashcard_set
+            return f(card_id, *args, **kwargs)
+        return decorated_function
+    return decorator
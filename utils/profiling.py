@@ -0,0 +1,226 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app, g, request
+from models.instrumentation import start_capture, stop_capture
+from utils.auth import is_admin
+from utils.files import write_atomic
+
+# Profiled requests are kept under PROFILE_DIR as two files per profile:
+#   <id>.json             summary (route, timings, slowest database commands)
+#   <id>.speedscope.json  the full profile, for https://www.speedscope.app
+# Only the newest PROFILE_BUFFER_SIZE profiles are kept, shared by all workers.
+
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Request header an admin sets to profile one request
+PROFILE_HEADER = 'X-Profile'
+
+class StackSampler:
+    """Samples one thread's Python call stack from a background thread"""
+    
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []  # (perf_counter, stack of code objects, root first)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.samples.append((time.perf_counter(), stack[::-1]))
+
+def to_speedscope(name, started, finished, samples, commands):
+    """
+    Build a speedscope file: the sampled Python stacks, plus the database
+    commands as a second, evented profile on the same timeline.
+    """
+    frames, frame_index = [], {}
+    
+    def frame_id(key, **frame):
+        if key not in frame_index:
+            frame_index[key] = len(frames)
+            frames.append(frame)
+        return frame_index[key]
+    
+    stacks, weights = [], []
+    previous = started
+    for at, stack in samples:
+        stacks.append([frame_id(code, name=code.co_name, file=code.co_filename, line=code.co_firstlineno)
+                       for code, _ in stack])
+        weights.append(round((at - previous) * 1000, 3))
+        previous = at
+    duration = round((finished - started) * 1000, 3)
+    
+    events = []
+    for command in commands:
+        label = f"{command['command']} {command['target'] or ''}".strip()
+        frame = frame_id(('command', label), name=label[:120])
+        opened = round(max(command['start'] - started, 0) * 1000, 3)
+        events.append({'type': 'O', 'frame': frame, 'at': opened})
+        events.append({'type': 'C', 'frame': frame, 'at': round(opened + command['duration_ms'], 3)})
+    
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'onlyflashcards',
+        'shared': {'frames': frames},
+        'profiles': [
+            {'type': 'sampled', 'name': f'{name} (Python)', 'unit': 'milliseconds',
+             'startValue': 0, 'endValue': duration, 'samples': stacks, 'weights': weights},
+            {'type': 'evented', 'name': f'{name} (database)', 'unit': 'milliseconds',
+             'startValue': 0, 'endValue': duration, 'events': events},
+        ]
+    }
+
+def _write_json(path, data):
+    write_atomic(path, json.dumps(data, separators=(',', ':')))
+
+def save_profile(summary, speedscope, directory, keep):
+    """Store a profile and drop the oldest beyond `keep`"""
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f"{summary['id']}.speedscope.json"), speedscope)
+    _write_json(os.path.join(directory, f"{summary['id']}.json"), summary)
+    
+    summaries = sorted(
+        (name for name in os.listdir(directory) if name.endswith('.json') and PROFILE_ID.match(name[:-5])),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+        reverse=True
+    )
+    for name in summaries[keep:]:
+        for path in (name, name[:-5] + '.speedscope.json'):
+            try:
+                os.remove(os.path.join(directory, path))
+            except OSError:
+                pass
+
+def list_profiles(directory):
+    """Stored profile summaries, slowest first"""
+    summaries = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    for name in names:
+        if name.endswith('.json') and PROFILE_ID.match(name[:-5]):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Pruned or half-written by another worker
+    return sorted(summaries, key=lambda s: s['duration_ms'], reverse=True)
+
+def profile_path(directory, profile_id):
+    """Path of a stored speedscope file, or None"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(directory, f'{profile_id}.speedscope.json')
+    return path if os.path.exists(path) else None
+
+class RequestProfiler:
+    """
+    Profiles selected requests with a stack sampler and the database command
+    timings from models.instrumentation.
+    
+    A request is profiled when an admin sends the X-Profile header (always
+    kept), or when it is picked by PROFILE_SAMPLE_RATE (kept only if it took
+    at least PROFILE_SLOW_MS).
+    """
+    
+    def __init__(self, config):
+        self.sample_rate = config['PROFILE_SAMPLE_RATE']
+        self.slow_ms = config['PROFILE_SLOW_MS']
+        self.interval = config['PROFILE_INTERVAL_MS'] / 1000
+        self.directory = config['PROFILE_DIR']
+        self.keep = config['PROFILE_BUFFER_SIZE']
+    
+    def init_app(self, app):
+        app.extensions['profiler'] = self
+        app.before_request(self.start)
+        app.after_request(self.record_status)
+        app.teardown_request(self.finish)
+    
+    def _trigger(self):
+        if request.headers.get(PROFILE_HEADER) and is_admin():
+            return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+    
+    def start(self):
+        trigger = self._trigger()
+        if trigger is None:
+            return
+        commands, token = start_capture()
+        g.profile = {
+            'trigger': trigger,
+            'commands': commands,
+            'capture_token': token,
+            'sampler': StackSampler(threading.get_ident(), self.interval).start(),
+            'started': time.perf_counter(),
+            'status': None
+        }
+    
+    def record_status(self, response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+        return response
+    
+    def finish(self, error=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        finished = time.perf_counter()
+        samples = profile['sampler'].stop()
+        stop_capture(profile['capture_token'])
+        
+        duration_ms = (finished - profile['started']) * 1000
+        if profile['trigger'] == 'sampled' and duration_ms < self.slow_ms:
+            return
+        
+        commands = profile['commands']
+        name = f'{request.method} {request.path}'
+        summary = {
+            'id': uuid.uuid4().hex,
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': profile['status'] or 500,
+            'trigger': profile['trigger'],
+            'captured_at': datetime.utcnow().isoformat() + 'Z',
+            'duration_ms': round(duration_ms, 2),
+            'db_ms': round(sum(c['duration_ms'] for c in commands), 2),
+            'db_commands': len(commands),
+            'samples': len(samples),
+            'slowest_commands': [
+                {'command': c['command'], 'target': c['target'], 'duration_ms': round(c['duration_ms'], 2)}
+                for c in sorted(commands, key=lambda c: c['duration_ms'], reverse=True)[:5]
+            ]
+        }
+        try:
+            save_profile(summary, to_speedscope(name, profile['started'], finished, samples, commands),
+                         self.directory, self.keep)
+        except OSError as e:
+            current_app.logger.warning(f'Could not save request profile: {e}')
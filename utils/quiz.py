@@ -0,0 +1,115 @@
+"""
+Multiple-choice quizzes built from a set's own cards.
+
+Each question is a card's front; the wrong choices are the backs of the
+cards whose backs look most like the right answer. Backs are compared as
+TF-IDF vectors of character trigrams, hashed into VECTOR_SIZE columns. The
+vectors of a deck are built once per set version with NumPy, for the whole
+deck at a time, and kept in memory; a quiz is then one matrix product
+(questions x deck) and a partial sort, whatever the size of the deck.
+"""
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from models.flashcard import Flashcard
+from models.minhash import normalize
+
+QUIZ_SIZE = 10       # Questions per quiz by default
+MAX_QUIZ_SIZE = 100  # Upper bound on a client-requested quiz
+CHOICES = 4          # Choices per question (the answer and CHOICES - 1 distractors)
+MAX_CHOICES = 6
+
+NGRAM = 3
+VECTOR_SIZE = 512  # Hashed trigram columns per vector (a 5k-card deck is 10 MB)
+_HASH_MULTIPLIER = 1_000_003
+
+Deck = namedtuple('Deck', 'cards vectors answers')
+
+def _trigram_counts(texts):
+    """Term counts (len(texts) x VECTOR_SIZE) of the hashed character trigrams of every text"""
+    # All texts in one array of code points, each padded with a space and
+    # followed by a NUL separator, so trigrams are hashed for the deck at once
+    padded = [f' {text} ' for text in texts]
+    codes = np.frombuffer('\0'.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    rows = np.repeat(np.arange(len(padded)), [len(text) + 1 for text in padded])[:len(codes)]
+    
+    grams = [codes[i:len(codes) - NGRAM + 1 + i] for i in range(NGRAM)]
+    valid = np.all([gram != 0 for gram in grams], axis=0)
+    columns = np.zeros(len(grams[0]), dtype=np.int64)
+    for gram in grams:
+        columns = (columns * _HASH_MULTIPLIER + gram) % VECTOR_SIZE
+    cells = rows[:len(columns)][valid] * VECTOR_SIZE + columns[valid]
+    counts = np.bincount(cells, minlength=len(padded) * VECTOR_SIZE)
+    return counts.reshape(len(padded), VECTOR_SIZE).astype(np.float32)
+
+def tfidf_vectors(texts):
+    """Unit-length TF-IDF vectors (sublinear term frequency) of the texts' character trigrams"""
+    counts = _trigram_counts(texts)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1
+    vectors = np.log1p(counts, out=counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+@lru_cache(maxsize=8)
+def _deck(set_id, version):
+    """The cards of a set and the vectors of their backs, built once per set version"""
+    cards = Flashcard.find_page_by_set_id(set_id, limit=0)
+    answers = [normalize(card.back) for card in cards]
+    # Cards with the same answer share an ID, so one is never a distractor for another
+    _, answer_ids = np.unique(np.array(answers, dtype=object), return_inverse=True)
+    return Deck(cards, tfidf_vectors(answers), answer_ids.astype(np.int64))
+
+def build_quiz(flashcard_set, size=QUIZ_SIZE, choices=CHOICES, seed=None):
+    """
+    Pick quiz questions from a set and the distractors for each.
+    
+    Args:
+        flashcard_set (FlashcardSet): Set to quiz on
+        size (int): Number of questions (at most one per card)
+        choices (int): Choices per question; fewer when the set does not
+            have enough different answers
+        seed (int): Seed for the questions and choice order, or None
+    
+    Returns:
+        list: (card: Flashcard, options: list of Flashcard, answer: int
+            index of card in options) per question
+    """
+    deck = _deck(flashcard_set._id, (flashcard_set.version, flashcard_set.change_seq))
+    n = len(deck.cards)
+    if n == 0:
+        return []
+    size = max(1, min(size, MAX_QUIZ_SIZE, n))
+    choices = max(2, min(choices, MAX_CHOICES))
+    rng = np.random.default_rng(seed)
+    questions = rng.choice(n, size=size, replace=False)
+    
+    # Similarity of each question's answer to every answer in the deck;
+    # cards with the question's own answer are never offered as distractors
+    similarity = deck.vectors[questions] @ deck.vectors.T
+    similarity[deck.answers[questions][:, None] == deck.answers[None, :]] = -np.inf
+    
+    # Nearest candidates, a few more than needed so duplicate answers among
+    # them can be skipped, most similar first
+    k = min(2 * (choices - 1), n - 1) or 1
+    candidates = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(similarity, candidates, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    
+    # Keep the first candidate of each answer, then the closest choices - 1
+    candidate_answers = deck.answers[candidates]
+    repeated = np.triu(candidate_answers[:, :, None] == candidate_answers[:, None, :], k=1).any(axis=1)
+    usable = ~repeated & np.isfinite(scores)
+    keep = np.argsort(~usable, axis=1, kind='stable')[:, :choices - 1]
+    distractors = np.take_along_axis(candidates, keep, axis=1)
+    distractor_usable = np.take_along_axis(usable, keep, axis=1)
+    answer_slots = rng.integers(0, distractor_usable.sum(axis=1) + 1)
+    
+    quiz = []
+    for question, row, row_usable, slot in zip(questions, distractors, distractor_usable, answer_slots):
+        options = [deck.cards[i] for i in row[row_usable]]
+        options.insert(slot, deck.cards[question])
+        quiz.append((deck.cards[question], options, int(slot)))
+    return quiz
@@ -0,0 +1,393 @@
+"""
+"Similar sets" recommendations from a nearest-neighbour index built offline.
+
+Each public set is embedded as a dense vector: the TF-IDF weights of the
+words of its title, description and a sample of its cards (hashed into
+HASH_SIZE columns, kept sparse), projected onto the top DIMENSIONS singular
+vectors of the whole corpus (latent semantic analysis, a randomized SVD in
+NumPy). Sets about the same subject end up close together even when they
+share few exact words.
+
+scripts/build_similar_index.py builds the index in batch: the vectors, and
+the NEIGHBOURS nearest sets of every set, computed ahead of time. Each build
+is a new generation directory under SIMILAR_INDEX_DIR, holding plain .npy
+files, and the CURRENT file names the live one:
+    
+    ids.npy          n set IDs (24-byte hex, sorted)
+    stamps.npy       n x 2 (version, change_seq) of each set when embedded
+    vectors.npy      n x DIMENSIONS float32, unit length
+    neighbours.npy   n x NEIGHBOURS rows of the nearest sets (-1 when fewer)
+    scores.npy       n x NEIGHBOURS cosine similarities
+    idf.npy          HASH_SIZE inverse document frequencies
+    components.npy   HASH_SIZE x DIMENSIONS projection
+
+Workers memory-map the files, so every worker on a host shares one copy in
+the page cache, and a request is a binary search and one row read. A set
+that is not indexed yet (new, or private) is embedded with the stored
+projection and compared with every vector: one small matrix product.
+
+Refreshes are incremental: only sets whose version or change_seq moved are
+embedded again, with the stored projection, and only their neighbour lists
+(and the lists they may now enter) are recomputed. The projection itself is
+fitted again when a build is asked to be full, or when more than
+REFIT_FRACTION of the sets changed.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from functools import lru_cache
+import numpy as np
+from bson import ObjectId
+from models.flashcard import Flashcard
+from models.minhash import normalize
+from models.repositories import repositories
+from utils.files import write_atomic
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 128      # Size of the set vectors
+NEIGHBOURS = 32       # Nearest sets stored per set (the most a request can ask for)
+HASH_SIZE = 1 << 16   # Hashed word columns of the TF-IDF matrix
+CARD_SAMPLE = 50      # Cards embedded per set, evenly spaced through the set
+TITLE_WEIGHT = 3      # Title words count this many times
+OVERSAMPLING = 10     # Randomized SVD: extra directions sampled...
+POWER_ITERATIONS = 2  # ...and passes over the corpus to sharpen them
+REFIT_FRACTION = 0.25
+BLOCK_SIZE = 1024     # Sets compared per block when finding neighbours
+
+CURRENT = 'CURRENT'
+_FILES = ('ids', 'stamps', 'vectors', 'neighbours', 'scores', 'idf', 'components')
+
+@lru_cache(maxsize=1 << 16)
+def _column(word):
+    return zlib.crc32(word.encode('utf-8')) % HASH_SIZE
+
+def set_words(title, description, cards):
+    """The words a set is embedded from: its title (TITLE_WEIGHT times), description and cards"""
+    words = normalize(title).split() * TITLE_WEIGHT + normalize(description).split()
+    for card in cards:
+        words += normalize(card.front).split() + normalize(card.back).split()
+    return words
+
+def sample_cards(set_id):
+    """Up to CARD_SAMPLE cards of a set, evenly spaced through it"""
+    card_ids = Flashcard.find_ids_by_set_id(set_id)
+    if len(card_ids) > CARD_SAMPLE:
+        card_ids = [card_ids[i] for i in np.linspace(0, len(card_ids) - 1, CARD_SAMPLE).astype(int)]
+    return Flashcard.find_by_ids(card_ids)
+
+class SparseRows:
+    """A sparse matrix in compressed rows (indptr, columns, values), as NumPy arrays"""
+    
+    def __init__(self, indptr, columns, values, width):
+        self.indptr = indptr
+        self.columns = columns
+        self.values = values
+        self.width = width
+    
+    def __len__(self):
+        return len(self.indptr) - 1
+    
+    @classmethod
+    def count_words(cls, documents):
+        """Hashed word counts of each document (a list of words)"""
+        indptr, columns, counts = [0], [], []
+        for words in documents:
+            unique, n = np.unique(np.fromiter((_column(w) for w in words), dtype=np.int64, count=len(words)),
+                                  return_counts=True)
+            columns.append(unique)
+            counts.append(n)
+            indptr.append(indptr[-1] + len(unique))
+        return cls(np.array(indptr, dtype=np.int64),
+                   np.concatenate(columns) if columns else np.zeros(0, dtype=np.int64),
+                   np.concatenate(counts).astype(np.float32) if counts else np.zeros(0, dtype=np.float32),
+                   HASH_SIZE)
+    
+    def document_frequency(self):
+        return np.bincount(self.columns, minlength=self.width)
+    
+    def tfidf(self, idf):
+        """Unit-length rows of sublinear term frequency times idf"""
+        values = (1 + np.log(self.values)) * idf[self.columns]
+        row_of = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=values * values, minlength=len(self)))
+        values = values / np.maximum(norms, 1e-12)[row_of]
+        return SparseRows(self.indptr, self.columns, values.astype(np.float32), self.width)
+    
+    def dot(self, dense):
+        """self @ dense, a few thousand rows at a time"""
+        result = np.zeros((len(self), dense.shape[1]), dtype=np.float32)
+        lengths = np.diff(self.indptr)
+        for start in range(0, len(self), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, len(self))
+            low, high = self.indptr[start], self.indptr[stop]
+            if low == high:
+                continue
+            products = self.values[low:high, None] * dense[self.columns[low:high]]
+            # reduceat needs non-empty segments; empty rows stay zero
+            filled = np.nonzero(lengths[start:stop])[0]
+            result[start + filled] = np.add.reduceat(products, self.indptr[start + filled] - low, axis=0)
+        return result
+    
+    def transpose(self):
+        order = np.argsort(self.columns, kind='stable')
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))[order]
+        indptr = np.searchsorted(self.columns[order], np.arange(self.width + 1))
+        return SparseRows(indptr.astype(np.int64), rows, self.values[order], len(self))
+
+def fit_components(matrix, dimensions=DIMENSIONS, seed=0):
+    """
+    Top right singular vectors of a TF-IDF matrix, by randomized SVD.
+    
+    Returns:
+        numpy.ndarray: HASH_SIZE x min(dimensions, len(matrix)) float32
+    """
+    sample = min(dimensions + OVERSAMPLING, len(matrix))
+    transposed = matrix.transpose()
+    rng = np.random.default_rng(seed)
+    basis = matrix.dot(rng.standard_normal((matrix.width, sample), dtype=np.float32))
+    for _ in range(POWER_ITERATIONS):
+        basis = np.linalg.qr(transposed.dot(np.linalg.qr(basis)[0]))[0]
+        basis = matrix.dot(basis)
+    basis = np.linalg.qr(basis)[0]
+    _, _, right = np.linalg.svd(transposed.dot(basis).T, full_matrices=False)
+    return np.ascontiguousarray(right[:min(dimensions, sample)].T, dtype=np.float32)
+
+def embed(matrix, components):
+    """Unit-length vectors of TF-IDF rows in the space of the components"""
+    vectors = matrix.dot(components)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _top(scores, exclude=None):
+    """Columns and scores of the NEIGHBOURS highest scores per row, best first (-1 padded)"""
+    if exclude is not None:
+        scores[np.arange(len(scores)), exclude] = -np.inf
+    k = min(NEIGHBOURS, scores.shape[1])
+    columns = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k else np.zeros((len(scores), 0), dtype=np.int64)
+    top = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    columns = np.take_along_axis(columns, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    neighbours = np.full((len(scores), NEIGHBOURS), -1, dtype=np.int32)
+    result = np.zeros((len(scores), NEIGHBOURS), dtype=np.float16)
+    neighbours[:, :k] = np.where(np.isfinite(top), columns, -1)
+    result[:, :k] = np.where(np.isfinite(top), top, 0)
+    return neighbours, result
+
+def nearest(vectors, rows=None):
+    """Neighbour lists (see _top) of the given rows of vectors, or of all of them, against every vector"""
+    rows = np.arange(len(vectors)) if rows is None else rows
+    neighbours = np.empty((len(rows), NEIGHBOURS), dtype=np.int32)
+    scores = np.empty((len(rows), NEIGHBOURS), dtype=np.float16)
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        similarity = vectors[block] @ vectors.T
+        neighbours[start:start + len(block)], scores[start:start + len(block)] = _top(similarity, exclude=block)
+    return neighbours, scores
+
+class NeighbourIndex:
+    """One generation of the index, memory-mapped"""
+    
+    def __init__(self, path):
+        self.path = path
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in _FILES}
+        self.ids = arrays['ids']
+        self.stamps = arrays['stamps']
+        self.vectors = arrays['vectors']
+        self.neighbour_rows = arrays['neighbours']
+        self.scores = arrays['scores']
+        self.idf = arrays['idf']
+        self.components = arrays['components']
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def row(self, set_id):
+        """Row of a set in the index, or None"""
+        key = str(set_id).encode('ascii')
+        row = int(np.searchsorted(self.ids, key))
+        return row if row < len(self.ids) and self.ids[row] == key else None
+    
+    def neighbours(self, row):
+        """(set ID, similarity) of the sets nearest to an indexed set, nearest first"""
+        return [(ObjectId(self.ids[n].decode('ascii')), float(score))
+                for n, score in zip(self.neighbour_rows[row], self.scores[row]) if n >= 0]
+    
+    def embed(self, words):
+        """Vector of a set not in the index, from its words (see set_words)"""
+        matrix = SparseRows.count_words([words]).tfidf(np.asarray(self.idf))
+        return embed(matrix, np.asarray(self.components))[0]
+    
+    def nearest_to(self, vector, exclude=None):
+        """(set ID, similarity) of the indexed sets nearest to a vector, nearest first"""
+        if len(self) == 0:
+            return []
+        similarity = (self.vectors @ vector)[None, :]
+        if exclude is not None:
+            similarity[0, exclude] = -np.inf
+        neighbours, scores = _top(similarity)
+        return [(ObjectId(self.ids[n].decode('ascii')), float(score))
+                for n, score in zip(neighbours[0], scores[0]) if n >= 0]
+
+def current_generation(directory):
+    """Path of the live generation under directory, or None before the first build"""
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, name) if name else None
+
+def _write_generation(directory, arrays):
+    path = tempfile.mkdtemp(prefix=time.strftime('%Y%m%d%H%M%S-', time.gmtime()), dir=directory)
+    name = os.path.basename(path)
+    for key in _FILES:
+        np.save(os.path.join(path, f'{key}.npy'), arrays[key])
+    previous = current_generation(directory)
+    write_atomic(os.path.join(directory, CURRENT), name)
+    # Keep the previous generation: workers may not have switched yet
+    keep = {name, os.path.basename(previous) if previous else None}
+    for entry in os.listdir(directory):
+        if entry not in keep and os.path.isdir(os.path.join(directory, entry)):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return path
+
+def build_index(directory, full=False):
+    """
+    Bring the index under directory up to date with the public sets.
+    
+    Args:
+        directory (str): SIMILAR_INDEX_DIR
+        full (bool): Embed every set and fit the projection again, even if
+            few sets changed
+    
+    Returns:
+        dict: 'sets' indexed, 'embedded' (sets embedded by this build),
+            'removed' (sets no longer public) and 'refit' (whether the
+            projection was fitted again); 'embedded' and 'removed' are 0 and
+            no generation is written when nothing changed
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = current_generation(directory)
+    previous = NeighbourIndex(path) if path and not full else None
+    
+    sets = sorted(repositories().sets.find_public_versions(), key=lambda s: str(s['_id']))
+    ids = np.array([str(s['_id']).encode('ascii') for s in sets], dtype='S24')
+    stamps = np.array([(s.get('version') or 0, s.get('change_seq') or 0) for s in sets],
+                      dtype=np.int64).reshape(-1, 2)
+    
+    # Rows of the previous generation whose set is unchanged (-1 otherwise)
+    old_rows = np.full(len(sets), -1, dtype=np.int64)
+    removed = 0
+    if previous is not None and len(previous):
+        found = np.minimum(np.searchsorted(previous.ids, ids), len(previous) - 1)
+        same = (previous.ids[found] == ids) & (previous.stamps[found] == stamps).all(axis=1)
+        old_rows[same] = found[same]
+        removed = len(previous) - int(np.isin(previous.ids, ids).sum())
+    changed = np.nonzero(old_rows < 0)[0]
+    if previous is not None and not len(changed) and not removed:
+        return {'sets': len(sets), 'embedded': 0, 'removed': 0, 'refit': False}
+    
+    refit = previous is None or len(changed) + removed > REFIT_FRACTION * max(1, len(sets))
+    embedded = np.arange(len(sets)) if refit else changed
+    counts = SparseRows.count_words([set_words(sets[i]['title'], sets[i].get('description'),
+                                               sample_cards(sets[i]['_id'])) for i in embedded])
+    
+    if refit:
+        frequency = counts.document_frequency()
+        idf = (np.log((1 + len(sets)) / (1 + frequency)) + 1).astype(np.float32)
+        matrix = counts.tfidf(idf)
+        components = fit_components(matrix) if len(sets) else np.zeros((HASH_SIZE, 0), dtype=np.float32)
+        vectors = embed(matrix, components)
+        neighbours, scores = nearest(vectors)
+    else:
+        idf, components = np.asarray(previous.idf), np.asarray(previous.components)
+        vectors = np.empty((len(sets), components.shape[1]), dtype=np.float32)
+        kept = np.nonzero(old_rows >= 0)[0]
+        vectors[kept] = previous.vectors[old_rows[kept]]
+        vectors[changed] = embed(counts.tfidf(idf), components)
+        neighbours, scores = _refresh_neighbours(previous, old_rows, vectors, changed)
+    
+    _write_generation(directory, {'ids': ids, 'stamps': stamps, 'vectors': vectors, 'neighbours': neighbours,
+                                  'scores': scores, 'idf': idf, 'components': components})
+    return {'sets': len(sets), 'embedded': len(embedded), 'removed': removed, 'refit': refit}
+
+def _refresh_neighbours(previous, old_rows, vectors, changed):
+    """
+    Neighbour lists after some sets changed: those of the changed sets are
+    computed again; every other set keeps its list, minus sets that changed
+    or went away, merged with its similarity to the changed sets.
+    """
+    neighbours = np.empty((len(vectors), NEIGHBOURS), dtype=np.int32)
+    scores = np.empty((len(vectors), NEIGHBOURS), dtype=np.float16)
+    neighbours[changed], scores[changed] = nearest(vectors, changed)
+    
+    # Old row -> new row of the sets that are unchanged
+    renumber = np.full(len(previous) + 1, -1, dtype=np.int64)
+    kept = np.nonzero(old_rows >= 0)[0]
+    renumber[old_rows[kept]] = kept
+    changed_vectors = vectors[changed]
+    for start in range(0, len(kept), BLOCK_SIZE):
+        block = kept[start:start + BLOCK_SIZE]
+        # Row -1 (padding) maps to the extra last slot, which is -1 too
+        old = renumber[previous.neighbour_rows[old_rows[block]]]
+        old_scores = np.where(old >= 0, previous.scores[old_rows[block]].astype(np.float32), -np.inf)
+        candidates = np.concatenate([old, np.broadcast_to(changed, (len(block), len(changed)))], axis=1)
+        candidate_scores = np.concatenate([old_scores, vectors[block] @ changed_vectors.T], axis=1)
+        top, top_scores = _top(candidate_scores)
+        neighbours[block] = np.where(top >= 0, np.take_along_axis(candidates, np.maximum(top, 0), axis=1), -1)
+        scores[block] = top_scores
+    return neighbours, scores
+
+class SimilarSets:
+    """
+    GET /sets/<id>/similar, answered from the live index generation.
+    
+    The generation is memory-mapped on first use; CURRENT is checked again
+    at most every `refresh_seconds`, and a new generation is mapped when a
+    build has replaced it.
+    """
+    
+    def __init__(self, directory, refresh_seconds):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self.checked_at = None  # time.monotonic() of the last look at CURRENT
+        self._index = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        app.extensions['similar'] = self
+    
+    def current(self):
+        """The live generation, or None before the first build"""
+        with self._lock:
+            if self.checked_at is None or time.monotonic() - self.checked_at >= self.refresh_seconds:
+                self.checked_at = time.monotonic()
+                try:
+                    path = current_generation(self.directory)
+                    if path and (self._index is None or self._index.path != path):
+                        self._index = NeighbourIndex(path)
+                except (OSError, ValueError) as e:
+                    # Keep serving the mapped generation; try again after another interval
+                    logger.warning(f'Could not load the similar sets index: {e}')
+            return self._index
+    
+    def similar(self, flashcard_set):
+        """
+        Public sets nearest to a set, nearest first.
+        
+        Returns:
+            tuple: ([(set ID, similarity)], whether the set itself is indexed)
+        """
+        index = self.current()
+        if index is None:
+            return [], False
+        row = index.row(flashcard_set._id)
+        if row is not None:
+            return index.neighbours(row), True
+        words = set_words(flashcard_set.title, flashcard_set.description, sample_cards(flashcard_set._id))
+        return index.nearest_to(index.embed(words)), False
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from config import setting
+from models.flashcard import Flashcard
+from utils.files import write_atomic
+
+# A snapshot is one version of a set compiled to compact JSON and gzipped:
+#   {"set": {...}, "cards": [[id, front, back], [id, front, back, image_id], ...]}
+# with front and back as the cards' rendered HTML (see models/rich_text.py).
+# It is named by the hash of its JSON, so its URL never changes meaning and can
+# be cached forever. Files live under SNAPSHOT_DIR/<set_id>/:
+#   <hash>.json.gz               the snapshot
+#   <version>-<change_seq>.ref   "<hash> <card count>" for that set version
+# Writing the ref of a newer version removes the older refs and their snapshots.
+
+SNAPSHOT_HASH = re.compile(r'^[0-9a-f]{32}$')
+REF_NAME = re.compile(r'^(\d+)-(\d+)\.ref$')
+
+def _set_dir(set_id):
+    return os.path.join(setting('SNAPSHOT_DIR'), str(set_id))
+
+def _prune(set_dir, stamp):
+    """Remove the refs of set versions before stamp, and snapshots no remaining ref names"""
+    keep = set()
+    for name in os.listdir(set_dir):
+        match = REF_NAME.match(name)
+        if not match:
+            continue
+        path = os.path.join(set_dir, name)
+        try:
+            # A request still on an older read of the set may have written a
+            # ref after the current one; it goes the next time round
+            if (int(match.group(1)), int(match.group(2))) < stamp:
+                os.remove(path)
+            else:
+                with open(path) as f:
+                    keep.add(f.read().split()[0])
+        except (OSError, IndexError):
+            pass
+    for name in os.listdir(set_dir):
+        if name.endswith('.json.gz') and name[:-len('.json.gz')] not in keep:
+            try:
+                os.remove(os.path.join(set_dir, name))
+            except OSError:
+                pass
+
+def build_snapshot(flashcard_set):
+    """
+    Serialize the current cards of a set.
+    
+    Returns:
+        tuple: (hash: str, compressed: bytes, card_count: int)
+    """
+    # limit=0 reads every card, in the same (rank, _id) order on every instance
+    cards = Flashcard.find_page_by_set_id(flashcard_set._id, limit=0)
+    payload = json.dumps({
+        'set': {
+            'id': str(flashcard_set._id),
+            'title': flashcard_set.title,
+            'version': flashcard_set.version,
+            'change_seq': flashcard_set.change_seq
+        },
+        'cards': [[str(c._id), *c.html] + ([str(c.image_id)] if c.image_id else []) for c in cards]
+    }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    snapshot_hash = hashlib.sha256(payload).hexdigest()[:32]
+    return snapshot_hash, gzip.compress(payload, compresslevel=9, mtime=0), len(cards)
+
+def snapshot_for(flashcard_set):
+    """
+    Hash and card count of the snapshot for the set's current version,
+    compiling it on first request.
+    
+    While the set is settling (see FlashcardSet.is_settled) a card write at
+    this version may not be visible yet, so the snapshot is compiled for
+    each request and its ref is only recorded once the set has settled.
+    
+    Returns:
+        tuple: (hash: str, card_count: int)
+    """
+    set_dir = _set_dir(flashcard_set._id)
+    ref_path = os.path.join(set_dir, f'{flashcard_set.version}-{flashcard_set.change_seq}.ref')
+    try:
+        with open(ref_path) as f:
+            snapshot_hash, card_count = f.read().split()
+        # The snapshot itself may have been pruned by a writer of a newer version
+        if os.path.exists(os.path.join(set_dir, f'{snapshot_hash}.json.gz')):
+            return snapshot_hash, int(card_count)
+    except (OSError, ValueError):
+        pass
+    
+    snapshot_hash, compressed, card_count = build_snapshot(flashcard_set)
+    os.makedirs(set_dir, exist_ok=True)
+    blob_path = os.path.join(set_dir, f'{snapshot_hash}.json.gz')
+    if not os.path.exists(blob_path):
+        write_atomic(blob_path, compressed)
+    if not flashcard_set.is_settled():
+        return snapshot_hash, card_count
+    write_atomic(ref_path, f'{snapshot_hash} {card_count}'.encode())
+    _prune(set_dir, (flashcard_set.version, flashcard_set.change_seq))
+    return snapshot_hash, card_count
+
+def snapshot_path(flashcard_set, snapshot_hash):
+    """
+    Path of a stored snapshot of this set, or None. Snapshots are looked up
+    per set so a hash can only be fetched through the set it belongs to.
+    """
+    if not SNAPSHOT_HASH.match(snapshot_hash):
+        return None
+    path = os.path.join(_set_dir(flashcard_set._id), f'{snapshot_hash}.json.gz')
+    if not os.path.exists(path):
+        # Not compiled on this instance yet; it can only be the current version
+        if snapshot_for(flashcard_set)[0] != snapshot_hash:
+            return None
+    return path
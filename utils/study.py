@@ -0,0 +1,87 @@
+import random
+import re
+from functools import lru_cache
+from bson import ObjectId
+from models.flashcard import Flashcard
+from models.ranking import DIGITS
+
+STUDY_WINDOW = 50   # Cards per window fetched by the study page
+SET_PAGE_SIZE = 25  # Cards per page on the set view page
+MAX_WINDOW = 200    # Upper bound on a client-requested window
+
+_RANK = re.compile(f'[{re.escape(DIGITS)}]*')
+
+def new_shuffle_seed():
+    """Pick a seed for a new shuffled study session"""
+    return random.randrange(1, 2 ** 31)
+
+@lru_cache(maxsize=64)
+def _shuffled_ids(set_id, version, seed):
+    """
+    Shuffled card order for a set, computed once per (set version, seed).
+    
+    Only the card IDs are read (a covered index scan), so the cost of a
+    shuffled session does not grow with card size, and later windows of the
+    same session are served from this cache.
+    """
+    card_ids = Flashcard.find_ids_by_set_id(set_id)
+    random.Random(seed).shuffle(card_ids)
+    return tuple(card_ids)
+
+def parse_cursor(cursor, shuffled=False):
+    """
+    Parse a cursor returned by study_window.
+    
+    Args:
+        cursor (str): "<rank>.<card id>" in set order (a bare card ID is an
+            unranked card), an offset into the permutation when shuffled
+        shuffled (bool): Whether the session is shuffled
+    
+    Returns:
+        (rank, ObjectId) or int, or None for no cursor
+    
+    Raises:
+        ValueError: The cursor is malformed or a negative offset
+    """
+    if not cursor:
+        return None
+    if shuffled:
+        if not (cursor.isascii() and cursor.isdigit()):
+            raise ValueError('cursor must be a non-negative offset')
+        return int(cursor)
+    rank, _, card_id = cursor.rpartition('.')
+    if not ObjectId.is_valid(card_id) or not _RANK.fullmatch(rank):
+        raise ValueError('cursor must be "<rank>.<card id>"')
+    return rank or None, ObjectId(card_id)
+
+def study_window(flashcard_set, seed=None, cursor=None, limit=STUDY_WINDOW):
+    """
+    Load one window of a study session.
+    
+    Args:
+        flashcard_set (FlashcardSet): Set being studied
+        seed (int): Shuffle seed, or None for the set's natural order
+        cursor (str): Opaque position returned by the previous window
+        limit (int): Number of cards in the window
+    
+    Returns:
+        tuple: (cards: list of Flashcard, next_cursor: str or None)
+    
+    Raises:
+        ValueError: The cursor is malformed (see parse_cursor)
+    """
+    limit = max(1, min(limit, MAX_WINDOW))
+    
+    if seed is None:
+        # Set order: keyset pagination on (set_id, rank, _id), the cursor is
+        # "<rank>.<card id>" of the window's last card
+        cards = Flashcard.find_page_by_set_id(flashcard_set._id, after=parse_cursor(cursor), limit=limit + 1)
+        next_cursor = f'{cards[limit - 1].rank or ""}.{cards[limit - 1]._id}' if len(cards) > limit else None
+        return cards[:limit], next_cursor
+    
+    # Shuffled order: the cursor is an offset into the cached permutation
+    order = _shuffled_ids(flashcard_set._id, flashcard_set.updated_at, seed)
+    offset = parse_cursor(cursor, shuffled=True) or 0
+    cards = Flashcard.find_by_ids(order[offset:offset + limit])
+    next_cursor = str(offset + limit) if offset + limit < len(order) else None
+    return cards, next_cursor
@@ -0,0 +1,132 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from config import with_app_settings
+from models.minhash import normalize
+from models.repositories import repositories, STORAGE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Prefixes up to this many characters match too many titles to rank per
+# request, so their top results are computed when the index is built
+SHORT_PREFIX = 3
+
+class PrefixArray:
+    """
+    An immutable typeahead index over public set titles.
+    
+    Every title is indexed under each of its word-start suffixes ("intro to
+    biology", "to biology", "biology"), so typing any word of a title finds
+    it. The keys are kept in one sorted list: the titles matching a prefix are
+    a contiguous slice, found with two binary searches.
+    """
+    
+    def __init__(self, entries, max_results):
+        # Most popular first: page views, then card count, then title
+        self.entries = sorted(entries, key=lambda e: (-e.get('views', 0), -e.get('card_count', 0), e['title'].casefold()))
+        self.max_results = max_results
+        pairs = []
+        for rank, entry in enumerate(self.entries):
+            words = normalize(entry['title']).split(' ')
+            for i in range(len(words)):
+                if words[i]:
+                    pairs.append((' '.join(words[i:]), rank))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ranks = [rank for _, rank in pairs]
+        
+        self.short = {}
+        for key, rank in pairs:
+            for length in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                self.short.setdefault(key[:length], set()).add(rank)
+        self.short = {prefix: heapq.nsmallest(max_results, ranks) for prefix, ranks in self.short.items()}
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def search(self, query, limit):
+        """The `limit` most popular entries with a word starting with `query`"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        limit = min(limit, self.max_results)
+        if len(prefix) <= SHORT_PREFIX:
+            ranks = self.short.get(prefix, [])[:limit]
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+            ranks = heapq.nsmallest(limit, set(self.ranks[start:end]))
+        return [self.entries[rank] for rank in ranks]
+
+class TitleIndex:
+    """
+    Public set titles for GET /sets/suggest, served from memory.
+    
+    The index is built from the set feed on first use and rebuilt in the
+    background once it is older than `refresh_seconds`; requests keep being
+    answered from the previous index meanwhile, so a keystroke never waits
+    on the database after the first one.
+    """
+    
+    def __init__(self, refresh_seconds, max_results):
+        self.refresh_seconds = refresh_seconds
+        self.max_results = max_results
+        self.built_at = None  # time.monotonic() of the last build attempt
+        self._index = None
+        self._building = False
+        self._lock = threading.Lock()
+        self._first_build = threading.Lock()
+    
+    def init_app(self, app):
+        app.extensions['suggest'] = self
+    
+    def suggest(self, query, limit=None):
+        """
+        Most popular public sets with a title word starting with `query`.
+        
+        Args:
+            query (str): What has been typed so far
+            limit (int): Maximum number of results, at most max_results
+        
+        Returns:
+            list: Feed entries (dicts with _id, title, username, card_count, views)
+        """
+        return self.current().search(query, max(1, limit or self.max_results))
+    
+    def current(self):
+        """The latest index, starting a rebuild if it is stale"""
+        if self._index is None:
+            with self._first_build:
+                if self._index is None:
+                    self._build()
+            return self._index
+        
+        with self._lock:
+            stale = time.monotonic() - self.built_at >= self.refresh_seconds
+            start = stale and not self._building
+            if start:
+                self._building = True
+        if start:
+            threading.Thread(target=with_app_settings(self._rebuild), name='suggest-index', daemon=True).start()
+        return self._index
+    
+    def _build(self):
+        entries = repositories().feed.find_titles()
+        index = PrefixArray(entries, self.max_results)
+        with self._lock:
+            self._index = index
+            self.built_at = time.monotonic()
+    
+    def _rebuild(self):
+        try:
+            self._build()
+        except STORAGE_ERRORS as e:
+            # Keep serving the old index; try again after another interval
+            logger.warning(f'Could not refresh the title index: {e}')
+            with self._lock:
+                self.built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._building = False
@@ -1,8 +1,8 @@
-"""WSGI entry point for Gunicorn"""
-from app import app
-
-application = app
-
-if __name__ == "__main__":
-    app.run()
-
+"""WSGI entry point for Gunicorn"""
+from app import create_app, preload
+
+application = preload(create_app())
+app = application
+
+if __name__ == "__main__":
+    app.run()